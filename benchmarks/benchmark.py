@@ -0,0 +1,321 @@
+"""
+Speed and memory benchmarks of the aligners.
+
+Every case aligns seeded synthetic sequences: a random ancestor and copies
+of it with a given divergence (the fraction of positions substituted,
+inserted or deleted). The cases sweep the length, the divergence and the
+number of sequences over needleman_wunsch (wavefront and hirschberg),
+smith_waterman (the best hit and the top hits), the search, the seed
+index, the profile alignment, the traceback, multiple_alignment and
+anchored_alignment.
+
+A case reports its best time over the repeats, the number of dynamic
+programming cells per second and its peak memory (numpy allocations
+included) measured with tracemalloc in a separate run. Run from the root
+of the repository:
+
+    PYTHONPATH=src python benchmarks/benchmark.py
+    PYTHONPATH=src python benchmarks/benchmark.py --save
+
+The first line compares the run with benchmarks/baseline.json and exits
+with 1 when a case is slower, or takes more memory, than the baseline by
+more than --threshold. The second one writes the baseline. Timings depend
+on the machine, save a baseline on the machine that checks it.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from functools import partial
+from typing import Any, Callable, NamedTuple, Optional
+
+from Anchored_alignment import anchored_alignment
+from Database_search import search
+from Multiple_alignment import _profile_needleman_wunsch, multiple_alignment
+from Needleman_wunsch import needleman_wunsch, needleman_wunsch_score
+from Profile import Profile
+from Seed_index import SeedIndex
+from Smith_waterman import smith_waterman, smith_waterman_hits
+from Wavefront import fill, sequence_substitution, traceback
+
+BASELINE = "benchmarks/baseline.json"
+
+# a case may lose this fraction of its cells per second, or grow its peak
+# memory by this fraction, before the run fails
+THRESHOLD = 0.25
+
+REPEATS = 3
+
+NUCLEOTIDES = "ACGT"
+
+
+class Case(NamedTuple):
+    """A benchmark: run aligns cells dynamic programming cells."""
+
+    name: str
+    cells: int
+    run: Callable[[], Any]
+
+
+def random_sequence(rng: random.Random, length: int) -> str:
+    """Return a random nucleotide sequence."""
+    return "".join(rng.choice(NUCLEOTIDES) for _ in range(length))
+
+
+def mutate(rng: random.Random, seq: str, divergence: float) -> str:
+    """Substitute, insert or delete a divergence fraction of positions."""
+    letters = []
+    for letter in seq:
+        if rng.random() >= divergence:
+            letters.append(letter)
+            continue
+        change = rng.randrange(3)
+        if change == 0:
+            letters.append(rng.choice(NUCLEOTIDES))
+        elif change == 1:
+            letters.append(letter + rng.choice(NUCLEOTIDES))
+    return "".join(letters)
+
+
+def family(seed: int, count: int, length: int, divergence: float) -> list[str]:
+    """Return count diverged copies of a random ancestor."""
+    rng = random.Random(seed)
+    ancestor = random_sequence(rng, length)
+    return [mutate(rng, ancestor, divergence) for _ in range(count)]
+
+
+def _pairs_cells(seqs: list[str]) -> int:
+    """Return the cells of the alignments of all the pairs of seqs."""
+    return sum(
+        len(seqs[i]) * len(seqs[j])
+        for i in range(len(seqs))
+        for j in range(i + 1, len(seqs))
+    )
+
+
+def cases() -> list[Case]:
+    """Return the benchmark cases."""
+    result = []
+    for length in (200, 1000, 2000):
+        for divergence in (0.05, 0.3):
+            seq1, seq2 = family(length, 2, length, divergence)
+            suffix = f"{length}/{divergence}"
+            cells = len(seq1) * len(seq2)
+            result.append(
+                Case(
+                    f"needleman_wunsch/{suffix}",
+                    cells,
+                    partial(needleman_wunsch, seq1, seq2, 1, -1, -1),
+                )
+            )
+            result.append(
+                Case(
+                    f"smith_waterman/{suffix}",
+                    cells,
+                    partial(smith_waterman, seq1, seq2, 10, -5, -5),
+                )
+            )
+    seq1, seq2 = family(1, 2, 1000, 0.1)
+    cells = len(seq1) * len(seq2)
+    result.append(
+        Case(
+            "needleman_wunsch/hirschberg/1000",
+            cells,
+            lambda: needleman_wunsch(
+                seq1, seq2, 1, -1, -1, engine="hirschberg"
+            ),
+        )
+    )
+    result.append(
+        Case(
+            "needleman_wunsch_score/1000",
+            cells,
+            lambda: needleman_wunsch_score(seq1, seq2, 1, -1, -1),
+        )
+    )
+    _, rows, cols, trace = fill(
+        sequence_substitution(seq1, seq2, 1, -1), len(seq1), len(seq2), -1, -1
+    )
+    result.append(
+        Case(
+            "traceback/1000",
+            rows + cols,
+            lambda: traceback(trace, rows, cols),
+        )
+    )
+
+    # a domain found 5 times in a longer sequence, in one fill
+    rng = random.Random(7)
+    domain = random_sequence(rng, 100)
+    seq1 = random_sequence(rng, 200) + domain + random_sequence(rng, 200)
+    seq2 = "".join(
+        random_sequence(rng, 300) + mutate(rng, domain, 0.1) for _ in range(5)
+    )
+    result.append(
+        Case(
+            "smith_waterman_hits/5x100",
+            len(seq1) * len(seq2),
+            partial(
+                smith_waterman_hits,
+                seq1,
+                seq2,
+                2,
+                -3,
+                -5,
+                gap_extend=-2,
+                count=5,
+            ),
+        )
+    )
+
+    targets = family(2, 200, 200, 0.2)
+    query = targets.pop()
+    result.append(
+        Case(
+            "search/200x200",
+            len(query) * sum(map(len, targets)),
+            lambda: search(query, targets, 10, -5, -5, k=10),
+        )
+    )
+
+    # reads of 150 letters mapped on a 200k reference, the cells are those
+    # of the full Smith-Waterman the index avoids
+    rng = random.Random(5)
+    reference = random_sequence(rng, 200_000)
+    reads = [
+        mutate(rng, reference[slice(start, start + 150)], 0.05)
+        for start in (rng.randrange(len(reference) - 150) for _ in range(20))
+    ]
+    index = SeedIndex.build([reference])
+    result.append(
+        Case(
+            "seed_index/20x150",
+            len(reference) * sum(map(len, reads)),
+            lambda: [index.align(read, 2, -3, -5, -2) for read in reads],
+        )
+    )
+
+    for length in (100, 400):
+        seqs = family(3, 16, length, 0.1)
+        profile1 = Profile(multiple_alignment(seqs[:8], "upgma"))
+        profile2 = Profile(multiple_alignment(seqs[8:], "upgma"))
+        result.append(
+            Case(
+                f"profile_alignment/8+8x{length}",
+                profile1.length * profile2.length,
+                partial(_profile_needleman_wunsch, profile1, profile2),
+            )
+        )
+
+    for count in (8, 24):
+        seqs = family(4, count, 100, 0.1)
+        for guide in ("pairwise", "upgma"):
+            result.append(
+                Case(
+                    f"multiple_alignment/{guide}/{count}x100",
+                    _pairs_cells(seqs),
+                    partial(multiple_alignment, seqs, guide),
+                )
+            )
+    seqs = family(6, 4, 10_000, 0.05)
+    result.append(
+        Case(
+            "anchored_alignment/4x10000",
+            _pairs_cells(seqs),
+            partial(anchored_alignment, seqs),
+        )
+    )
+    return result
+
+
+def measure(case: Case, repeats: int = REPEATS) -> dict[str, float]:
+    """Return the best time, cells per second and peak memory of a case."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        case.run()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        case.run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": best,
+        "cells_per_second": case.cells / best,
+        "peak_bytes": peak,
+    }
+
+
+def regressions(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float = THRESHOLD,
+) -> list[str]:
+    """Return a message for every case worse than its baseline.
+
+    Cases missing from either side are not compared.
+    """
+    messages = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        speed = result["cells_per_second"] / base["cells_per_second"]
+        if speed < 1 - threshold:
+            messages.append(f"{name}: {speed:.0%} of the baseline speed")
+        memory = result["peak_bytes"] / max(base["peak_bytes"], 1)
+        if memory > 1 + threshold:
+            messages.append(f"{name}: {memory:.0%} of the baseline memory")
+    return messages
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the benchmarks, return the exit code."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument(
+        "--save", action="store_true", help="write the results as baseline"
+    )
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument(
+        "--filter", default="", help="only run the cases with this in name"
+    )
+    args = parser.parse_args(argv)
+
+    results = {}
+    for case in cases():
+        if args.filter not in case.name:
+            continue
+        result = measure(case, args.repeats)
+        results[case.name] = result
+        print(
+            f"{case.name:40} {result['seconds'] * 1000:10.2f} ms "
+            f"{result['cells_per_second'] / 1e6:10.2f} Mcells/s "
+            f"{result['peak_bytes'] / 2**20:8.2f} MiB"
+        )
+
+    if args.save:
+        with open(args.baseline, "w") as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        return 0
+    try:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+    except FileNotFoundError:
+        print(f"no baseline at {args.baseline}, run with --save")
+        return 0
+    messages = regressions(results, baseline, args.threshold)
+    for message in messages:
+        print(f"REGRESSION {message}")
+    return 1 if messages else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
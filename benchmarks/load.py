@@ -0,0 +1,166 @@
+"""
+Load generator of the alignment service.
+
+Sends many small random pairs to an AlignmentServer from concurrent
+clients and reports the throughput and the latency percentiles. Without an
+address it starts a server on a temporary Unix socket, in its own process.
+Run from the root of the repository:
+
+    PYTHONPATH=src python benchmarks/load.py
+    PYTHONPATH=src python benchmarks/load.py --max-batch 1
+    PYTHONPATH=src python benchmarks/load.py --socket /tmp/alignment.sock
+
+The second line turns the micro-batching off, for comparison. The third
+one loads a server that is already running.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from Alignment_service import HOST, MAX_BATCH, AsyncAlignmentClient
+
+NUCLEOTIDES = "ACGT"
+
+
+def _sequence(rng: random.Random, length: int) -> str:
+    """Return a random sequence of length / 2 to length letters."""
+    return "".join(
+        rng.choice(NUCLEOTIDES)
+        for _ in range(rng.randrange(length // 2, length + 1))
+    )
+
+
+def _pairs(count: int, length: int, seed: int) -> list[tuple[str, str]]:
+    """Return count random pairs of at most length letters."""
+    rng = random.Random(seed)
+    return [
+        (_sequence(rng, length), _sequence(rng, length)) for _ in range(count)
+    ]
+
+
+async def run(
+    pairs: list[tuple[str, str]],
+    concurrency: int,
+    connections: int,
+    local: bool,
+    host: str,
+    port: int,
+    path: Optional[str],
+) -> tuple[float, list[float]]:
+    """Send pairs, return the wall time and the latency of every request."""
+    clients = [
+        await AsyncAlignmentClient.connect(host, port, path)
+        for _ in range(connections)
+    ]
+    latencies: list[float] = []
+    queue = iter(pairs)
+
+    async def worker(client: AsyncAlignmentClient) -> None:
+        for seq1, seq2 in queue:
+            start = time.perf_counter()
+            await client.align(seq1, seq2, local, strings=False)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(worker(clients[n % connections]) for n in range(concurrency))
+    )
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+    return elapsed, latencies
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    """Return a percentile of sorted values."""
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def _start_server(path: str, max_batch: int) -> "subprocess.Popen[bytes]":
+    """Start a server on a Unix socket and wait until it listens."""
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "from Command_line import main; main()",
+            "serve",
+            "--socket",
+            path,
+            "--max-batch",
+            str(max_batch),
+        ]
+    )
+    deadline = time.monotonic() + 30
+    while not os.path.exists(path):
+        if server.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("the alignment server did not start")
+        time.sleep(0.05)
+    return server
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the load, return the exit code."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument(
+        "--concurrency", type=int, default=64, help="requests in flight"
+    )
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument(
+        "--length", type=int, default=40, help="longest sequence"
+    )
+    parser.add_argument("--local", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--socket", metavar="PATH")
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=MAX_BATCH,
+        help="batch size of the server started without an address",
+    )
+    args = parser.parse_args(argv)
+
+    pairs = _pairs(args.requests, args.length, args.seed)
+    server = None
+    path = args.socket
+    with tempfile.TemporaryDirectory() as directory:
+        if path is None and args.port is None:
+            path = os.path.join(directory, "alignment.sock")
+            server = _start_server(path, args.max_batch)
+        try:
+            elapsed, latencies = asyncio.run(
+                run(
+                    pairs,
+                    args.concurrency,
+                    args.connections,
+                    args.local,
+                    args.host,
+                    args.port or 0,
+                    path,
+                )
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+    latencies.sort()
+    print(f"{len(pairs)} requests in {elapsed:.2f} s")
+    print(f"{len(pairs) / elapsed:10.0f} requests/s")
+    for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        latency = _percentile(latencies, fraction) * 1000
+        print(f"{name:>10} {latency:.2f} ms")
+    print(f"{'max':>10} {latencies[-1] * 1000:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Compact pairwise alignment results.
+
+The aligners return the aligned sequences as gapped strings, which for long
+alignments and large batches takes far more memory (and pickling time) than
+the alignment itself. An Alignment keeps the score, where the alignment
+starts and ends in both sequences and its moves as runs, like a CIGAR
+string: 6 bytes a run whatever its length. The gapped strings are only
+built when they are asked for:
+
+    alignment = needleman_wunsch_alignment(seq1, seq2, 1, -1, -1)
+    print(alignment.score, alignment.cigar())
+    aligned1, match, aligned2 = alignment.strings()
+
+The sequences themselves are not copied, the alignment keeps a reference
+to them.
+"""
+
+import re
+import numpy as np
+import numpy.typing as npt
+from typing import NamedTuple, Tuple
+
+from Encoded_sequence import SequenceLike
+from Wavefront import (
+    DIAGONAL,
+    HORIZONTAL,
+    VERTICAL,
+    Encodable,
+    alignment_strings,
+    encode,
+)
+
+GAP = ord("-")
+
+# seq1 is the reference: a letter of seq1 only is a deletion
+CIGAR_LETTERS = {DIAGONAL: "M", VERTICAL: "D", HORIZONTAL: "I"}
+CIGAR_MOVES = {letter: move for move, letter in CIGAR_LETTERS.items()}
+
+
+class Alignment(NamedTuple):
+    """An alignment of seq1[start1:end1] with seq2[start2:end2].
+
+    operations[n] is the move (DIAGONAL, VERTICAL or HORIZONTAL) of the
+    n-th run of moves and lengths holds the length of every run as little
+    endian uint32.
+    """
+
+    score: int
+    seq1: SequenceLike
+    seq2: SequenceLike
+    start1: int
+    end1: int
+    start2: int
+    end2: int
+    operations: bytes
+    lengths: bytes
+
+    @classmethod
+    def from_moves(
+        cls,
+        score: int,
+        moves: npt.NDArray[np.uint8],
+        seq1: SequenceLike,
+        seq2: SequenceLike,
+        start1: int = 0,
+        start2: int = 0,
+    ) -> "Alignment":
+        """Run length encode the moves of a traceback."""
+        moves = np.asarray(moves, dtype=np.uint8)
+        starts = np.flatnonzero(np.diff(moves)) + 1
+        if len(moves):
+            starts = np.concatenate([[0], starts])
+        lengths = np.diff(np.append(starts, len(moves)))
+        return cls(
+            score,
+            seq1,
+            seq2,
+            start1,
+            start1 + int(np.count_nonzero(moves != HORIZONTAL)),
+            start2,
+            start2 + int(np.count_nonzero(moves != VERTICAL)),
+            moves[starts].tobytes(),
+            lengths.astype("<u4").tobytes(),
+        )
+
+    @classmethod
+    def from_strings(
+        cls,
+        score: int,
+        aligned1: str,
+        aligned2: str,
+        seq1: SequenceLike,
+        seq2: SequenceLike,
+        start1: int = 0,
+        start2: int = 0,
+    ) -> "Alignment":
+        """Encode an alignment given as gapped strings."""
+        codes1 = encode(aligned1)
+        codes2 = encode(aligned2)
+        moves = np.full(len(codes1), DIAGONAL, dtype=np.uint8)
+        moves[codes2 == GAP] = VERTICAL
+        moves[codes1 == GAP] = HORIZONTAL
+        return cls.from_moves(score, moves, seq1, seq2, start1, start2)
+
+    @classmethod
+    def from_cigar(
+        cls,
+        score: int,
+        cigar: str,
+        seq1: SequenceLike,
+        seq2: SequenceLike,
+        start1: int = 0,
+        start2: int = 0,
+    ) -> "Alignment":
+        """Read back the CIGAR string of an alignment."""
+        runs = re.findall(r"(\d+)([MID])", cigar)
+        if "".join(length + letter for length, letter in runs) != cigar:
+            raise ValueError(f"invalid CIGAR string {cigar!r}")
+        moves = np.array(
+            [CIGAR_MOVES[letter] for _, letter in runs], dtype=np.uint8
+        )
+        lengths = np.array([int(length) for length, _ in runs])
+        return cls.from_moves(
+            score, np.repeat(moves, lengths), seq1, seq2, start1, start2
+        )
+
+    @property
+    def columns(self) -> int:
+        """Return the number of columns of the alignment."""
+        return int(np.frombuffer(self.lengths, dtype="<u4").sum())
+
+    def moves(self) -> npt.NDArray[np.uint8]:
+        """Return the moves, from the start to the end."""
+        return np.repeat(
+            np.frombuffer(self.operations, dtype=np.uint8),
+            np.frombuffer(self.lengths, dtype="<u4"),
+        )
+
+    def cigar(self) -> str:
+        """Return the CIGAR string, seq1 as the reference.
+
+        M is an aligned pair of letters, I a letter of seq2 only (a gap in
+        seq1) and D a letter of seq1 only.
+        """
+        return "".join(
+            f"{length}{CIGAR_LETTERS[move]}"
+            for move, length in zip(
+                self.operations,
+                np.frombuffer(self.lengths, dtype="<u4").tolist(),
+            )
+        )
+
+    def strings(self) -> Tuple[str, str, str]:
+        """Return the aligned seq1, the match string and the aligned seq2.
+
+        The match string is as in needleman_wunsch(verbose=True): "|" for
+        a match, "." for a mismatch and " " for a gap.
+        """
+        return alignment_strings(
+            self.moves(), self.seq1, self.seq2, self.start1, self.start2
+        )
+
+    def aligned_seq1(self) -> str:
+        """Return seq1 with the gaps of the alignment."""
+        return _gapped(self.seq1, self.start1, self.moves() != HORIZONTAL)
+
+    def aligned_seq2(self) -> str:
+        """Return seq2 with the gaps of the alignment."""
+        return _gapped(self.seq2, self.start2, self.moves() != VERTICAL)
+
+    def symbol(self) -> str:
+        """Return the symbol string of smith_waterman.
+
+        It has the letter of the columns that are a match and " " for the
+        others.
+        """
+        aligned1 = encode(self.aligned_seq1())
+        aligned2 = encode(self.aligned_seq2())
+        symbol = np.where(aligned1 == aligned2, aligned1, ord(" "))
+        return symbol.astype("<u4").tobytes().decode("utf-32-le")
+
+    def identity(self) -> int:
+        """Return the percent of columns that are a match, as an int."""
+        moves = self.moves()
+        if len(moves) == 0:
+            return 0
+        paired = moves == DIAGONAL
+        # position in each sequence of the letters of the paired columns
+        in_seq1 = np.cumsum(moves != HORIZONTAL)[paired] - 1 + self.start1
+        in_seq2 = np.cumsum(moves != VERTICAL)[paired] - 1 + self.start2
+        matches = np.count_nonzero(
+            encode(self.seq1)[in_seq1] == encode(self.seq2)[in_seq2]
+        )
+        return int(float(matches) / len(moves) * 100)
+
+
+def _gapped(seq: Encodable, start: int, present: npt.NDArray[np.bool_]) -> str:
+    """Return seq[start:] spread over the columns where present is True."""
+    codes = np.full(len(present), GAP, dtype=np.uint32)
+    used = slice(start, start + int(np.count_nonzero(present)))
+    codes[present] = encode(seq)[used]
+    return codes.astype("<u4").tobytes().decode("utf-32-le")
@@ -0,0 +1,314 @@
+"""
+Content addressed cache of pairwise alignment results.
+
+A result is stored under a hash of the two sequences, the algorithm and
+all its scoring parameters, so the same pair aligned with the same scores
+is found again whatever the run it comes from. The cache has two tiers: an
+in-memory LRU of the most recent results and, if a path is given, a sqlite
+file shared across runs and processes. Both tiers are bounded by a number
+of entries and drop their least recently used entries first.
+
+Any number of processes can write to the same sqlite file. The number of
+entries and the clock that orders their uses live in the file, in a
+counters row kept up to date by triggers and read inside the write
+transaction of every put, so the bound and the LRU order hold across all
+the writers.
+
+The cache is opt-in, pass one to needleman_wunsch, smith_waterman or
+multiple_alignment:
+
+    with AlignmentCache("alignments.sqlite") as cache:
+        needleman_wunsch(seq1, seq2, 1, -1, -1, cache=cache)
+        print(cache.stats)
+"""
+
+import hashlib
+import os
+import pickle
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager
+from types import TracebackType
+from typing import (
+    Any,
+    Callable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from Encoded_sequence import SequenceLike
+from Substitution_matrix import SubstitutionMatrix
+
+T = TypeVar("T")
+
+MEMORY_ENTRIES = 4096
+DISK_ENTRIES = 1_000_000
+
+
+class CacheStats(NamedTuple):
+    """Lookups of a cache since it was opened."""
+
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    evictions: int
+
+    @property
+    def hits(self) -> int:
+        """Return the lookups found in either tier."""
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        """Return the fraction of lookups that were found."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def _parameter_bytes(parameter: Any) -> bytes:
+    """Return the bytes that identify a scoring parameter."""
+    if isinstance(parameter, SubstitutionMatrix):
+        return b"matrix:%s:%s:%d" % (
+            parameter.letters.encode(),
+            parameter.scores.tobytes(),
+            parameter.default,
+        )
+    return repr(parameter).encode()
+
+
+def _sequence_bytes(sequence: SequenceLike) -> bytes:
+    """Return the letters of a sequence, a string and its encoding agree."""
+    if isinstance(sequence, str):
+        return sequence.encode()
+    return bytes(sequence)
+
+
+class AlignmentCache:
+    """Two tier LRU cache of alignment results.
+
+    memory_entries bounds the in-memory tier and disk_entries the sqlite
+    file at path. Without a path only the memory tier is used.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, "os.PathLike[str]", None] = None,
+        memory_entries: int = MEMORY_ENTRIES,
+        disk_entries: int = DISK_ENTRIES,
+    ) -> None:
+        """Open the cache, creating the sqlite file if needed."""
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory: OrderedDict[bytes, Any] = OrderedDict()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        if path is not None:
+            # autocommit, every put is visible to the other processes
+            self._connection = sqlite3.connect(
+                path, timeout=60, isolation_level=None
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS alignments "
+                "(key BLOB PRIMARY KEY, value BLOB NOT NULL, "
+                "used INTEGER NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS alignments_used "
+                "ON alignments (used)"
+            )
+            # the counters of a file made before they existed start from
+            # its entries, in the same transaction as the triggers
+            with self._transaction():
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS counters "
+                    "(id INTEGER PRIMARY KEY CHECK (id = 0), "
+                    "entries INTEGER NOT NULL, clock INTEGER NOT NULL)"
+                )
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO counters SELECT 0, COUNT(*), "
+                    "COALESCE(MAX(used), 0) FROM alignments"
+                )
+                self._connection.execute(
+                    "CREATE TRIGGER IF NOT EXISTS alignments_insert "
+                    "AFTER INSERT ON alignments BEGIN UPDATE counters "
+                    "SET entries = entries + 1; END"
+                )
+                self._connection.execute(
+                    "CREATE TRIGGER IF NOT EXISTS alignments_delete "
+                    "AFTER DELETE ON alignments BEGIN UPDATE counters "
+                    "SET entries = entries - 1; END"
+                )
+
+    @staticmethod
+    def key(
+        algorithm: str,
+        seq1: SequenceLike,
+        seq2: SequenceLike,
+        parameters: Sequence[Any] = (),
+    ) -> bytes:
+        """Return the hash of an alignment problem."""
+        digest = hashlib.blake2b(digest_size=20)
+        for part in (
+            algorithm.encode(),
+            *(_parameter_bytes(parameter) for parameter in parameters),
+            _sequence_bytes(seq1),
+            _sequence_bytes(seq2),
+        ):
+            # the length keeps the parts from running into each other
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.digest()
+
+    def get(self, key: bytes) -> Optional[Any]:
+        """Return the result stored under key, None if there is none."""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self._memory_hits += 1
+            return self._memory[key]
+        if self._connection is not None:
+            row = self._connection.execute(
+                "SELECT value FROM alignments WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._touch(key)
+                self._disk_hits += 1
+                value = pickle.loads(row[0])
+                self._remember(key, value)
+                return value
+        self._misses += 1
+        return None
+
+    def put(self, key: bytes, value: Any) -> None:
+        """Store a result in both tiers."""
+        self._remember(key, value)
+        if self._connection is None:
+            return
+        value_bytes = pickle.dumps(value)
+        with self._transaction():
+            self._connection.execute(
+                "INSERT OR IGNORE INTO alignments VALUES (?, ?, ?)",
+                (key, value_bytes, self._tick()),
+            )
+            # the entries of every process, under the write lock
+            (entries,) = self._connection.execute(
+                "SELECT entries FROM counters"
+            ).fetchone()
+            if entries > self.disk_entries:
+                self._evictions += self._connection.execute(
+                    "DELETE FROM alignments WHERE key IN (SELECT key FROM "
+                    "alignments ORDER BY used LIMIT ?)",
+                    (entries - self.disk_entries,),
+                ).rowcount
+
+    def cached(
+        self,
+        algorithm: str,
+        seq1: SequenceLike,
+        seq2: SequenceLike,
+        parameters: Sequence[Any],
+        compute: Callable[[], T],
+    ) -> T:
+        """Return the cached result of an alignment, compute it if missing.
+
+        A None result is computed again on every call.
+        """
+        key = self.key(algorithm, seq1, seq2, parameters)
+        value: Optional[T] = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def _touch(self, key: bytes) -> None:
+        """Mark a disk entry as the most recently used."""
+        assert self._connection is not None
+        with self._transaction():
+            self._connection.execute(
+                "UPDATE alignments SET used = ? WHERE key = ?",
+                (self._tick(), key),
+            )
+
+    def _tick(self) -> int:
+        """Return the next use of the clock shared by every process.
+
+        Only call it inside a transaction.
+        """
+        assert self._connection is not None
+        self._connection.execute("UPDATE counters SET clock = clock + 1")
+        (clock,) = self._connection.execute(
+            "SELECT clock FROM counters"
+        ).fetchone()
+        return int(clock)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Hold the write lock of the sqlite file, commit on success."""
+        assert self._connection is not None
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def _remember(self, key: bytes, value: Any) -> None:
+        """Keep a result in the memory tier."""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            # with a sqlite file the entry is still on disk
+            if self._connection is None:
+                self._evictions += 1
+
+    @property
+    def stats(self) -> CacheStats:
+        """Return the lookup statistics."""
+        return CacheStats(
+            self._memory_hits, self._disk_hits, self._misses, self._evictions
+        )
+
+    def __len__(self) -> int:
+        """Return the number of entries of the largest tier."""
+        if self._connection is not None:
+            (entries,) = self._connection.execute(
+                "SELECT entries FROM counters"
+            ).fetchone()
+            return int(entries)
+        return len(self._memory)
+
+    def clear(self) -> None:
+        """Drop every entry of both tiers."""
+        self._memory.clear()
+        if self._connection is not None:
+            self._connection.execute("DELETE FROM alignments")
+
+    def close(self) -> None:
+        """Close the sqlite file, the memory tier stays usable."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self) -> "AlignmentCache":
+        """Use the cache in a with statement."""
+        return self
+
+    def __exit__(
+        self,
+        kind: Optional[Type[BaseException]],
+        error: Optional[BaseException],
+        trace: Optional[TracebackType],
+    ) -> None:
+        """Close the cache."""
+        self.close()
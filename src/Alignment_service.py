@@ -0,0 +1,582 @@
+"""
+Local alignment service that keeps the aligners warm.
+
+A short lived process pays the interpreter start and the numpy import
+before it aligns anything. AlignmentServer runs an asyncio server, on
+localhost TCP or on a Unix socket, that aligns the pairs sent by any number
+of clients:
+
+    sequence-alignment serve --socket /tmp/alignment.sock
+
+    with AlignmentClient(path="/tmp/alignment.sock") as client:
+        result = client.align("ACGTAT", "AGTGCT", local=True)
+
+The protocol is one JSON object per line each way. A request is
+{"id": 1, "seq1": "ACGTAT", "seq2": "AGTGCT"} with optional "local",
+"match", "mismatch", "gap", "gap_extend", "matrix" (a matrix name) and
+"strings" (false to leave out the aligned sequences). The response has the
+id of its request and the score, the coordinates, the CIGAR string, the
+identity and the aligned sequences of the Alignment, or an "error".
+Responses come back as they are done, not in the order of the requests.
+
+Requests wait in a bounded queue. The batcher takes the first waiting
+request, the others that arrive within max_delay seconds (max_batch at
+most), and aligns the requests with the same scores together with
+align_batch, in a worker thread so that the server keeps reading requests
+meanwhile. When the queue is full, or a connection has max_in_flight
+requests waiting, the connection is not read until there is room again and
+the socket buffers hold the clients back.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from types import TracebackType
+from typing import (
+    Any,
+    BinaryIO,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
+
+from Alignment import Alignment
+from Batch_alignment import align_batch
+from Substitution_matrix import BLOSUM62, SubstitutionMatrix
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+MAX_BATCH = 256
+# seconds the first request of a batch waits for others
+MAX_DELAY = 0.002
+QUEUE_SIZE = 4096
+MAX_IN_FLIGHT = 1024
+# the service is for small pairs, bigger ones are refused
+MAX_CELLS = 1 << 22
+# longest request line
+LINE_LIMIT = 1 << 24
+
+# pairs a client sends ahead of the responses in align_many
+WINDOW = 256
+
+MATRICES: dict[str, SubstitutionMatrix] = {"BLOSUM62": BLOSUM62}
+
+# (match, mismatch, gap, gap_extend, matrix name)
+_Scores = Tuple[int, int, int, Optional[int], Optional[str]]
+
+
+class Request(NamedTuple):
+    """A pair to align, as sent by a client."""
+
+    id: Any
+    seq1: str
+    seq2: str
+    local: bool
+    scores: _Scores
+    strings: bool
+
+
+def _integer(message: dict[str, Any], name: str, default: int) -> int:
+    """Return an integer field of a request."""
+    value = message.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f"{name} must be an integer")
+    return value
+
+
+def _boolean(message: dict[str, Any], name: str, default: bool) -> bool:
+    """Return a boolean field of a request, a JSON true or false."""
+    value = message.get(name, default)
+    if not isinstance(value, bool):
+        raise ValueError(f"{name} must be a boolean")
+    return value
+
+
+def parse_request(line: bytes) -> Request:
+    """Read a request line, ValueError if it is not a valid request."""
+    message = json.loads(line)
+    if not isinstance(message, dict):
+        raise ValueError("a request must be a JSON object")
+    seq1 = message.get("seq1")
+    seq2 = message.get("seq2")
+    if not isinstance(seq1, str) or not isinstance(seq2, str):
+        raise ValueError("seq1 and seq2 must be strings")
+    if len(seq1) * len(seq2) > MAX_CELLS:
+        raise ValueError(f"pairs are limited to {MAX_CELLS} cells")
+    gap = _integer(message, "gap", -2)
+    gap_extend = message.get("gap_extend")
+    if gap_extend is not None:
+        gap_extend = _integer(message, "gap_extend", gap)
+        if gap_extend < gap:
+            raise ValueError("gap_extend must not be lower than gap")
+    matrix = message.get("matrix")
+    if matrix is not None and not isinstance(matrix, str):
+        raise ValueError("matrix must be a string")
+    if matrix is not None and matrix not in MATRICES:
+        raise ValueError(f"unknown matrix, expected one of {list(MATRICES)}")
+    return Request(
+        message.get("id"),
+        seq1,
+        seq2,
+        _boolean(message, "local", False),
+        (
+            _integer(message, "match", 1),
+            _integer(message, "mismatch", -1),
+            gap,
+            gap_extend,
+            matrix,
+        ),
+        _boolean(message, "strings", True),
+    )
+
+
+def _response(request: Request, alignment: Alignment) -> dict[str, Any]:
+    """Return the response to a request."""
+    response = {
+        "id": request.id,
+        "score": alignment.score,
+        "start1": alignment.start1,
+        "end1": alignment.end1,
+        "start2": alignment.start2,
+        "end2": alignment.end2,
+        "cigar": alignment.cigar(),
+        "identity": alignment.identity(),
+    }
+    if request.strings:
+        response["aligned1"] = alignment.aligned_seq1()
+        response["aligned2"] = alignment.aligned_seq2()
+    return response
+
+
+def _line(message: dict[str, Any]) -> bytes:
+    """Encode a message as a protocol line."""
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def _align_group(
+    requests: list[Request], local: bool, scores: _Scores
+) -> list[bytes]:
+    """Align requests with the same scores, return the response lines."""
+    # similar lengths next to each other pad less
+    order = sorted(
+        range(len(requests)),
+        key=lambda k: (len(requests[k].seq1), len(requests[k].seq2)),
+    )
+    match, mismatch, gap, gap_extend, matrix = scores
+    alignments = align_batch(
+        [(requests[k].seq1, requests[k].seq2) for k in order],
+        match,
+        mismatch,
+        gap,
+        gap_extend,
+        None if matrix is None else MATRICES[matrix],
+        local,
+    )
+    lines = [b""] * len(requests)
+    for k, alignment in zip(order, alignments):
+        lines[k] = _line(_response(requests[k], alignment))
+    return lines
+
+
+class AlignmentServer:
+    """Asyncio alignment server with micro-batching.
+
+    requests counts the aligned requests and batches the align_batch
+    calls that aligned them.
+    """
+
+    def __init__(
+        self,
+        max_batch: int = MAX_BATCH,
+        max_delay: float = MAX_DELAY,
+        queue_size: int = QUEUE_SIZE,
+        max_in_flight: int = MAX_IN_FLIGHT,
+    ) -> None:
+        """Set the batching and the bounds of the server."""
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+        self.max_in_flight = max_in_flight
+        self.requests = 0
+        self.batches = 0
+        self._queue: Optional[
+            "asyncio.Queue[Tuple[Request, asyncio.Future[bytes]]]"
+        ] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._batcher: Optional["asyncio.Task[None]"] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def start(
+        self,
+        host: str = HOST,
+        port: int = PORT,
+        path: Optional[str] = None,
+    ) -> asyncio.AbstractServer:
+        """Listen on host:port, or on the Unix socket path if given."""
+        self._queue = asyncio.Queue(self.queue_size)
+        self._executor = ThreadPoolExecutor(1)
+        self._batcher = asyncio.create_task(self._run_batches())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle, path, limit=LINE_LIMIT
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle, host, port, limit=LINE_LIMIT
+            )
+        return self._server
+
+    async def close(self) -> None:
+        """Stop listening and stop the batcher."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    async def serve_forever(
+        self,
+        host: str = HOST,
+        port: int = PORT,
+        path: Optional[str] = None,
+    ) -> None:
+        """Start the server and serve until cancelled."""
+        server = await self.start(host, port, path)
+        try:
+            await server.serve_forever()
+        finally:
+            await self.close()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Read the requests of a connection and queue them."""
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        responses: set["asyncio.Task[None]"] = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    # a line over LINE_LIMIT, or the client is gone
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = parse_request(line)
+                except Exception as error:
+                    # a bad request must not drop the connection and the
+                    # responses still pending on it
+                    writer.write(_line({"id": _id(line), "error": str(error)}))
+                    continue
+                await in_flight.acquire()
+                future: "asyncio.Future[bytes]" = loop.create_future()
+                await self._queue.put((request, future))
+                task = asyncio.create_task(
+                    self._respond(future, writer, in_flight)
+                )
+                responses.add(task)
+                task.add_done_callback(responses.discard)
+            if responses:
+                await asyncio.gather(*responses, return_exceptions=True)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _respond(
+        self,
+        future: "asyncio.Future[bytes]",
+        writer: asyncio.StreamWriter,
+        in_flight: asyncio.Semaphore,
+    ) -> None:
+        """Write the response of a request when it is done."""
+        try:
+            writer.write(await future)
+            await writer.drain()
+        finally:
+            in_flight.release()
+
+    async def _run_batches(self) -> None:
+        """Align the queued requests batch by batch."""
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(jobs) < self.max_batch:
+                if not self._queue.empty():
+                    jobs.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    jobs.append(
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            groups: dict[
+                Tuple[bool, _Scores],
+                list[Tuple[Request, "asyncio.Future[bytes]"]],
+            ] = {}
+            for request, future in jobs:
+                key = (request.local, request.scores)
+                groups.setdefault(key, []).append((request, future))
+            for (local, scores), group in groups.items():
+                requests = [request for request, _ in group]
+                try:
+                    lines = await loop.run_in_executor(
+                        self._executor,
+                        partial(_align_group, requests, local, scores),
+                    )
+                except Exception as error:
+                    lines = [
+                        _line({"id": request.id, "error": str(error)})
+                        for request in requests
+                    ]
+                for (_, future), line in zip(group, lines):
+                    if not future.done():
+                        future.set_result(line)
+                self.requests += len(group)
+                self.batches += 1
+
+
+def _id(line: bytes) -> Any:
+    """Return the id of an invalid request, if it can be read."""
+    try:
+        message = json.loads(line)
+    except ValueError:
+        return None
+    return message.get("id") if isinstance(message, dict) else None
+
+
+def _request(
+    request_id: int,
+    seq1: str,
+    seq2: str,
+    local: bool,
+    scoring: dict[str, Any],
+) -> bytes:
+    """Encode a request line."""
+    return _line(
+        {"id": request_id, "seq1": seq1, "seq2": seq2, "local": local}
+        | scoring
+    )
+
+
+def _result(line: bytes) -> dict[str, Any]:
+    """Decode a response line, ValueError for an error response."""
+    if not line:
+        raise ConnectionError("the alignment server closed the connection")
+    response: dict[str, Any] = json.loads(line)
+    if "error" in response:
+        raise ValueError(response["error"])
+    return response
+
+
+class AlignmentClient:
+    """Blocking client of an AlignmentServer.
+
+    scoring are the optional request fields (match, mismatch, gap,
+    gap_extend, matrix, strings) sent with every pair.
+    """
+
+    def __init__(
+        self,
+        host: str = HOST,
+        port: int = PORT,
+        path: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Connect to host:port, or to the Unix socket path if given."""
+        address: Union[str, Tuple[str, int]]
+        if path is not None:
+            self._socket = socket.socket(socket.AF_UNIX)
+            address = path
+        else:
+            self._socket = socket.socket(socket.AF_INET)
+            address = (host, port)
+        self._socket.settimeout(timeout)
+        self._socket.connect(address)
+        self._file: BinaryIO = self._socket.makefile("rwb")  # type: ignore
+        self._next_id = 0
+
+    def align(
+        self, seq1: str, seq2: str, local: bool = False, **scoring: Any
+    ) -> dict[str, Any]:
+        """Align one pair and return the response."""
+        return self.align_many([(seq1, seq2)], local, **scoring)[0]
+
+    def align_many(
+        self,
+        pairs: Iterable[Tuple[str, str]],
+        local: bool = False,
+        **scoring: Any,
+    ) -> list[dict[str, Any]]:
+        """Align pairs, in order, keeping up to WINDOW of them in flight.
+
+        Sending every pair before reading any response could fill the
+        socket buffers of both sides, so the responses are read as the
+        pairs are sent.
+        """
+        first = self._next_id
+        lines: dict[int, bytes] = {}
+        for seq1, seq2 in pairs:
+            if self._next_id - first - len(lines) >= WINDOW:
+                self._file.flush()
+                self._read_into(lines)
+            self._file.write(
+                _request(self._next_id, seq1, seq2, local, scoring)
+            )
+            self._next_id += 1
+        self._file.flush()
+        while len(lines) < self._next_id - first:
+            self._read_into(lines)
+        return [_result(lines[k]) for k in range(first, self._next_id)]
+
+    def _read_into(self, lines: dict[int, bytes]) -> None:
+        """Read one response and keep it under its id."""
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("the alignment server closed the connection")
+        lines[json.loads(line)["id"]] = line
+
+    def close(self) -> None:
+        """Close the connection."""
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self) -> "AlignmentClient":
+        """Use the client in a with statement."""
+        return self
+
+    def __exit__(
+        self,
+        kind: Optional[Type[BaseException]],
+        error: Optional[BaseException],
+        trace: Optional[TracebackType],
+    ) -> None:
+        """Close the client."""
+        self.close()
+
+
+class AsyncAlignmentClient:
+    """Asyncio client of an AlignmentServer.
+
+    Any number of align calls can wait at the same time on one
+    connection, the responses are matched to them by id.
+    """
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Wrap an open connection, use connect to open one."""
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count()
+        self._waiting: dict[int, "asyncio.Future[dict[str, Any]]"] = {}
+        self._receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect(
+        cls, host: str = HOST, port: int = PORT, path: Optional[str] = None
+    ) -> "AsyncAlignmentClient":
+        """Connect to host:port, or to the Unix socket path if given."""
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(
+                path, limit=LINE_LIMIT
+            )
+        else:
+            reader, writer = await asyncio.open_connection(
+                host, port, limit=LINE_LIMIT
+            )
+        return cls(reader, writer)
+
+    async def align(
+        self, seq1: str, seq2: str, local: bool = False, **scoring: Any
+    ) -> dict[str, Any]:
+        """Align one pair and return the response."""
+        request_id = next(self._ids)
+        future: "asyncio.Future[dict[str, Any]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._waiting[request_id] = future
+        self._writer.write(_request(request_id, seq1, seq2, local, scoring))
+        await self._writer.drain()
+        return await future
+
+    async def _receive(self) -> None:
+        """Hand every response to the call waiting for it."""
+        error: BaseException = ConnectionError(
+            "the alignment server closed the connection"
+        )
+        try:
+            while line := await self._reader.readline():
+                response = json.loads(line)
+                future = self._waiting.pop(response.get("id"), None)
+                if future is None or future.done():
+                    continue
+                try:
+                    future.set_result(_result(line))
+                except ValueError as failure:
+                    future.set_exception(failure)
+        except (ConnectionError, ValueError) as failure:
+            error = failure
+        for future in self._waiting.values():
+            if not future.done():
+                future.set_exception(error)
+        self._waiting.clear()
+
+    async def close(self) -> None:
+        """Close the connection."""
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._receiver.cancel()
+        try:
+            await self._receiver
+        except asyncio.CancelledError:
+            pass
+
+
+def serve(
+    host: str = HOST,
+    port: int = PORT,
+    path: Optional[str] = None,
+    max_batch: int = MAX_BATCH,
+    max_delay: float = MAX_DELAY,
+    queue_size: int = QUEUE_SIZE,
+) -> None:
+    """Run an AlignmentServer until interrupted."""
+    server = AlignmentServer(max_batch, max_delay, queue_size)
+    try:
+        asyncio.run(server.serve_forever(host, port, path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if path is not None and os.path.exists(path):
+            os.unlink(path)
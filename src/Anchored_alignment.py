@@ -0,0 +1,286 @@
+"""
+Anchored multiple alignment of long sequences.
+
+multiple_alignment fills profile matrices over the whole length of the
+sequences at every merge, which rules out gene or genome length inputs.
+anchored_alignment first cuts the sequences at anchors: k-mers found once,
+and only once, in every sequence, kept in the same order in all of them and
+merged into longer matches when they follow each other. An anchor is
+aligned as it is, column for column. Only the segments between two anchors
+go through multiple_alignment, each on its own, in parallel over a process
+pool with workers != 1, and the rows of the segments are concatenated.
+
+A segment still longer than segment_length is cut again at the k-mers that
+are unique within it, halving k down to MIN_ANCHOR_SIZE when none is, so
+time and memory follow the length of the segments rather than the length
+of the sequences. Sequences no longer than segment_length are not cut and
+get the alignment of multiple_alignment.
+"""
+
+import bisect
+import multiprocessing
+from collections import deque
+from multiprocessing.pool import AsyncResult
+from typing import Deque, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from Encoded_sequence import SequenceLike
+from Guide_tree import METHODS
+from Instrumentation import phase
+from Multiple_alignment import multiple_alignment
+from Seed_index import _kmer_hashes
+from Wavefront import encode
+
+ANCHOR_SIZE = 20
+
+MIN_ANCHOR_SIZE = 8
+
+# longest segment aligned without looking for anchors within it
+SEGMENT_LENGTH = 1000
+
+# letters of the segments sent to a worker per task
+LETTERS_PER_TASK = 1 << 16
+
+_Codes = npt.NDArray[np.uint32]
+_Positions = npt.NDArray[np.int64]
+
+
+def _unique_kmers(codes: _Codes, k: int) -> Tuple[
+    npt.NDArray[np.uint64],
+    _Positions,
+]:
+    """Return the sorted hashes of the k-mers seen once and their starts."""
+    hashes, starts, counts = np.unique(
+        _kmer_hashes(codes, k), return_index=True, return_counts=True
+    )
+    once = counts == 1
+    return hashes[once], starts[once].astype(np.int64)
+
+
+def _increasing(values: _Positions) -> npt.NDArray[np.intp]:
+    """Return the indices of a longest strictly increasing subsequence."""
+    # tails[n] is the smallest last value of the subsequences of n + 1
+    # values, ends[n] its index
+    tails: list[int] = []
+    ends: list[int] = []
+    previous = []
+    for index, value in enumerate(values.tolist()):
+        length = bisect.bisect_left(tails, value)
+        if length == len(tails):
+            tails.append(value)
+            ends.append(index)
+        else:
+            tails[length] = value
+            ends[length] = index
+        previous.append(ends[length - 1] if length else -1)
+    chain = []
+    index = ends[-1] if ends else -1
+    while index >= 0:
+        chain.append(index)
+        index = previous[index]
+    return np.array(chain[::-1], dtype=np.intp)
+
+
+def _merged(starts: _Positions, k: int) -> Tuple[_Positions, _Positions]:
+    """Merge the k-mers of the same match, drop the ones that overlap.
+
+    starts[a, s] is where anchor a starts in sequence s, the anchors are in
+    increasing order in every sequence. Return the starts and the lengths
+    of the anchors that are left.
+    """
+    if len(starts) == 0:
+        return starts, np.zeros(0, dtype=np.int64)
+    # the next k-mer of the same match moves by the same step in every
+    # sequence and overlaps, or touches, the current one
+    steps = np.diff(starts, axis=0)
+    joined = (steps == steps[:, :1]).all(axis=1) & (steps[:, 0] <= k)
+    first = np.flatnonzero(np.concatenate([[True], ~joined]))
+    last = np.append(first[1:] - 1, len(starts) - 1)
+    lengths = starts[last, 0] - starts[first, 0] + k
+    kept = []
+    end = [0] * starts.shape[1]
+    for index, (start, length) in enumerate(
+        zip(starts[first].tolist(), lengths.tolist())
+    ):
+        if all(at >= stop for at, stop in zip(start, end)):
+            kept.append(index)
+            end = [at + length for at in start]
+    return starts[first[kept]], lengths[kept]
+
+
+def _anchors(codes: Sequence[_Codes], k: int) -> Tuple[_Positions, _Positions]:
+    """Return the anchors of k letters or more shared by all the codes.
+
+    Return the start of every anchor in every sequence, one row an anchor,
+    and their lengths. The anchors are in order and do not overlap.
+    """
+    hashes, positions = _unique_kmers(codes[0], k)
+    columns = [positions]
+    for seq in codes[slice(1, None)]:
+        other, at = _unique_kmers(seq, k)
+        hashes, kept, found = np.intersect1d(
+            hashes, other, assume_unique=True, return_indices=True
+        )
+        columns = [column[kept] for column in columns] + [at[found]]
+    starts = np.stack(columns, axis=1)
+    starts = starts[np.argsort(starts[:, 0], kind="stable")]
+    # keep the anchors in the order of the first sequence in all the others
+    for column in range(1, len(codes)):
+        starts = starts[_increasing(starts[:, column])]
+    # two different k-mers may share a hash
+    letters = np.arange(k)
+    first = codes[0][starts[:, :1] + letters]
+    same = np.ones(len(starts), dtype=bool)
+    for column in range(1, len(codes)):
+        window = codes[column][starts[:, column, None] + letters]
+        same &= (window == first).all(axis=1)
+    return _merged(starts[same], k)
+
+
+def _cut(
+    codes: Sequence[_Codes],
+    begin: _Positions,
+    end: _Positions,
+    k: int,
+    segment_length: int,
+) -> Iterator[Tuple[_Positions, _Positions]]:
+    """Yield the segments, in order, of the region begin:end of the codes.
+
+    A segment is the start and the end of its piece of every sequence.
+    """
+    if int((end - begin).max()) <= segment_length:
+        yield begin, end
+        return
+    region = [seq[slice(b, e)] for seq, b, e in zip(codes, begin, end)]
+    while k >= MIN_ANCHOR_SIZE:
+        starts, lengths = _anchors(region, k)
+        if len(starts):
+            break
+        k //= 2
+    else:
+        yield begin, end
+        return
+    cursor = begin
+    for start, length in zip(starts + begin, lengths):
+        if (start > cursor).any():
+            yield from _cut(codes, cursor, start, k, segment_length)
+        yield start, start + length
+        cursor = start + length
+    if (end > cursor).any():
+        yield from _cut(codes, cursor, end, k, segment_length)
+
+
+def _align_segment(
+    pieces: list[str], guide: str, collapse_duplicates: bool
+) -> list[str]:
+    """Return the rows of the multiple alignment of one segment.
+
+    Empty pieces are not aligned, they get a row of gaps.
+    """
+    if len(set(pieces)) == 1:
+        return pieces
+    present = [index for index, piece in enumerate(pieces) if piece]
+    aligned = multiple_alignment(
+        [pieces[index] for index in present],
+        guide,
+        collapse_duplicates=collapse_duplicates,
+    )
+    rows = ["-" * len(aligned[0])] * len(pieces)
+    for index, row in zip(present, aligned):
+        rows[index] = row
+    return rows
+
+
+def _align_segments(
+    task: Tuple[list[list[str]], str, bool],
+) -> list[list[str]]:
+    """Align the segments of a task, see _align_segment."""
+    segments, guide, collapse_duplicates = task
+    return [
+        _align_segment(pieces, guide, collapse_duplicates)
+        for pieces in segments
+    ]
+
+
+def _tasks(
+    texts: Sequence[str],
+    segments: Iterator[Tuple[_Positions, _Positions]],
+    guide: str,
+    collapse_duplicates: bool,
+) -> Iterator[Tuple[list[list[str]], str, bool]]:
+    """Group the pieces of consecutive segments into tasks.
+
+    A task holds LETTERS_PER_TASK letters or a single segment.
+    """
+    task: list[list[str]] = []
+    letters = 0
+    for begin, end in segments:
+        task.append(
+            [text[slice(b, e)] for text, b, e in zip(texts, begin, end)]
+        )
+        letters += int((end - begin).sum())
+        if letters >= LETTERS_PER_TASK:
+            yield task, guide, collapse_duplicates
+            task = []
+            letters = 0
+    if task:
+        yield task, guide, collapse_duplicates
+
+
+def anchored_alignment(
+    seqs: Sequence[SequenceLike],
+    guide: str = "upgma",
+    workers: Optional[int] = 1,
+    collapse_duplicates: bool = False,
+    k: int = ANCHOR_SIZE,
+    segment_length: int = SEGMENT_LENGTH,
+) -> list[str]:
+    """Return an alignment of any n sequences through shared anchors.
+
+    guide is a guide tree method of multiple_alignment, the result is in
+    the order of seqs, and collapse_duplicates is as in multiple_alignment,
+    segment by segment. The anchors are k-mers unique in every sequence,
+    the sequences are cut at them until no segment is longer than
+    segment_length or no anchor is left. workers aligns the segments over a
+    process pool, the alignment does not depend on it. workers=None uses
+    one process per cpu.
+    """
+    if guide not in METHODS:
+        raise ValueError(f"unknown guide {guide!r}, expected one of {METHODS}")
+    if k < 1:
+        raise ValueError("k must be at least 1")
+    if len(seqs) < 2:
+        return [str(seq) for seq in seqs]
+    texts = [str(seq) for seq in seqs]
+    codes = [encode(seq) for seq in seqs]
+    lengths = np.array([len(text) for text in texts], dtype=np.int64)
+    with phase("msa.anchors", int(lengths.sum())):
+        segments = list(
+            _cut(codes, np.zeros_like(lengths), lengths, k, segment_length)
+        )
+    rows: list[list[str]] = [[] for _ in texts]
+
+    def collect(aligned: list[list[str]]) -> None:
+        for segment in aligned:
+            for row, piece in zip(rows, segment):
+                row.append(piece)
+
+    tasks = _tasks(texts, iter(segments), guide, collapse_duplicates)
+    if workers == 1:
+        for task in tasks:
+            collect(_align_segments(task))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            # only a couple of tasks per worker are in flight, so the pieces
+            # are cut as the workers need them
+            in_flight = 2 * (workers or multiprocessing.cpu_count())
+            pending: Deque["AsyncResult[list[list[str]]]"] = deque()
+            for task in tasks:
+                if len(pending) >= in_flight:
+                    collect(pending.popleft().get())
+                pending.append(pool.apply_async(_align_segments, (task,)))
+            while pending:
+                collect(pending.popleft().get())
+    return ["".join(row) for row in rows]
@@ -0,0 +1,114 @@
+"""
+Vectorized alignment of many small pairs at once.
+
+Aligning one pair with the Wavefront engine costs a handful of numpy calls
+per anti-diagonal whatever the length of the pair, and for short pairs
+these calls are most of the time. align_batch stacks the pairs, padded to
+the longest ones, and fills all their matrices together with fill_batch,
+so every numpy call works on all the pairs of a batch. The alignments are
+the ones of needleman_wunsch and smith_waterman, ties included.
+"""
+
+import numpy as np
+import numpy.typing as npt
+from typing import Iterator, Optional, Sequence, Tuple
+
+from Alignment import Alignment
+from Encoded_sequence import SequenceLike
+from Instrumentation import phase
+from Substitution_matrix import SubstitutionMatrix
+from Wavefront import encode, fill_batch, traceback
+
+# upper bound of the traceback cells of a batch, padding included
+BATCH_CELLS = 1 << 20
+
+_Pair = Tuple[SequenceLike, SequenceLike]
+
+
+def _batches(
+    pairs: Sequence[_Pair], batch_cells: int
+) -> Iterator[Sequence[_Pair]]:
+    """Cut pairs, in order, into batches of at most batch_cells cells.
+
+    A pair bigger than batch_cells is a batch on its own.
+    """
+    first = 0
+    rows = cols = 0
+    for index, (seq1, seq2) in enumerate(pairs):
+        rows = max(rows, len(seq1))
+        cols = max(cols, len(seq2))
+        if (index - first + 1) * (rows + 1) * (cols + 1) > batch_cells:
+            if index > first:
+                yield pairs[first:index]
+            first = index
+            rows, cols = len(seq1), len(seq2)
+    if first < len(pairs):
+        yield pairs[first:]
+
+
+def _padded(seqs: Sequence[SequenceLike]) -> Tuple[
+    npt.NDArray[np.uint32],
+    npt.NDArray[np.int64],
+]:
+    """Return the codes of seqs, padded to the longest, and their lengths."""
+    lengths = np.array([len(seq) for seq in seqs], dtype=np.int64)
+    codes = np.zeros((len(seqs), int(lengths.max())), dtype=np.uint32)
+    for row, seq in zip(codes, seqs):
+        row[slice(len(seq))] = encode(seq)
+    return codes, lengths
+
+
+def align_batch(
+    pairs: Sequence[_Pair],
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
+    local: bool = False,
+    batch_cells: int = BATCH_CELLS,
+) -> list[Alignment]:
+    """Align every pair, globally or with local, as one vectorized batch.
+
+    The result of a pair is the needleman_wunsch alignment (the
+    smith_waterman one with local) as an Alignment. gap_extend and matrix
+    are as in needleman_wunsch. Pairs are filled batch_cells traceback
+    cells at a time, so keep pairs of similar lengths together: a batch is
+    padded to its longest sequences.
+    """
+    if gap_extend is None:
+        gap_extend = gap_penalty
+    elif gap_extend < gap_penalty:
+        raise ValueError("gap_extend must not be lower than gap_penalty")
+    alignments = []
+    for batch in _batches(pairs, batch_cells):
+        codes1, lengths1 = _padded([seq1 for seq1, _ in batch])
+        codes2, lengths2 = _padded([seq2 for _, seq2 in batch])
+        cells = int(lengths1 @ lengths2)
+        matrix_bytes = (
+            len(batch) * (codes1.shape[1] + 1) * (codes2.shape[1] + 1)
+        )
+        with phase("batch.fill", cells, matrix_bytes):
+            scores, ends1, ends2, trace = fill_batch(
+                codes1,
+                lengths1,
+                codes2,
+                lengths2,
+                match_score,
+                mismatch_score,
+                gap_penalty,
+                gap_extend,
+                matrix,
+                local,
+            )
+        with phase("batch.traceback"):
+            for b, (seq1, seq2) in enumerate(batch):
+                start1, start2, moves = traceback(
+                    trace[b], int(ends1[b]), int(ends2[b])
+                )
+                alignments.append(
+                    Alignment.from_moves(
+                        int(scores[b]), moves, seq1, seq2, start1, start2
+                    )
+                )
+    return alignments
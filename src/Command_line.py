@@ -0,0 +1,567 @@
+"""
+Command line entry point for batch alignment jobs.
+
+    sequence-alignment global FILE1 FILE2      align record k of FILE1 with
+    sequence-alignment local FILE1 FILE2       record k of FILE2, or every
+                                               pair with --all-pairs
+    sequence-alignment search QUERIES DATABASE best hits of every query
+    sequence-alignment msa FILE                multiple alignment
+    sequence-alignment serve                   alignment service, see
+                                               Alignment_service
+
+Inputs are FASTA or FASTQ files, read as a stream. Pairs are aligned one
+chunk at a time, in --threads worker processes, and every chunk is written
+as soon as it is done and in input order, so a batch of any size never
+holds all its results in memory.
+
+Output formats:
+pairwise: a header line, the two aligned sequences and the symbol line
+tsv: one line per alignment with its score, identity and CIGAR string
+fasta: the aligned sequences as FASTA records
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import sys
+from collections import deque
+from multiprocessing.pool import AsyncResult
+from typing import (
+    BinaryIO,
+    Deque,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from Alignment import Alignment
+from Alignment_cache import AlignmentCache
+from Alignment_service import (
+    HOST,
+    MAX_BATCH,
+    MAX_DELAY,
+    PORT,
+    QUEUE_SIZE,
+    serve,
+)
+from Anchored_alignment import anchored_alignment
+from Database_search import search
+from Encoded_sequence import SequenceLike
+from Guide_tree import METHODS
+from Multiple_alignment import multiple_alignment
+from Needleman_wunsch import needleman_wunsch
+from Sequence_io import Record, read_sequences, write_fasta
+from Smith_waterman import _symbol_and_identity, smith_waterman
+from Substitution_matrix import BLOSUM62, SubstitutionMatrix
+
+FORMATS = ("pairwise", "tsv", "fasta")
+
+TSV_HEADER = b"name1\tname2\tscore\tidentity\tcigar\n"
+
+# matrices known by name, any other --matrix is read as a file
+MATRICES = {"BLOSUM62": BLOSUM62}
+
+# (name1, seq1, name2, seq2)
+_Pair = Tuple[str, SequenceLike, str, SequenceLike]
+
+
+class Scoring(NamedTuple):
+    """Scores shared by every alignment of a run."""
+
+    match_score: int
+    mismatch_score: int
+    gap_penalty: int
+    gap_extend: Optional[int]
+    matrix: Optional[SubstitutionMatrix]
+
+
+class AlignedPair(NamedTuple):
+    """An alignment as written to the output."""
+
+    name1: str
+    name2: str
+    score: int
+    identity: int
+    aligned1: str
+    symbol: str
+    aligned2: str
+
+
+def _cigar(pair: AlignedPair) -> str:
+    """Return the CIGAR string of an alignment, see Alignment.cigar."""
+    return Alignment.from_strings(
+        pair.score,
+        pair.aligned1,
+        pair.aligned2,
+        pair.aligned1.replace("-", ""),
+        pair.aligned2.replace("-", ""),
+    ).cigar()
+
+
+def format_pairs(pairs: Iterable[AlignedPair], output_format: str) -> bytes:
+    """Return alignments in an output format."""
+    lines = []
+    for pair in pairs:
+        if output_format == "pairwise":
+            lines.append(
+                f"# {pair.name1} vs {pair.name2} score={pair.score} "
+                f"identity={pair.identity}%\n"
+                f"{pair.aligned1}\n{pair.symbol}\n{pair.aligned2}\n\n"
+            )
+        elif output_format == "tsv":
+            lines.append(
+                f"{pair.name1}\t{pair.name2}\t{pair.score}\t"
+                f"{pair.identity}\t{_cigar(pair)}\n"
+            )
+        else:
+            lines.append(
+                f">{pair.name1}\n{pair.aligned1}\n"
+                f">{pair.name2}\n{pair.aligned2}\n"
+            )
+    return "".join(lines).encode()
+
+
+def align_pair(
+    name1: str,
+    seq1: SequenceLike,
+    name2: str,
+    seq2: SequenceLike,
+    scoring: Scoring,
+    local: bool,
+    cache: Optional[AlignmentCache] = None,
+) -> AlignedPair:
+    """Align two sequences with smith_waterman or needleman_wunsch."""
+    if local:
+        identity, score, aligned1, symbol, aligned2 = smith_waterman(
+            seq1, seq2, *scoring, cache=cache
+        )
+    else:
+        result = needleman_wunsch(
+            seq1,
+            seq2,
+            scoring.match_score,
+            scoring.mismatch_score,
+            scoring.gap_penalty,
+            gap_extend=scoring.gap_extend,
+            matrix=scoring.matrix,
+            cache=cache,
+        )
+        assert not isinstance(result, str)
+        score, aligned1, aligned2 = result
+        symbol, identity = _symbol_and_identity(aligned1, aligned2)
+    return AlignedPair(
+        name1, name2, score, identity, aligned1, symbol, aligned2
+    )
+
+
+_worker_scoring: Optional[Scoring] = None
+_worker_local = False
+_worker_format = "pairwise"
+_worker_cache: Optional[AlignmentCache] = None
+
+
+def _init_worker(
+    scoring: Scoring,
+    local: bool,
+    output_format: str,
+    cache_path: Optional[str] = None,
+) -> None:
+    """Keep the settings of the run in the worker for every chunk.
+
+    Every worker opens its own connection to the cache file.
+    """
+    global _worker_scoring, _worker_local, _worker_format, _worker_cache
+    _worker_scoring = scoring
+    _worker_local = local
+    _worker_format = output_format
+    _worker_cache = None if cache_path is None else AlignmentCache(cache_path)
+
+
+def _align_chunk(chunk: list[_Pair]) -> bytes:
+    """Align a chunk of pairs and return its formatted output."""
+    assert _worker_scoring is not None
+    return format_pairs(
+        (
+            align_pair(*pair, _worker_scoring, _worker_local, _worker_cache)
+            for pair in chunk
+        ),
+        _worker_format,
+    )
+
+
+def _chunks(pairs: Iterable[_Pair], size: int) -> Iterator[list[_Pair]]:
+    """Cut pairs into chunks without reading ahead."""
+    iterator = iter(pairs)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _pairs(path1: str, path2: str, all_pairs: bool) -> Iterator[_Pair]:
+    """Yield the pairs of records of two files.
+
+    Record k of path1 goes with record k of path2, or with every record of
+    path2 if all_pairs. path2 is then read again for every record of path1
+    instead of being kept in memory.
+    """
+    if all_pairs:
+        records: Iterable[Tuple[Record, Record]] = (
+            (record1, record2)
+            for record1 in read_sequences(path1)
+            for record2 in read_sequences(path2)
+        )
+    else:
+        records = zip(read_sequences(path1), read_sequences(path2))
+    for record1, record2 in records:
+        yield record1.name, record1.sequence, record2.name, record2.sequence
+
+
+def align_pairs(
+    pairs: Iterable[_Pair],
+    output: BinaryIO,
+    scoring: Scoring,
+    local: bool,
+    output_format: str = "pairwise",
+    threads: Optional[int] = 1,
+    chunk_size: int = 1024,
+    cache_path: Optional[str] = None,
+) -> None:
+    """Align pairs and write them chunk by chunk, in input order.
+
+    threads > 1 aligns the chunks in a process pool, threads=None uses one
+    process per cpu. Only a couple of chunks per process are in flight.
+    cache_path is an AlignmentCache file shared by all the processes.
+    """
+    if output_format == "tsv":
+        output.write(TSV_HEADER)
+    if threads == 1:
+        _init_worker(scoring, local, output_format, cache_path)
+        try:
+            for chunk in _chunks(pairs, chunk_size):
+                output.write(_align_chunk(chunk))
+        finally:
+            if _worker_cache is not None:
+                _worker_cache.close()
+        return
+    with multiprocessing.Pool(
+        threads,
+        initializer=_init_worker,
+        initargs=(scoring, local, output_format, cache_path),
+    ) as pool:
+        in_flight = 2 * (threads or multiprocessing.cpu_count())
+        pending: Deque["AsyncResult[bytes]"] = deque()
+        for chunk in _chunks(pairs, chunk_size):
+            if len(pending) >= in_flight:
+                output.write(pending.popleft().get())
+            pending.append(pool.apply_async(_align_chunk, (chunk,)))
+        while pending:
+            output.write(pending.popleft().get())
+
+
+def _names_at(path: str, indices: Sequence[int]) -> dict[int, str]:
+    """Return the names of some records of a file, read as a stream."""
+    wanted = set(indices)
+    names = {}
+    for index, record in enumerate(read_sequences(path)):
+        if index in wanted:
+            names[index] = record.name
+            if len(names) == len(wanted):
+                break
+    return names
+
+
+def search_queries(
+    queries: str,
+    database: str,
+    output: BinaryIO,
+    scoring: Scoring,
+    k: int = 10,
+    output_format: str = "pairwise",
+    threads: Optional[int] = 1,
+    chunk_size: int = 1024,
+) -> None:
+    """Search every record of queries in database, query by query.
+
+    The database is streamed for every query, only the names of the hits
+    are looked up afterwards.
+    """
+    if output_format == "tsv":
+        output.write(TSV_HEADER)
+    for query in read_sequences(queries):
+        hits = search(
+            query.sequence,
+            (record.sequence for record in read_sequences(database)),
+            scoring.match_score,
+            scoring.mismatch_score,
+            scoring.gap_penalty,
+            k=k,
+            workers=threads,
+            chunk_size=chunk_size,
+            gap_extend=scoring.gap_extend,
+            matrix=scoring.matrix,
+        )
+        names = _names_at(database, [hit.target_index for hit in hits])
+        output.write(
+            format_pairs(
+                (
+                    AlignedPair(
+                        query.name,
+                        names[hit.target_index],
+                        hit.score,
+                        hit.identity,
+                        hit.aligned_query,
+                        hit.symbol,
+                        hit.aligned_target,
+                    )
+                    for hit in hits
+                ),
+                output_format,
+            )
+        )
+
+
+def align_multiple(
+    path: str,
+    output: BinaryIO,
+    guide: str = "upgma",
+    threads: Optional[int] = 1,
+    line_width: int = 60,
+    collapse_duplicates: bool = False,
+    anchored: bool = False,
+) -> None:
+    """Write the multiple alignment of the records of a file as FASTA.
+
+    guide is a guide tree method, the tree guides keep the rows in the
+    order of the records. collapse_duplicates is as in multiple_alignment.
+    anchored cuts long sequences at their shared anchors first, as in
+    anchored_alignment.
+
+    threads aligns the segments of anchored in parallel, with either
+    guide. Without anchored the guide tree is built from k-mer distances
+    and its profiles merged in one process, so threads other than 1 raise
+    a ValueError instead of being ignored.
+    """
+    if threads != 1 and not anchored:
+        raise ValueError("threads only applies to anchored alignments")
+    records = list(read_sequences(path))
+    align = anchored_alignment if anchored else multiple_alignment
+    aligned = align(
+        [record.sequence for record in records],
+        guide,
+        threads,
+        collapse_duplicates=collapse_duplicates,
+    )
+    write_fasta(
+        output,
+        (Record(record.name, row) for record, row in zip(records, aligned)),
+        line_width,
+    )
+
+
+def _matrix(name: Optional[str]) -> Optional[SubstitutionMatrix]:
+    """Return the matrix named by --matrix, a file if not a known name."""
+    if name is None:
+        return None
+    if name.upper() in MATRICES:
+        return MATRICES[name.upper()]
+    return SubstitutionMatrix.load(name)
+
+
+def _parser() -> argparse.ArgumentParser:
+    """Build the argument parser."""
+    parser = argparse.ArgumentParser(
+        prog="sequence-alignment", description=__doc__.split("\n\n")[0]
+    )
+    scoring = argparse.ArgumentParser(add_help=False)
+    scoring.add_argument("--match", type=int, default=1)
+    scoring.add_argument("--mismatch", type=int, default=-1)
+    scoring.add_argument(
+        "--gap", type=int, default=-2, help="gap opening penalty"
+    )
+    scoring.add_argument(
+        "--gap-extend",
+        type=int,
+        help="gap extension penalty for affine gaps (default: --gap)",
+    )
+    scoring.add_argument(
+        "--matrix",
+        help="substitution matrix, BLOSUM62 or an NCBI matrix file, "
+        "replaces --match and --mismatch",
+    )
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="worker processes, 0 for one per cpu",
+    )
+    common.add_argument(
+        "-o", "--output", default="-", help="output file (default: stdout)"
+    )
+    batch = argparse.ArgumentParser(add_help=False)
+    batch.add_argument("--format", choices=FORMATS, default="pairwise")
+    batch.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1024,
+        help="pairs (targets for search) per chunk",
+    )
+
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, description in (
+        ("global", "global alignment (Needleman-Wunsch) of pairs"),
+        ("local", "local alignment (Smith-Waterman) of pairs"),
+    ):
+        command = commands.add_parser(
+            name, parents=[scoring, common, batch], help=description
+        )
+        command.add_argument("file1")
+        command.add_argument("file2")
+        command.add_argument(
+            "--all-pairs",
+            action="store_true",
+            help="align every record of file1 with every record of file2",
+        )
+        command.add_argument(
+            "--cache",
+            metavar="PATH",
+            help="sqlite file of alignments kept across runs",
+        )
+    command = commands.add_parser(
+        "search",
+        parents=[scoring, common, batch],
+        help="best local hits of every query in a database",
+    )
+    command.add_argument("queries")
+    command.add_argument("database")
+    command.add_argument("-k", type=int, default=10, help="hits per query")
+    command = commands.add_parser(
+        "msa",
+        parents=[common],
+        help="multiple alignment as aligned FASTA",
+        epilog="--threads only applies to --anchored, which aligns its "
+        "segments in parallel with either guide: the upgma and nj guide "
+        "trees and their merges run in one process",
+    )
+    command.add_argument("file")
+    command.add_argument("--guide", choices=METHODS, default="upgma")
+    command.add_argument(
+        "--line-width",
+        type=int,
+        default=60,
+        help="letters per line, 0 to never wrap",
+    )
+    command.add_argument(
+        "--collapse-duplicates",
+        action="store_true",
+        help="align identical sequences once",
+    )
+    command.add_argument(
+        "--anchored",
+        action="store_true",
+        help="align long sequences between their shared anchors",
+    )
+    command = commands.add_parser(
+        "serve", help="serve alignments on localhost or a Unix socket"
+    )
+    command.add_argument("--host", default=HOST)
+    command.add_argument("--port", type=int, default=PORT)
+    command.add_argument(
+        "--socket", metavar="PATH", help="listen on a Unix socket instead"
+    )
+    command.add_argument(
+        "--max-batch",
+        type=int,
+        default=MAX_BATCH,
+        help="requests aligned together at most",
+    )
+    command.add_argument(
+        "--max-delay",
+        type=float,
+        default=MAX_DELAY,
+        help="seconds a request waits for others to batch with",
+    )
+    command.add_argument(
+        "--queue-size",
+        type=int,
+        default=QUEUE_SIZE,
+        help="requests waiting at most before reading stops",
+    )
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run the command line."""
+    parser = _parser()
+    args = parser.parse_args(argv)
+    if args.command == "msa" and args.threads != 1 and not args.anchored:
+        parser.error("msa: --threads only applies to --anchored")
+    if args.command == "serve":
+        serve(
+            args.host,
+            args.port,
+            args.socket,
+            args.max_batch,
+            args.max_delay,
+            args.queue_size,
+        )
+        return
+    threads = args.threads or None
+    output = (
+        sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    )
+    try:
+        if args.command == "msa":
+            align_multiple(
+                args.file,
+                output,
+                args.guide,
+                threads,
+                args.line_width,
+                args.collapse_duplicates,
+                args.anchored,
+            )
+            return
+        scoring = Scoring(
+            args.match,
+            args.mismatch,
+            args.gap,
+            args.gap_extend,
+            _matrix(args.matrix),
+        )
+        if args.command == "search":
+            search_queries(
+                args.queries,
+                args.database,
+                output,
+                scoring,
+                args.k,
+                args.format,
+                threads,
+                args.chunk_size,
+            )
+        else:
+            align_pairs(
+                _pairs(args.file1, args.file2, args.all_pairs),
+                output,
+                scoring,
+                args.command == "local",
+                args.format,
+                threads,
+                args.chunk_size,
+                args.cache,
+            )
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+        else:
+            output.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Search one query against a collection of targets with Smith-Waterman.
+
+Targets are cut into chunks and scored with a QueryProfile, in worker
+processes when workers > 1. Only the best k hits are kept, in a bounded
+heap, and the full smith_waterman traceback is run for those hits only.
+"""
+
+import heapq
+import itertools
+import multiprocessing
+from collections import deque
+from multiprocessing.pool import AsyncResult
+from typing import Deque, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from Encoded_sequence import SequenceLike
+from Query_profile import QueryProfile
+from Smith_waterman import smith_waterman
+from Substitution_matrix import SubstitutionMatrix
+
+# (score, -index, query_end, target_end, target), the heap keeps the
+# smallest entry on top so it is the first one to be dropped
+_Entry = Tuple[int, int, int, int, SequenceLike]
+
+
+class SearchHit(NamedTuple):
+    """A local hit of the query in one target."""
+
+    target_index: int
+    score: int
+    query_end: int
+    target_end: int
+    identity: int
+    aligned_query: str
+    symbol: str
+    aligned_target: str
+
+
+_worker_profile: Optional[QueryProfile] = None
+_worker_k = 0
+
+
+def _init_worker(profile: QueryProfile, k: int) -> None:
+    """Keep the query profile in the worker for every chunk."""
+    global _worker_profile, _worker_k
+    _worker_profile = profile
+    _worker_k = k
+
+
+def _score_chunk(chunk: Tuple[int, list[SequenceLike]]) -> list[_Entry]:
+    """Return the best k hits of a chunk of targets."""
+    assert _worker_profile is not None
+    return _best_of_chunk(_worker_profile, _worker_k, chunk)
+
+
+def _best_of_chunk(
+    profile: QueryProfile, k: int, chunk: Tuple[int, list[SequenceLike]]
+) -> list[_Entry]:
+    """Score a chunk and keep its best k hits."""
+    offset, targets = chunk
+    entries = [
+        (score, -(offset + n), query_end, target_end, target)
+        for n, (target, (score, query_end, target_end)) in enumerate(
+            zip(targets, profile.align_many(targets))
+        )
+        # a zero score means there is no local similarity at all
+        if score > 0
+    ]
+    return heapq.nlargest(k, entries)
+
+
+def _chunks(
+    targets: Iterable[SequenceLike], chunk_size: int
+) -> Iterator[Tuple[int, list[SequenceLike]]]:
+    """Cut targets into (offset, chunk) pairs without reading ahead."""
+    iterator = iter(targets)
+    offset = 0
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield offset, chunk
+        offset += len(chunk)
+
+
+def search(
+    query: SequenceLike,
+    targets: Iterable[SequenceLike],
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    k: int = 10,
+    workers: Optional[int] = 1,
+    chunk_size: int = 1024,
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
+) -> list[SearchHit]:
+    """Return the k best local hits of query in targets, best first.
+
+    targets can be any iterable (a generator over a file for example), it
+    is read one chunk at a time. Chunk results stream back from the
+    workers and only k hits are ever kept, so memory does not grow with the
+    number of targets. workers=None uses one process per cpu.
+
+    Hits are ordered by score and then by position in targets. Targets
+    without any positive local score are never reported. gap_extend and
+    matrix are as in smith_waterman.
+    """
+    if k <= 0:
+        return []
+    profile = QueryProfile(
+        query, match_score, mismatch_score, gap_penalty, gap_extend, matrix
+    )
+    heap: list[_Entry] = []
+
+    def keep(entries: list[_Entry]) -> None:
+        for entry in entries:
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    if workers == 1:
+        for chunk in _chunks(targets, chunk_size):
+            keep(_best_of_chunk(profile, k, chunk))
+    else:
+        with multiprocessing.Pool(
+            workers, initializer=_init_worker, initargs=(profile, k)
+        ) as pool:
+            # Pool.imap would read all of targets ahead of the workers, so
+            # only keep a couple of chunks per worker in flight
+            in_flight = 2 * (workers or multiprocessing.cpu_count())
+            pending: Deque["AsyncResult[list[_Entry]]"] = deque()
+            for chunk in _chunks(targets, chunk_size):
+                if len(pending) >= in_flight:
+                    keep(pending.popleft().get())
+                pending.append(pool.apply_async(_score_chunk, (chunk,)))
+            while pending:
+                keep(pending.popleft().get())
+
+    hits = []
+    # the traceback only runs for the hits that are reported
+    for score, index, query_end, target_end, target in sorted(
+        heap, reverse=True
+    ):
+        identity, _, aligned_query, symbol, aligned_target = smith_waterman(
+            query,
+            target,
+            match_score,
+            mismatch_score,
+            gap_penalty,
+            gap_extend,
+            matrix,
+        )
+        hits.append(
+            SearchHit(
+                -index,
+                score,
+                query_end,
+                target_end,
+                identity,
+                aligned_query,
+                symbol,
+                aligned_target,
+            )
+        )
+    return hits
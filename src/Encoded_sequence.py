@@ -0,0 +1,89 @@
+"""
+Byte encoded sequences shared by all the aligners.
+
+An EncodedSequence is a uint8 numpy view of the ASCII letters of a
+sequence. Built from bytes, a bytearray or a memoryview (a slice of a memory
+mapped file for example) it does not copy the data, and the aligners use its
+codes directly instead of encoding a string on every call.
+"""
+
+import numpy as np
+import numpy.typing as npt
+from typing import Union, overload
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class EncodedSequence:
+    """A sequence stored as one uint8 code per letter.
+
+    Indexing with an integer returns the letter as a string, slicing
+    returns an EncodedSequence that shares the same buffer.
+    """
+
+    __slots__ = ("codes",)
+
+    codes: npt.NDArray[np.uint8]
+
+    def __init__(self, data: Union[str, Buffer, "EncodedSequence"]) -> None:
+        """Encode a string, or wrap a buffer without copying it."""
+        if isinstance(data, EncodedSequence):
+            self.codes = data.codes
+        elif isinstance(data, str):
+            # ValueError (UnicodeEncodeError) for letters outside ASCII
+            self.codes = np.frombuffer(data.encode("ascii"), dtype=np.uint8)
+        else:
+            self.codes = np.frombuffer(data, dtype=np.uint8)
+
+    @classmethod
+    def from_codes(cls, codes: npt.NDArray[np.uint8]) -> "EncodedSequence":
+        """Wrap an existing uint8 array without copying it."""
+        sequence = cls.__new__(cls)
+        sequence.codes = codes
+        return sequence
+
+    def __len__(self) -> int:
+        """Return the number of letters."""
+        return len(self.codes)
+
+    @overload
+    def __getitem__(self, index: int) -> str:
+        """Return a letter."""
+
+    @overload
+    def __getitem__(self, index: slice) -> "EncodedSequence":
+        """Return a slice."""
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[str, "EncodedSequence"]:
+        """Return a letter, or a sequence sharing this buffer."""
+        if isinstance(index, slice):
+            return EncodedSequence.from_codes(self.codes[index])
+        return chr(self.codes[index])
+
+    def __str__(self) -> str:
+        """Decode the letters."""
+        return self.codes.tobytes().decode("ascii")
+
+    def __bytes__(self) -> bytes:
+        """Return the letters as bytes."""
+        return self.codes.tobytes()
+
+    def __repr__(self) -> str:
+        """Show the letters."""
+        return f"EncodedSequence({str(self)!r})"
+
+    def __eq__(self, other: object) -> bool:
+        """Compare the letters of two encoded sequences."""
+        if not isinstance(other, EncodedSequence):
+            return NotImplemented
+        return bool(np.array_equal(self.codes, other.codes))
+
+    def __hash__(self) -> int:
+        """Hash the letters."""
+        return hash(self.codes.tobytes())
+
+
+# anything the aligners accept as a sequence
+SequenceLike = Union[str, EncodedSequence]
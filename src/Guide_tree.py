@@ -0,0 +1,238 @@
+"""
+Alignment free guide trees for progressive multiple alignment.
+
+The distance between two sequences is one minus their fraction of shared
+k-mers, 1 - |K1 & K2| / min(|K1|, |K2|), where K is the set of k-mers of a
+sequence. All the pairs are computed with a single matrix product of the
+k-mer presence matrix, so no pairwise alignment is needed. A tree is then
+built with UPGMA or neighbor-joining, which keep the minimum of every row
+of the distances up to date across the joins instead of scanning the whole
+matrix for the closest pair.
+
+A tree is the list of its merges (a, b) from the first to the last: the
+leaves are the sequences 0 to N - 1 and merge t creates the node N + t.
+"""
+
+import numpy as np
+import numpy.typing as npt
+from typing import Sequence, Tuple
+
+from Encoded_sequence import SequenceLike
+from Wavefront import encode
+
+METHODS = ("upgma", "nj")
+
+KMER_SIZE = 4
+
+# rows of the Q matrix of neighbor_joining computed together
+ROWS_PER_BLOCK = 64
+
+
+def kmer_distances(
+    seqs: Sequence[SequenceLike], k: int = KMER_SIZE
+) -> npt.NDArray[np.float64]:
+    """Return the matrix of k-mer distances between all the sequences.
+
+    A sequence shorter than k has no k-mer and is at distance 1 from every
+    other sequence.
+    """
+    windows = []
+    owners = []
+    for index, seq in enumerate(seqs):
+        codes = encode(seq)
+        if len(codes) >= k:
+            window = np.lib.stride_tricks.sliding_window_view(codes, k)
+            windows.append(window)
+            owners.append(np.full(len(window), index))
+    presence = np.zeros((len(seqs), 0), dtype=np.float32)
+    if windows:
+        # number every distinct k-mer
+        kmers = np.concatenate(windows)
+        _, ids = np.unique(kmers, axis=0, return_inverse=True)
+        ids = ids.reshape(-1)
+        presence = np.zeros((len(seqs), int(ids.max()) + 1), np.float32)
+        presence[np.concatenate(owners), ids] = 1
+    shared = (presence @ presence.T).astype(np.float64)
+    distinct = np.diag(shared)
+    smaller = np.minimum(distinct[:, None], distinct[None, :])
+    fraction = np.divide(
+        shared, smaller, out=np.zeros_like(shared), where=smaller > 0
+    )
+    distances = 1 - fraction
+    np.fill_diagonal(distances, 0)
+    return distances
+
+
+class _RowMinima:
+    """The smallest value of every row of the upper triangle of a matrix.
+
+    Only the cells (i, j), i < j, of two live nodes count. A join changes
+    one row and one column, so only the rows whose minimum was in them are
+    scanned again and finding the closest pair costs O(N) instead of
+    O(N^2).
+    """
+
+    def __init__(self, distances: npt.NDArray[np.float64]) -> None:
+        """Find the minimum of every row of distances."""
+        count = len(distances)
+        upper = np.triu(np.ones((count, count), dtype=bool), 1)
+        self.upper = np.where(upper, distances, np.inf)
+        self.minima = self.upper.min(axis=1)
+        # first column of the minimum of every row
+        self.columns = self.upper.argmin(axis=1)
+
+    def closest(self) -> Tuple[int, int]:
+        """Return the first pair, row by row, with the smallest value."""
+        a = int(np.argmin(self.minima))
+        return a, int(self.columns[a])
+
+    def join(
+        self,
+        a: int,
+        b: int,
+        row: npt.NDArray[np.float64],
+        live: npt.NDArray[np.bool_],
+    ) -> None:
+        """Give the node a the values row and remove the node b.
+
+        live is False for b and the nodes removed before.
+        """
+        upper = self.upper
+        stale = (self.columns == a) | (self.columns == b)
+        stale[a] = True
+        upper[b] = np.inf
+        upper[:, b] = np.inf
+        upper[a, slice(a + 1, None)] = np.where(
+            live[slice(a + 1, None)], row[slice(a + 1, None)], np.inf
+        )
+        upper[slice(a), a] = np.where(live[slice(a)], row[slice(a)], np.inf)
+        self.minima[b] = np.inf
+        # the rows above a keep their minimum or take the new column a
+        column = upper[slice(a), a]
+        minima = self.minima[slice(a)]
+        columns = self.columns[slice(a)]
+        better = (column < minima) | ((column == minima) & (a < columns))
+        minima[better] = column[better]
+        columns[better] = a
+        # the rows whose minimum was in the row or the column replaced
+        rows = np.flatnonzero(stale & live)
+        self.minima[rows] = upper[rows].min(axis=1)
+        self.columns[rows] = upper[rows].argmin(axis=1)
+
+
+def upgma(distances: npt.NDArray[np.float64]) -> list[Tuple[int, int]]:
+    """Build a guide tree with UPGMA (average linkage).
+
+    Ties go to the first pair, row by row, of the live nodes in the order
+    of their slots. A join only scans again the rows whose closest node
+    was merged, so the tree usually takes O(N^2) time.
+    """
+    count = len(distances)
+    if count < 2:
+        return []
+    distances = distances.astype(np.float64)
+    # slot of every live node, a merged node takes the slot of its left node
+    nodes = list(range(count))
+    sizes = np.ones(count)
+    live = np.ones(count, dtype=bool)
+    minima = _RowMinima(distances)
+    merges = []
+    for step in range(count - 1):
+        a, b = minima.closest()
+        merges.append((nodes[a], nodes[b]))
+        merged = (sizes[a] * distances[a] + sizes[b] * distances[b]) / (
+            sizes[a] + sizes[b]
+        )
+        distances[a] = merged
+        distances[:, a] = merged
+        distances[a, a] = 0
+        sizes[a] += sizes[b]
+        live[b] = False
+        nodes[a] = count + step
+        minima.join(a, b, merged, live)
+    return merges
+
+
+def _closest_neighbors(
+    totals: npt.NDArray[np.float64],
+    minima: _RowMinima,
+    live: npt.NDArray[np.bool_],
+) -> Tuple[int, int]:
+    """Return the first pair (a, b), row by row, with the smallest Q.
+
+    Q(i, j) = (n - 2) * d(i, j) - totals[i] - totals[j] is at least
+    (n - 2) * minima[i] - totals[i] - max(totals) on the row i, so the rows
+    are read ROWS_PER_BLOCK at a time from the lowest of these bounds, and
+    the search stops at the first block that cannot hold a Q as small as
+    the best one.
+    """
+    slots = np.flatnonzero(live)
+    size = len(slots)
+    bounds = (
+        (size - 2) * minima.minima[slots] - totals[slots] - totals[slots].max()
+    )
+    order = np.argsort(bounds, kind="stable")
+    best = (np.inf, 0, 0)
+    for first in range(0, size, ROWS_PER_BLOCK):
+        block = order[slice(first, first + ROWS_PER_BLOCK)]
+        if bounds[block[0]] > best[0]:
+            break
+        rows = slots[block]
+        # the cells out of the live upper triangle are inf
+        q = (size - 2) * minima.upper[rows] - totals[rows, None] - totals
+        values = q.min(axis=1)
+        top = float(values.min())
+        i = int(rows[values == top].min())
+        best = min(best, (top, i, int(np.argmin(q[rows == i]))))
+    return best[1], best[2]
+
+
+def neighbor_joining(
+    distances: npt.NDArray[np.float64],
+) -> list[Tuple[int, int]]:
+    """Build a guide tree with neighbor-joining.
+
+    The unrooted tree is rooted at its last join. The row sums are updated
+    at every join rather than summed again, and the Q matrix is only read
+    on the rows that may hold its minimum, see _closest_neighbors.
+    """
+    count = len(distances)
+    if count < 2:
+        return []
+    distances = distances.astype(np.float64)
+    nodes = list(range(count))
+    live = np.ones(count, dtype=bool)
+    totals = distances.sum(axis=1)
+    minima = _RowMinima(distances)
+    merges = []
+    for step in range(count - 1):
+        if count - step > 2:
+            a, b = _closest_neighbors(totals, minima, live)
+        else:
+            a, b = np.flatnonzero(live).tolist()
+        merges.append((nodes[a], nodes[b]))
+        joined = (distances[a] + distances[b] - distances[a, b]) / 2
+        # the joined node replaces a and b in the sum of every row
+        totals += joined - distances[:, a] - distances[:, b]
+        distances[a] = joined
+        distances[:, a] = joined
+        distances[a, a] = 0
+        live[b] = False
+        totals[a] = distances[a, live].sum()
+        nodes[a] = count + step
+        minima.join(a, b, joined, live)
+    return merges
+
+
+def guide_tree(
+    seqs: Sequence[SequenceLike], method: str = "upgma", k: int = KMER_SIZE
+) -> list[Tuple[int, int]]:
+    """Return the guide tree of seqs from their k-mer distances."""
+    if method not in METHODS:
+        raise ValueError(
+            f"unknown guide tree method {method!r}, expected one of {METHODS}"
+        )
+    distances = kmer_distances(seqs, k)
+    if method == "upgma":
+        return upgma(distances)
+    return neighbor_joining(distances)
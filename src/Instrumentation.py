@@ -0,0 +1,161 @@
+"""
+Opt-in phase timing of the aligners.
+
+The aligners wrap their phases (matrix fill, traceback, pairwise stage of
+multiple_alignment, profile alignment, ...) in phase(name, cells,
+matrix_bytes). Inside an instrument() block every phase adds its wall time,
+its dynamic programming cells and its matrix bytes to the statistics of the
+block:
+
+    with instrument() as recorder:
+        multiple_alignment(seqs)
+    print(recorder.as_dict()["msa.profile_fill"]["seconds"])
+
+Outside of it phase returns a shared do-nothing context manager, so the
+aligners only pay one function call per phase, and the loops inside a
+phase never check anything. Phases nest (the fill of a pairwise alignment
+inside the pairwise stage of multiple_alignment), the time of a phase
+includes its inner phases. Phases run in worker processes are only seen
+through the phase that waits for them.
+"""
+
+import time
+from contextlib import contextmanager, nullcontext
+from types import TracebackType
+from typing import (
+    Callable,
+    ContextManager,
+    Iterator,
+    Optional,
+    Type,
+    Union,
+)
+
+# callback(name, seconds, cells, matrix_bytes) called at the end of every
+# phase
+Callback = Callable[[str, float, int, int], None]
+
+_DISABLED: ContextManager[None] = nullcontext()
+
+
+class PhaseStats:
+    """Totals of all the runs of a phase."""
+
+    __slots__ = ("calls", "seconds", "cells", "peak_matrix_bytes")
+
+    def __init__(self) -> None:
+        """Start with nothing recorded."""
+        self.calls = 0
+        self.seconds = 0.0
+        self.cells = 0
+        self.peak_matrix_bytes = 0
+
+    def as_dict(self) -> dict[str, Union[int, float]]:
+        """Return the totals, and the cells per second."""
+        return {
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "cells": self.cells,
+            "peak_matrix_bytes": self.peak_matrix_bytes,
+            "cells_per_second": (
+                self.cells / self.seconds if self.seconds > 0 else 0.0
+            ),
+        }
+
+
+class Recorder:
+    """Statistics of the phases run inside an instrument() block."""
+
+    def __init__(self, callback: Optional[Callback] = None) -> None:
+        """Record every phase, and pass it to callback if given."""
+        self.phases: dict[str, PhaseStats] = {}
+        self.callback = callback
+
+    def record(
+        self, name: str, seconds: float, cells: int = 0, matrix_bytes: int = 0
+    ) -> None:
+        """Add a run of a phase."""
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+        stats.calls += 1
+        stats.seconds += seconds
+        stats.cells += cells
+        stats.peak_matrix_bytes = max(stats.peak_matrix_bytes, matrix_bytes)
+        if self.callback is not None:
+            self.callback(name, seconds, cells, matrix_bytes)
+
+    def as_dict(self) -> dict[str, dict[str, Union[int, float]]]:
+        """Return the statistics of every phase."""
+        return {name: stats.as_dict() for name, stats in self.phases.items()}
+
+
+class _Phase:
+    """Time one run of a phase for a recorder."""
+
+    __slots__ = ("recorder", "name", "cells", "matrix_bytes", "start")
+
+    def __init__(
+        self, recorder: Recorder, name: str, cells: int, matrix_bytes: int
+    ) -> None:
+        """Prepare the phase, the clock starts on enter."""
+        self.recorder = recorder
+        self.name = name
+        self.cells = cells
+        self.matrix_bytes = matrix_bytes
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        """Start the clock."""
+        self.start = time.perf_counter()
+
+    def __exit__(
+        self,
+        kind: Optional[Type[BaseException]],
+        error: Optional[BaseException],
+        trace: Optional[TracebackType],
+    ) -> None:
+        """Record the phase."""
+        self.recorder.record(
+            self.name,
+            time.perf_counter() - self.start,
+            self.cells,
+            self.matrix_bytes,
+        )
+
+
+_recorder: Optional[Recorder] = None
+
+
+def phase(
+    name: str, cells: int = 0, matrix_bytes: int = 0
+) -> ContextManager[None]:
+    """Return a context manager timing a phase, if instrumentation is on.
+
+    cells is the number of dynamic programming cells the phase computes
+    and matrix_bytes the size of the largest matrix it holds.
+    """
+    if _recorder is None:
+        return _DISABLED
+    return _Phase(_recorder, name, cells, matrix_bytes)
+
+
+def enabled() -> bool:
+    """Return whether phases are recorded."""
+    return _recorder is not None
+
+
+@contextmanager
+def instrument(callback: Optional[Callback] = None) -> Iterator[Recorder]:
+    """Record the phases run inside the block.
+
+    Blocks nest, the inner block gets the phases run inside it. Recording
+    is not thread safe, instrument one thread at a time.
+    """
+    global _recorder
+    previous = _recorder
+    _recorder = Recorder(callback)
+    try:
+        yield _recorder
+    finally:
+        _recorder = previous
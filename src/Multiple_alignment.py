@@ -1,246 +1,569 @@
 """Multiple Sequence Alignment Algorithm."""
-from typing import Tuple, Union, List, Optional, Any
-import numpy as np
-from Needleman_wunsch import needleman_wunsch
-
-
-def _alignments_to_profile(sequences: list[str]) -> dict[str, list[int]]:
-    """Take a set of alignments and turn it into a profile."""
-    # get length
-    length = len(sequences[0])
 
-    # initialize count matrix with zeros
-    counts = {
-        "A": [0] * length,
-        "C": [0] * length,
-        "G": [0] * length,
-        "T": [0] * length,
-        "-": [0] * length,
-    }
-
-    # count the frequency of each nucleotide or gap
-    for i in range(length):
-        for seq in sequences:
-            counts[seq[i]][i] += 1
-    return counts
+import heapq
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from typing import Tuple, Union, List, Optional, Any, Sequence
+import numpy as np
+import numpy.typing as npt
+from Alignment import Alignment
+from Alignment_cache import AlignmentCache
+from Needleman_wunsch import _gotoh_rows, needleman_wunsch_alignment
+from Guide_tree import METHODS, guide_tree
+from Encoded_sequence import SequenceLike
+from Instrumentation import phase
+from Profile import GAP, Profile
+from Substitution_matrix import SubstitutionMatrix
+from Wavefront import (
+    HORIZONTAL,
+    VERTICAL,
+    fill,
+    matrix_substitution,
+    encode,
+    traceback,
+)
+
+GUIDES = ("pairwise",) + METHODS
+
+# pairs scored by a worker of the pairwise stage per task
+PAIRS_PER_TASK = 256
+
+# needleman_wunsch_score parameters of the pairwise stage, the cache keys
+# are the ones of needleman_wunsch_score
+PAIR_SCORING = (1, -1, -1, -1, None)
+
+# every sequence encoded in one shared memory block, seq k is
+# _worker_codes[_worker_offsets[k]:_worker_offsets[k + 1]]
+_worker_memory: Optional[SharedMemory] = None
+_worker_codes = np.zeros(0, dtype=np.uint32)
+_worker_offsets = np.zeros(1, dtype=np.int64)
+# the pairs, in np.triu_indices order, the worker tasks index
+_worker_pairs = np.zeros(0, dtype=np.intp)
 
 
 def _profile_needleman_wunsch(
-    profile1: dict[str, list[int]],
-    profile2: dict[str, list[int]],
+    profile1: Profile,
+    profile2: Profile,
     gap_penalty: int = -10,
-) -> Tuple[List[List[int]], List[List[Union[int, str]]]]:
-    """Modification of the needleman-wunsch algorithm for profiles."""
-    # Create a matrix filled with zeros
-    rowlengths: list[int] = profile1["A"]
-    collengths: list[int] = profile2["A"]
-    rows = len(rowlengths)
-    cols = len(collengths)
-
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
+) -> Tuple[int, npt.NDArray[np.uint8]]:
+    """Modification of the needleman-wunsch algorithm for profiles.
+
+    Return the score and the packed traceback of the Wavefront engine.
+    gap_extend turns on affine gaps, as in needleman_wunsch. With a
+    SubstitutionMatrix two columns score the sum of the matrix scores of
+    all their pairs of letters, gaps score 0.
+    """
+    if gap_extend is None:
+        gap_extend = gap_penalty
+    elif gap_extend < gap_penalty:
+        raise ValueError("gap_extend must not be lower than gap_penalty")
+    rows = profile1.length
+    cols = profile2.length
+
+    with phase("msa.profile_scores", rows * cols, 8 * rows * cols):
+        match_matrix = _match_matrix(profile1, profile2, matrix)
+    # ties prefer the diagonal, then the horizontal move
+    with phase("msa.profile_fill", rows * cols, (rows + 1) * (cols + 1)):
+        score, _, _, trace = fill(
+            matrix_substitution(match_matrix),
+            rows,
+            cols,
+            gap_penalty,
+            gap_extend,
+            horizontal_first=True,
+        )
+    return score, trace
+
+
+def _match_matrix(
+    profile1: Profile,
+    profile2: Profile,
+    matrix: Optional[SubstitutionMatrix] = None,
+) -> npt.NDArray[np.int64]:
+    """Return the scores of every pair of columns of two profiles."""
+    if matrix is not None:
+        letters1 = [letter for letter in profile1.letters if letter != GAP]
+        letters2 = [letter for letter in profile2.letters if letter != GAP]
+        scores = matrix.lookup(
+            np.array([ord(letter) for letter in letters1], dtype=np.intp)[
+                :, None
+            ],
+            np.array([ord(letter) for letter in letters2], dtype=np.intp),
+        )
+        match_matrix: npt.NDArray[np.int64] = (
+            profile1.counts_of(letters1).T
+            @ scores
+            @ profile2.counts_of(letters2)
+        )
+        return match_matrix
+    return _count_scores(profile1, profile2)
+
+
+def _count_scores(
+    profile1: Profile, profile2: Profile
+) -> npt.NDArray[np.int64]:
+    """Return the match scores of every pair of columns of two profiles."""
     # get the number of sequences in each profile
-    num_seqs_1 = 0
-    for list in profile1.items():
-        num_seqs_1 += list[1][0]
-    num_seqs_2 = 0
-    for list in profile2.items():
-        num_seqs_2 += list[1][0]
-    # Create the score_matrix
-    score_matrix = [[0 for j in range(cols + 1)] for i in range(rows + 1)]
-
-    # create the direction matrix
-    # 1 = diagonal
-    # 2 = horizontal
-    # 3 = vertical
-    direction_matrix: List[List[Union[int, str]]] = [
-        [0 for j in range(cols + 1)] for i in range(rows + 1)
-    ]
-
-    # Fill the first row and column with gap penalties
-    for i in range(1, rows + 1):
-        score_matrix[i][0] = gap_penalty * i
-    for j in range(1, cols + 1):
-        score_matrix[0][j] = gap_penalty * j
-    # fill in matrix similar to how we do it in the needleman-wunsch
+    num_seqs_1 = profile1.weight
+    num_seqs_2 = profile2.weight
+    # only the letters seen in both profiles can match
+    shared = [letter for letter in profile1.letters if letter in profile2.rows]
+    counts1 = profile1.counts_of(shared)
+    counts2 = profile2.counts_of(shared)
+
     # we will use the profiles to make it so that the match score is greater
-    # if there is a greater level of agreement between the sequences
-    for i in range(1, rows + 1):
-        for j in range(1, cols + 1):
-            # start with a match score of 0
-            match_score = 0
-            # go through each nucleotide position and check each key
-            for nucleotide in profile1.keys():
-                # for each key check for match mismatch
-                # current cell values (num seqs with this nucleotide)
-                profile1_score = profile1[nucleotide][i - 1]
-                profile2_score = profile2[nucleotide][j - 1]
-
-                # num seqs with different nucleotide
-                profile1_mismatch = num_seqs_1 - profile1_score
-                profile2_mismatch = num_seqs_2 - profile2_score
-
-                # add score for all the matches
-                # remove score for all the mismatches
-                match_score += profile1_score * profile2_score
-                match_score += profile1_score * profile2_mismatch * -1
-                match_score += profile2_score * profile1_mismatch * -1
-            m_score = score_matrix[i - 1][j - 1] + match_score
-            v_score = score_matrix[i - 1][j] + gap_penalty
-            h_score = score_matrix[i][j - 1] + gap_penalty
-
-            score = max(m_score, h_score, v_score)
-            score_matrix[i][j] = score
-
-            if score == m_score:
-                direction_matrix[i][j] = "d"
-            elif score == h_score:
-                direction_matrix[i][j] = "h"
-            else:
-                direction_matrix[i][j] = "v"
-    return score_matrix, direction_matrix
+    # if there is a greater level of agreement between the sequences: every
+    # pair of sequences with the same letter adds 1 and every pair with
+    # different letters removes 1, counted once from each side. With c1 and
+    # c2 the counts of one letter, summing over the letters
+    # c1 * c2 - c1 * (n2 - c2) - c2 * (n1 - c1)
+    # gives 3 * (counts1.T @ counts2) - 2 * n1 * n2 for the whole matrix
+    match_matrix: npt.NDArray[np.int64] = (
+        3 * (counts1.T @ counts2) - 2 * num_seqs_1 * num_seqs_2
+    )
+    return match_matrix
 
 
 def _add_gaps(
-    direction_matrix: list[list[Union[int, str]]],
-    prof1_seqs: list[str],
-    prof2_seqs: list[str],
-) -> tuple[list[str], list[str]]:
-    """Change profile sequences after needleman-wunsch for profiles."""
-    # create empty strings to fill with gapped seqs
-    prof1_gapped_seqs = [""] * len(prof1_seqs)
-    prof2_gapped_seqs = [""] * len(prof2_seqs)
-
+    trace: npt.NDArray[np.uint8],
+    profile1: Profile,
+    profile2: Profile,
+    stop_at_edge: bool = True,
+) -> None:
+    """Change profile sequences after needleman-wunsch for profiles.
+
+    With stop_at_edge the walk back stops on the top row or the left column
+    and the columns before are dropped, as the progressive alignment along
+    the pairwise scores has always done.
+    """
+    with phase("msa.add_gaps"):
+        _add_gaps_along(trace, profile1, profile2, stop_at_edge)
+
+
+def _add_gaps_along(
+    trace: npt.NDArray[np.uint8],
+    profile1: Profile,
+    profile2: Profile,
+    stop_at_edge: bool,
+) -> None:
+    """Insert the gaps of the traceback into both profiles."""
     # start in bottom right corner
-    i = len(direction_matrix) - 1
-    j = len(direction_matrix[0]) - 1
-
-    # while we are not at top or left
-    while direction_matrix[i][j] != 0:
-        if direction_matrix[i][j] == "d":
-            # Go through and add a value in profile 1 seqs
-            for k in range(len(prof1_gapped_seqs)):
-                prof1_gapped_seqs[k] = (
-                    prof1_seqs[k][i - 1] + prof1_gapped_seqs[k]
-                )
-            # go through and add a value in profile 2 seqs
-            for k in range(len(prof2_gapped_seqs)):
-                prof2_gapped_seqs[k] = (
-                    prof2_seqs[k][j - 1] + prof2_gapped_seqs[k]
-                )
-            i -= 1
-            j -= 1
-        elif direction_matrix[i][j] == "h":
-            # Go through and add a value in profile 1 seqs
-            for k in range(len(prof1_gapped_seqs)):
-                prof1_gapped_seqs[k] = "-" + prof1_gapped_seqs[k]
-            # go through and add a value in profile 2 seqs
-            for k in range(len(prof2_gapped_seqs)):
-                prof2_gapped_seqs[k] = (
-                    prof2_seqs[k][j - 1] + prof2_gapped_seqs[k]
-                )
-            j -= 1
-        else:  # direction_matrix[i][j] == 'v'
-            # Go through and add a value in profile 1 seqs
-            for k in range(len(prof1_gapped_seqs)):
-                prof1_gapped_seqs[k] = (
-                    prof1_seqs[k][i - 1] + prof1_gapped_seqs[k]
-                )
-            # go through and add a value in profile 2 seqs
-            for k in range(len(prof2_gapped_seqs)):
-                prof2_gapped_seqs[k] = "-" + prof2_gapped_seqs[k]
-            i -= 1
-    return prof1_gapped_seqs, prof2_gapped_seqs
+    rows, cols = trace.shape
+    _, _, moves = traceback(trace, rows - 1, cols - 1)
+    in_prof1 = moves != HORIZONTAL
+    in_prof2 = moves != VERTICAL
+    # positions after each move, the walk back stops as soon as it is on
+    # the top row or the left column
+    i_after = np.cumsum(in_prof1)
+    j_after = np.cumsum(in_prof2)
+    on_edge = np.flatnonzero((i_after == 0) | (j_after == 0))
+    if len(on_edge) == 0 or not stop_at_edge:
+        first, i, j = 0, 0, 0
+    else:
+        last = int(on_edge[-1])
+        first, i, j = last + 1, int(i_after[last]), int(j_after[last])
+
+    profile1.insert_gaps(in_prof1[first:], i)
+    profile2.insert_gaps(in_prof2[first:], j)
 
 
 def _n_n_alignment(
-    seqs1: list[str], seqs2: list[str]
+    seqs1: list[SequenceLike],
+    seqs2: list[SequenceLike],
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
 ) -> tuple[list[str], list[str]]:
     """Align any n sequences with any m sequences."""
-    prof1 = _alignments_to_profile(seqs1)
-    prof2 = _alignments_to_profile(seqs2)
-
-    score_matrix, direction_matrix = _profile_needleman_wunsch(prof1, prof2)
-    out1, out2 = _add_gaps(direction_matrix, seqs1, seqs2)
-
-    return out1, out2
-
-
-def multiple_alignment(seqs: list[str]) -> list[str]:
-    """Return an alignment of any n sequences."""
-    # list to store pairwise alignments
-    pairwise_alignments: list[list[Union[int, str]]] = []
-
-    # iterate over all possible pairwise combinations of sequences
-    for i in range(len(seqs)):
-        for j in range(i + 1, len(seqs)):
-            seq1 = seqs[i]
-            seq2 = seqs[j]
-            # apply Needleman-Wunsch
-
-            # needleman_wunsch can return a string if verbose, but we set
-            # verbose to false so it will always return
-            # Tuple[int, str, str]
-            result: Tuple[int, str, str] = needleman_wunsch(  # type: ignore
-                seq1, seq2, 1, -1, -1, verbose=False
-            )
-            score, alignment_seq1, alignment_seq2 = result
-            # add to pairwise alignments
-            pairwise_alignments.append(
-                [score, i, j, alignment_seq1, alignment_seq2]
+    prof1 = Profile(seqs1)
+    prof2 = Profile(seqs2)
+
+    _, trace = _profile_needleman_wunsch(
+        prof1, prof2, gap_extend=gap_extend, matrix=matrix
+    )
+    _add_gaps(trace, prof1, prof2)
+
+    return prof1.sequences(), prof2.sequences()
+
+
+def _pairwise_alignment(
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    cache: Optional[AlignmentCache] = None,
+) -> Alignment:
+    """Return the needleman_wunsch alignment of two seqs.
+
+    The alignment is kept as runs of moves, only the aligned sequence that
+    enters a profile is ever built as a string.
+    """
+    with phase("msa.pairwise_alignment"):
+        return needleman_wunsch_alignment(seq1, seq2, 1, -1, -1, cache=cache)
+
+
+def _pair_score(
+    codes: npt.NDArray[np.uint32],
+    offsets: npt.NDArray[np.int64],
+    i: int,
+    j: int,
+) -> int:
+    """Return the needleman_wunsch score of the encoded seqs i and j."""
+    codes1 = codes[slice(offsets[i], offsets[i + 1])]
+    codes2 = codes[slice(offsets[j], offsets[j + 1])]
+    # keep the rows along the shorter sequence
+    if len(codes2) > len(codes1):
+        codes1, codes2 = codes2, codes1
+    scores, _ = _gotoh_rows(codes1, codes2, 1, -1, -1, -1, 0)
+    return int(scores[-1])
+
+
+def _init_pair_worker(
+    name: str, offsets: npt.NDArray[np.int64], pairs: npt.NDArray[np.intp]
+) -> None:
+    """Attach the shared sequences once per worker."""
+    global _worker_memory, _worker_codes, _worker_offsets, _worker_pairs
+    _worker_memory = SharedMemory(name=name)
+    _worker_offsets = offsets
+    _worker_pairs = pairs
+    _worker_codes = np.ndarray(
+        (int(offsets[-1]),), dtype=np.uint32, buffer=_worker_memory.buf
+    )
+
+
+def _score_pairs(task: Tuple[int, int]) -> Tuple[int, npt.NDArray[np.int64]]:
+    """Score the pairs _worker_pairs[start:stop]."""
+    start, stop = task
+    # only the pairs of the task, np.triu_indices is O(N^2)
+    first, second = _pair_of(
+        len(_worker_offsets) - 1, _worker_pairs[start:stop]
+    )
+    scores = np.array(
+        [
+            _pair_score(_worker_codes, _worker_offsets, int(i), int(j))
+            for i, j in zip(first, second)
+        ],
+        dtype=np.int64,
+    )
+    return start, scores
+
+
+def _pairwise_scores(
+    seqs: Sequence[SequenceLike],
+    workers: Optional[int] = 1,
+    cache: Optional[AlignmentCache] = None,
+) -> npt.NDArray[np.int64]:
+    """Return the needleman_wunsch scores of all the pairs i < j.
+
+    The scores are in the order of np.triu_indices(len(seqs), 1). With
+    workers != 1 the pairs are spread over a process pool that reads the
+    encoded sequences from shared memory, the scores do not depend on the
+    number of workers. workers=None uses one process per cpu.
+
+    With a cache only the pairs it does not know are scored, the cache is
+    only used by this process.
+    """
+    lengths = np.array([len(seq) for seq in seqs], dtype=np.int64)
+    # cells of all the pairs i < j
+    cells = (int(lengths.sum()) ** 2 - int((lengths**2).sum())) // 2
+    with phase("msa.pairwise_scores", cells):
+        return _scores_of_pairs(seqs, workers, cache)
+
+
+def _scores_of_pairs(
+    seqs: Sequence[SequenceLike],
+    workers: Optional[int],
+    cache: Optional[AlignmentCache],
+) -> npt.NDArray[np.int64]:
+    """Return the pairwise scores, see _pairwise_scores."""
+    encoded = [encode(seq) for seq in seqs]
+    offsets = np.zeros(len(seqs) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(codes) for codes in encoded])
+    count = len(seqs) * (len(seqs) - 1) // 2
+    scores = np.zeros(count, dtype=np.int64)
+    first, second = np.triu_indices(len(seqs), 1)
+    todo = np.arange(count)
+    if cache is not None:
+        keys = [
+            cache.key("needleman_wunsch_score", seqs[i], seqs[j], PAIR_SCORING)
+            for i, j in zip(first.tolist(), second.tolist())
+        ]
+        known = [cache.get(key) for key in keys]
+        todo = np.array(
+            [pair for pair, score in enumerate(known) if score is None],
+            dtype=np.intp,
+        )
+        for pair, score in enumerate(known):
+            if score is not None:
+                scores[pair] = score
+    _score_missing(scores, todo, encoded, offsets, workers)
+    if cache is not None:
+        for pair in todo.tolist():
+            cache.put(keys[pair], int(scores[pair]))
+    return scores
+
+
+def _score_missing(
+    scores: npt.NDArray[np.int64],
+    todo: npt.NDArray[np.intp],
+    encoded: list[npt.NDArray[Any]],
+    offsets: npt.NDArray[np.int64],
+    workers: Optional[int],
+) -> None:
+    """Fill the scores of the pairs todo, see _pairwise_scores."""
+    count = len(todo)
+    if workers == 1 or count == 0:
+        codes = np.concatenate(encoded) if encoded else _worker_codes
+        first, second = np.triu_indices(len(encoded), 1)
+        for pair in todo:
+            scores[pair] = _pair_score(
+                codes, offsets, int(first[pair]), int(second[pair])
             )
-    # sort by scores
-    sort_pairs = sorted(pairwise_alignments, key=lambda x: x[0], reverse=True)
-
-    sort_pairs_mod = sort_pairs
-
-    # get the base seqs and the indices
-    base: list[Union[str, int]] = sort_pairs[0]
-    b1 = str(base[3])
-    b2 = str(base[4])
-    base_seqs: list[str] = [b1, b2]
-    bi1 = int(base[1])
-    bi2 = int(base[2])
-    base_seqs_index: list[int] = [bi1, bi2]
-
-    # remove base profile and seqs from mod list
-    del sort_pairs_mod[0]
-
-    while len(sort_pairs_mod) > 0:
-        # filter the list to only include adjacent alignments
-        filtered_list = [
-            sublist
-            for sublist in sort_pairs_mod
-            if sublist[1] in base_seqs_index or sublist[2] in base_seqs_index
+        return
+
+    # a shared memory block can not be empty
+    memory = SharedMemory(create=True, size=max(4 * int(offsets[-1]), 1))
+    try:
+        shared = np.ndarray(
+            (int(offsets[-1]),), dtype=np.uint32, buffer=memory.buf
+        )
+        for codes, offset in zip(encoded, offsets):
+            shared[slice(offset, offset + len(codes))] = codes
+        tasks = [
+            (start, min(start + PAIRS_PER_TASK, count))
+            for start in range(0, count, PAIRS_PER_TASK)
         ]
+        with multiprocessing.Pool(
+            workers,
+            initializer=_init_pair_worker,
+            initargs=(memory.name, offsets, todo),
+        ) as pool:
+            for start, chunk in pool.imap_unordered(_score_pairs, tasks):
+                scores[todo[slice(start, start + len(chunk))]] = chunk
+        del shared
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def _pair_indices(
+    count: int, index: int, others: npt.NDArray[np.intp]
+) -> npt.NDArray[np.intp]:
+    """Return where the pairs (index, other) are in the pairwise scores."""
+    i = np.minimum(index, others)
+    j = np.maximum(index, others)
+    # pairs are in np.triu_indices(count, 1) order
+    pairs: npt.NDArray[np.intp] = i * (2 * count - i - 1) // 2 + j - i - 1
+    return pairs
+
+
+def _pair_of(
+    count: int, pairs: npt.NDArray[np.intp]
+) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """Return the sequences (i, j) of pairs, the inverse of _pair_indices."""
+    pairs = np.asarray(pairs, dtype=np.int64)
+
+    def row_start(i: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+        start: npt.NDArray[np.int64] = i * (2 * count - i - 1) // 2
+        return start
+
+    # i is the last row starting at or before the pair, the root of
+    # row_start(i) = pair, then corrected for the rounding of the floats
+    root = np.sqrt(float((2 * count - 1) ** 2) - 8.0 * pairs)
+    i = np.floor((2 * count - 1 - root) / 2).astype(np.int64)
+    i = np.clip(i, 0, max(count - 2, 0))
+    i -= row_start(i) > pairs
+    i += row_start(i + 1) <= pairs
+    j = pairs - row_start(i) + i + 1
+    return i, j
+
+
+def _collapse(
+    seqs: Sequence[SequenceLike],
+) -> Tuple[list[SequenceLike], list[int], list[int]]:
+    """Return the distinct seqs, their number of copies and their index.
+
+    The distinct sequences are in the order of their first copy and seqs[k]
+    is distinct[index[k]].
+    """
+    first_copy: dict[str, int] = {}
+    distinct: list[SequenceLike] = []
+    weights: list[int] = []
+    index = []
+    for seq in seqs:
+        unique = first_copy.setdefault(str(seq), len(distinct))
+        if unique == len(distinct):
+            distinct.append(seq)
+            weights.append(0)
+        weights[unique] += 1
+        index.append(unique)
+    return distinct, weights, index
+
+
+def _tree_alignment(
+    seqs: Sequence[SequenceLike],
+    method: str,
+    weights: Optional[Sequence[int]] = None,
+) -> list[str]:
+    """Align the profiles of the nodes of a k-mer guide tree bottom up.
+
+    The aligned sequences are returned in the order of seqs. weights[k] is
+    the number of sequences seqs[k] stands for in the profiles.
+    """
+    if weights is None:
+        weights = [1] * len(seqs)
+    profiles = []
+    with phase("msa.profile"):
+        for seq, weight in zip(seqs, weights):
+            profile = Profile()
+            profile.add(seq, weight)
+            profiles.append(profile)
+    members = [[index] for index in range(len(seqs))]
+    with phase("msa.guide_tree"):
+        tree = guide_tree(seqs, method)
+    for left, right in tree:
+        profile1, profile2 = profiles[left], profiles[right]
+        _, trace = _profile_needleman_wunsch(profile1, profile2)
+        _add_gaps(trace, profile1, profile2, stop_at_edge=False)
+        with phase("msa.profile"):
+            profile1.extend(profile2)
+        profiles.append(profile1)
+        members.append(members[left] + members[right])
+    aligned = [""] * len(seqs)
+    for index, seq in zip(members[-1], profiles[-1].sequences()):
+        aligned[index] = seq
+    return aligned
+
+
+def _progressive_alignment(
+    seqs: Sequence[SequenceLike],
+    workers: Optional[int] = 1,
+    cache: Optional[AlignmentCache] = None,
+    weights: Optional[Sequence[int]] = None,
+) -> Tuple[list[str], list[int]]:
+    """Grow one alignment from the best pair along the pairwise scores.
+
+    Return the aligned sequences and the index in seqs of each of them, in
+    the order they entered the alignment. weights are as in
+    _tree_alignment.
+    """
+    if weights is None:
+        weights = [1] * len(seqs)
+    # needleman_wunsch scores of all the pairs, only the score is needed to
+    # order the pairs so skip the traceback
+    scores = _pairwise_scores(seqs, workers, cache)
+    count = len(seqs)
+
+    # get the base seqs and the indices, the best pair and on ties the
+    # first one
+    # only the pairs that are merged need their aligned strings
+    first, second = np.triu_indices(count, 1)
+    best = int(np.argmax(scores))
+    bi1 = int(first[best])
+    bi2 = int(second[best])
+    best_alignment = _pairwise_alignment(seqs[bi1], seqs[bi2], cache)
+    # the base profile is updated in place as sequences enter it
+    with phase("msa.profile"):
+        base_profile = Profile()
+        base_profile.add(best_alignment.aligned_seq1(), weights[bi1])
+        base_profile.add(best_alignment.aligned_seq2(), weights[bi2])
+    in_base = np.zeros(count, dtype=bool)
+    entered = [bi1, bi2]
+
+    # pairs with one sequence in the base, keyed by (-score, i, j) so the
+    # top of the heap is the best pair and ties go to the first pair, as
+    # with a stable sort of all the pairs by score
+    candidates: list[Tuple[int, int, int]] = []
+
+    def enter(index: int) -> None:
+        in_base[index] = True
+        others = np.flatnonzero(~in_base)
+        for other, score in zip(
+            others, scores[_pair_indices(count, index, others)]
+        ):
+            pair = (min(index, int(other)), max(index, int(other)))
+            heapq.heappush(candidates, (-int(score),) + pair)
+
+    enter(bi1)
+    enter(bi2)
+    while candidates:
+        _, i, j = heapq.heappop(candidates)
+        # both sequences may have entered since the pair was pushed
+        if in_base[i] and in_base[j]:
+            continue
 
         # create the profile for joining
         # we want only the seq that is not already in the base profile
-        # so check which one is in base seqs index and return the other
-        if filtered_list[0][1] in base_seqs_index:
-            enter_seq = filtered_list[0][4]
-            enter_index = filtered_list[0][2]
+        # so check which one is in base and return the other
+        alignment = _pairwise_alignment(seqs[i], seqs[j], cache)
+        if in_base[i]:
+            enter_index = j
+            enter_seq = alignment.aligned_seq2()
         else:
-            enter_seq = filtered_list[0][3]
-            enter_index = filtered_list[0][1]
+            enter_index = i
+            enter_seq = alignment.aligned_seq1()
         # do a progressive alignment with new seq
-        if isinstance(enter_seq, str):
-            base_aligned, enter_aligned = _n_n_alignment(
-                base_seqs, [enter_seq]
-            )
+        with phase("msa.profile"):
+            enter_profile = Profile()
+            enter_profile.add(enter_seq, weights[enter_index])
+        _, trace = _profile_needleman_wunsch(base_profile, enter_profile)
+        _add_gaps(trace, base_profile, enter_profile)
         # add aligned enter to base
-        base_seqs = base_aligned + enter_aligned
-
-        if isinstance(enter_index, int):
-            base_seqs_index = base_seqs_index + [enter_index]
-        # eliminate any alignments that would be redundant
-        # we only want the alignments that contain a sequence that has not
-        # already entered the base
-        sort_pairs_mod = [
-            sublist
-            for sublist in sort_pairs_mod
-            if sublist[1] not in base_seqs_index
-            or sublist[2] not in base_seqs_index
-        ]
-    return base_seqs
+        with phase("msa.profile"):
+            base_profile.add(
+                enter_profile.sequences()[0], weights[enter_index]
+            )
+        entered.append(enter_index)
+        enter(enter_index)
+    return base_profile.sequences(), entered
+
+
+def multiple_alignment(
+    seqs: Sequence[SequenceLike],
+    guide: str = "pairwise",
+    workers: Optional[int] = 1,
+    cache: Optional[AlignmentCache] = None,
+    collapse_duplicates: bool = False,
+) -> list[str]:
+    """Return an alignment of any n sequences.
+
+    guide chooses the merge order. "pairwise" scores every pair with
+    needleman_wunsch and grows one alignment from the best pair, the result
+    is in the order the sequences entered it. "upgma" and "nj" build a
+    guide tree from k-mer distances, without any pairwise alignment, and
+    return the sequences in their input order.
+
+    workers spreads the pairwise scores over a process pool, as in
+    _pairwise_scores, the alignment does not depend on it. The "upgma" and
+    "nj" guides have no pairwise stage and do not use it. cache, an
+    AlignmentCache, keeps the pairwise scores and alignments of the
+    "pairwise" guide for the runs that share sequences.
+
+    collapse_duplicates aligns every distinct sequence once, counted as
+    many times as it is repeated in the profiles, and copies its row back
+    to every copy. The result is then in the order of seqs whatever the
+    guide.
+    """
+    if guide not in GUIDES:
+        raise ValueError(f"unknown guide {guide!r}, expected one of {GUIDES}")
+    if not collapse_duplicates:
+        if guide != "pairwise":
+            return _tree_alignment(seqs, guide)
+        aligned, _ = _progressive_alignment(seqs, workers, cache)
+        return aligned
+
+    distinct, weights, index = _collapse(seqs)
+    if len(distinct) < 2:
+        return [str(seq) for seq in seqs]
+    if guide != "pairwise":
+        rows = _tree_alignment(distinct, guide, weights)
+    else:
+        aligned, entered = _progressive_alignment(
+            distinct, workers, cache, weights
+        )
+        rows = [""] * len(distinct)
+        for unique, row in zip(entered, aligned):
+            rows[unique] = row
+    return [rows[unique] for unique in index]
 
 
 def main() -> None:
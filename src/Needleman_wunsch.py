@@ -1,34 +1,60 @@
 """Needleman-Wunsch Sequence Alignment Algorithm."""
-from typing import Tuple, Union
+
+from typing import NamedTuple, Optional, Tuple, Union
 import numpy as np
+import numpy.typing as npt
+from Alignment import Alignment
+from Alignment_cache import AlignmentCache
+from Encoded_sequence import SequenceLike
+from Instrumentation import phase
+from Substitution_matrix import SubstitutionMatrix
+from Wavefront import (
+    DIAGONAL,
+    HORIZONTAL,
+    NEG,
+    VERTICAL,
+    Codes,
+    alignment_strings,
+    encode,
+    fill,
+    sequence_substitution,
+    substitution_scores,
+    traceback,
+)
 
+ENGINES = ("wavefront", "loop", "hirschberg")
 
-def needleman_wunsch(
-    seq1: str,
-    seq2: str,
+# bytes the full score matrix may take before needleman_wunsch switches
+# from its default engine to the linear memory hirschberg engine
+MEMORY_BUDGET = 1 << 30
+
+# sub problems of the hirschberg recursion with at most this many cells are
+# solved with a full matrix
+HIRSCHBERG_BASE_CELLS = 4096
+
+# first band width tried by needleman_wunsch_banded, it doubles until the
+# band provably holds the optimal alignment
+BAND_WIDTH = 16
+
+
+def _loop_fill(
+    seq1: SequenceLike,
+    seq2: SequenceLike,
     match_score: int,
     mismatch_score: int,
     gap_penalty: int,
-    verbose: bool = False,
-) -> Union[str, Tuple[int, str, str]]:
-    """Input 2 sequences and get the needleman_wunsch match.
+) -> npt.NDArray[np.int64]:
+    """Fill the score matrix one cell at a time.
 
-    N = length sequence 1
-    M = length sequence 2
-    The overall complextiy is O(N*M)
-
-    The two parts with non O(1) complexity are the nested for loop and the
-    while loop.
-
-    The nested for loop is O(N*M) and the while loop is O(N+M) as explained
-    below.
+    This is the reference engine. It is O(N*M) python level operations so
+    it is only practical for short sequences.
     """
     # get the lengths
     seq1_length = len(seq1)
     seq2_length = len(seq2)
 
     # create a matrix with all 0s. Needs to be the seq1 + 1 by seq2 + 1
-    score_matrix = np.zeros((seq1_length + 1, seq2_length + 1), dtype=int)
+    score_matrix = np.zeros((seq1_length + 1, seq2_length + 1), dtype=np.int64)
 
     # fill in the first column and row with the appropriate gap penalties
     score_matrix[0, :] = np.arange(seq2_length + 1) * gap_penalty
@@ -53,12 +79,30 @@ def needleman_wunsch(
 
             # get the max value
             score_matrix[i][j] = max(diagonal, insert, delete)
-    # store the alginment score from bottom right of matrix
-    alignment_score: int = score_matrix[seq1_length][seq2_length]
-    # placeholder strings for our alginment
-    aligned_seq1 = ""
-    aligned_seq2 = ""
-    match_string = ""
+    return score_matrix
+
+
+def _traceback(
+    score_matrix: npt.NDArray[np.int64],
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+) -> Tuple[str, str, str]:
+    """Trace a filled score matrix back from the bottom right corner.
+
+    Return the two aligned sequences and the match string between them.
+    """
+    # get the lengths
+    seq1_length = len(seq1)
+    seq2_length = len(seq2)
+    # placeholder lists for our alginment, the characters are appended
+    # from the end of the alignment and reversed once at the end, as
+    # prepending to a string copies it every time
+    aligned_seq1: list[str] = []
+    aligned_seq2: list[str] = []
+    match_string: list[str] = []
 
     # we need traceback values that start at the length
     trc1 = seq1_length
@@ -77,7 +121,7 @@ def needleman_wunsch(
     # so the time complextiy is O(N+M)
     while trc1 > 0 or trc2 > 0:
         # store values
-        matched = seq1[trc1 - 1] == seq2[trc2 - 1]
+        matched = trc1 > 0 and trc2 > 0 and seq1[trc1 - 1] == seq2[trc2 - 1]
         current_val = score_matrix[trc1][trc2]
         diag_val = score_matrix[trc1 - 1][trc2 - 1]
         vert_val = score_matrix[trc1 - 1][trc2]
@@ -85,35 +129,456 @@ def needleman_wunsch(
         # check if it was a diagonal move
         if trc1 > 0 and trc2 > 0 and current_val == diag_val + mis_match_score:
             # add values to both strings
-            aligned_seq1 = seq1[trc1 - 1] + aligned_seq1
-            aligned_seq2 = seq2[trc2 - 1] + aligned_seq2
+            aligned_seq1.append(seq1[trc1 - 1])
+            aligned_seq2.append(seq2[trc2 - 1])
             # if they are the same
             if matched:
                 # indicate match in match string
-                match_string = "|" + match_string
+                match_string.append("|")
             else:
                 # indicate a msimatch in the match string
-                match_string = "." + match_string
+                match_string.append(".")
             trc1 -= 1
             trc2 -= 1
         # check if it was a vertical move
         elif trc1 > 0 and current_val == vert_val + gap_penalty:
             # add value to seq 1
-            aligned_seq1 = seq1[trc1 - 1] + aligned_seq1
+            aligned_seq1.append(seq1[trc1 - 1])
             # add - to seq 2
-            aligned_seq2 = "-" + aligned_seq2
+            aligned_seq2.append("-")
             # match string is open
-            match_string = " " + match_string
+            match_string.append(" ")
             trc1 -= 1
         # else it was a horizontal move
         else:
             # add - to seq 1
-            aligned_seq1 = "-" + aligned_seq1
+            aligned_seq1.append("-")
             # add value to seq 2
-            aligned_seq2 = seq2[trc2 - 1] + aligned_seq2
+            aligned_seq2.append(seq2[trc2 - 1])
             # match string stays open
-            match_string = " " + match_string
+            match_string.append(" ")
             trc2 -= 1
+    return (
+        "".join(reversed(aligned_seq1)),
+        "".join(reversed(match_string)),
+        "".join(reversed(aligned_seq2)),
+    )
+
+
+def _gotoh_rows(
+    codes1: Codes,
+    codes2: Codes,
+    match_score: int,
+    mismatch_score: int,
+    gap_open: int,
+    gap_extend: int,
+    top_open: int,
+    matrix: Optional[SubstitutionMatrix] = None,
+) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """Return the last row of the score matrix using O(M) memory.
+
+    Return the best scores of the cells of the last row, and the best
+    scores of those ending with a vertical gap. A gap of length L costs
+    (gap_open - gap_extend) + L * gap_extend, except for the vertical gap
+    that starts at the top left corner which costs top_open + L *
+    gap_extend.
+
+    Only the previous row is kept. Inside a row the diagonal and vertical
+    moves are vectorized and the horizontal gaps are resolved with a running
+    maximum:
+    E[j] = max over k < j of (G[k] + opening + (j - k) * gap_extend)
+         = opening + gap_extend * j + max over k < j of (G[k] - gap_extend * k)
+    where G is the best of the diagonal and vertical moves.
+    """
+    opening = gap_open - gap_extend
+    steps = np.arange(len(codes2) + 1, dtype=np.int64) * gap_extend
+    scores = steps + opening
+    scores[0] = 0
+    vertical = np.full(len(codes2) + 1, NEG, dtype=np.int64)
+    best = np.empty_like(scores)
+    for i in range(len(codes1)):
+        substitution = substitution_scores(
+            codes1[i], codes2, match_score, mismatch_score, matrix
+        )
+        np.maximum(vertical, scores + opening, out=vertical)
+        vertical += gap_extend
+        vertical[0] = top_open + (i + 1) * gap_extend
+        best[0] = vertical[0]
+        np.maximum(scores[:-1] + substitution, vertical[1:], out=best[1:])
+        # the horizontal gaps
+        running = np.maximum.accumulate(best - steps)
+        scores[0] = best[0]
+        np.maximum(
+            best[1:], running[:-1] + steps[1:] + opening, out=scores[1:]
+        )
+    return scores, vertical
+
+
+def _hirschberg(
+    codes1: Codes,
+    codes2: Codes,
+    match_score: int,
+    mismatch_score: int,
+    gap_open: int,
+    gap_extend: int,
+    matrix: Optional[SubstitutionMatrix] = None,
+) -> Tuple[int, npt.NDArray[np.uint8]]:
+    """Align two sequences in linear memory with Hirschberg's algorithm.
+
+    seq1 is split in half, the best crossing point in seq2 is found from the
+    last rows of the top half and of the reversed bottom half, and both
+    halves are aligned recursively. Only O(M) scores are alive at any time
+    and the total work is about twice the full matrix fill.
+
+    With affine gaps this is the Myers-Miller version: the best path may
+    cross the middle inside a vertical gap, which is then split around the
+    two characters of seq1 on either side of the middle, and the sub
+    problems next to it get the gap opening for free (top_open and
+    bottom_open of 0 instead of the usual opening cost).
+
+    Return the score and the moves of the alignment (see Wavefront).
+    """
+    if len(codes2) > len(codes1):
+        # keep the rows along the shorter sequence
+        score, transposed = _hirschberg(
+            codes2,
+            codes1,
+            match_score,
+            mismatch_score,
+            gap_open,
+            gap_extend,
+            None if matrix is None else matrix.transposed(),
+        )
+        swapped = np.where(transposed == VERTICAL, HORIZONTAL, transposed)
+        swapped[transposed == HORIZONTAL] = VERTICAL
+        return score, swapped.astype(np.uint8)
+    opening = gap_open - gap_extend
+    moves = bytearray()
+
+    def gap(length: int) -> int:
+        return opening + length * gap_extend if length else 0
+
+    def align(
+        start1: int,
+        stop1: int,
+        start2: int,
+        stop2: int,
+        top_open: int,
+        bottom_open: int,
+    ) -> int:
+        """Align seq1[start1:stop1] and seq2[start2:stop2], return score."""
+        length1 = stop1 - start1
+        length2 = stop2 - start2
+        if length1 == 0:
+            moves.extend([HORIZONTAL] * length2)
+            return gap(length2)
+        if length2 == 0:
+            moves.extend([VERTICAL] * length1)
+            return max(top_open, bottom_open) + length1 * gap_extend
+        if length1 == 1:
+            # either the character of seq1 is deleted or it faces one of
+            # seq2, with horizontal gaps on both sides
+            deleted = max(top_open, bottom_open) + gap_extend + gap(length2)
+            substitution = substitution_scores(
+                codes1[start1],
+                codes2[start2:stop2],
+                match_score,
+                mismatch_score,
+                matrix,
+            )
+            before = np.arange(length2)
+            faced = substitution + [
+                gap(int(k)) + gap(length2 - int(k) - 1) for k in before
+            ]
+            position = int(np.argmax(faced))
+            if faced[position] >= deleted:
+                moves.extend([HORIZONTAL] * position)
+                moves.append(DIAGONAL)
+                moves.extend([HORIZONTAL] * (length2 - position - 1))
+                return int(faced[position])
+            if top_open >= bottom_open:
+                moves.append(VERTICAL)
+                moves.extend([HORIZONTAL] * length2)
+            else:
+                moves.extend([HORIZONTAL] * length2)
+                moves.append(VERTICAL)
+            return deleted
+        if (
+            top_open == bottom_open == opening
+            and length1 * length2 <= HIRSCHBERG_BASE_CELLS
+        ):
+            # small enough to fill the full matrix
+            score, _, _, trace = fill(
+                sequence_substitution(
+                    codes1[start1:stop1],
+                    codes2[start2:stop2],
+                    match_score,
+                    mismatch_score,
+                    matrix,
+                ),
+                length1,
+                length2,
+                gap_open,
+                gap_extend,
+            )
+            moves.extend(traceback(trace, length1, length2)[2].tobytes())
+            return score
+        middle = start1 + length1 // 2
+        forward, forward_vertical = _gotoh_rows(
+            codes1[start1:middle],
+            codes2[start2:stop2],
+            match_score,
+            mismatch_score,
+            gap_open,
+            gap_extend,
+            top_open,
+            matrix,
+        )
+        backward, backward_vertical = _gotoh_rows(
+            codes1[middle:stop1][::-1],
+            codes2[start2:stop2][::-1],
+            match_score,
+            mismatch_score,
+            gap_open,
+            gap_extend,
+            bottom_open,
+            matrix,
+        )
+        crossing = forward + backward[::-1]
+        # a vertical gap through the middle was opened on both sides
+        crossing_gap = forward_vertical + backward_vertical[::-1] - opening
+        split = int(np.argmax(crossing))
+        split_gap = int(np.argmax(crossing_gap))
+        if crossing[split] >= crossing_gap[split_gap]:
+            align(start1, middle, start2, start2 + split, top_open, opening)
+            align(middle, stop1, start2 + split, stop2, opening, bottom_open)
+            return int(crossing[split])
+        split = start2 + split_gap
+        align(start1, middle - 1, start2, split, top_open, 0)
+        moves.extend([VERTICAL, VERTICAL])
+        align(middle + 1, stop1, split, stop2, 0, bottom_open)
+        return int(crossing_gap[split_gap])
+
+    score = align(0, len(codes1), 0, len(codes2), opening, opening)
+    return score, np.frombuffer(bytes(moves), dtype=np.uint8)
+
+
+def _global_moves(
+    codes1: Codes,
+    codes2: Codes,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    gap_extend: int,
+    matrix: Optional[SubstitutionMatrix],
+    engine: str,
+) -> Tuple[int, npt.NDArray[np.uint8]]:
+    """Return the score and the moves of the global alignment.
+
+    engine is "wavefront" or "hirschberg", as in needleman_wunsch.
+    """
+    rows = len(codes1)
+    cols = len(codes2)
+    cells = rows * cols
+    if engine == "hirschberg":
+        # about twice the cells, in rows along the shorter sequence
+        row_bytes = 16 * (min(rows, cols) + 1)
+        with phase("needleman_wunsch.hirschberg", 2 * cells, row_bytes):
+            # the moves of hirschberg are its traceback too
+            return _hirschberg(
+                codes1,
+                codes2,
+                match_score,
+                mismatch_score,
+                gap_penalty,
+                gap_extend,
+                matrix,
+            )
+    with phase("needleman_wunsch.fill", cells, (rows + 1) * (cols + 1)):
+        score, _, _, trace = fill(
+            sequence_substitution(
+                codes1, codes2, match_score, mismatch_score, matrix
+            ),
+            rows,
+            cols,
+            gap_penalty,
+            gap_extend,
+        )
+    with phase("needleman_wunsch.traceback"):
+        _, _, moves = traceback(trace, rows, cols)
+    return score, moves
+
+
+def _engine(
+    engine: Optional[str],
+    seq1_length: int,
+    seq2_length: int,
+    memory_budget: Optional[int],
+) -> str:
+    """Return the engine that fills the matrix of needleman_wunsch.
+
+    engine=None is "wavefront", or "hirschberg" when the matrix would take
+    more than memory_budget bytes. An engine asked for by name that does
+    not fit raises a ValueError: hirschberg may pick another alignment.
+    """
+    chosen = "wavefront" if engine is None else engine
+    if chosen == "hirschberg" or memory_budget is None:
+        return chosen
+    cell_bytes = 8 if chosen == "loop" else 1
+    matrix_bytes = (seq1_length + 1) * (seq2_length + 1) * cell_bytes
+    if matrix_bytes <= memory_budget:
+        return chosen
+    if engine is None:
+        return "hirschberg"
+    raise ValueError(
+        f"the matrix of the {engine} engine takes {matrix_bytes} bytes, "
+        f"more than the memory_budget of {memory_budget}: use "
+        f'engine="hirschberg" or memory_budget=None'
+    )
+
+
+def _gap_extend(
+    engine: Optional[str],
+    gap_penalty: int,
+    gap_extend: Optional[int],
+    matrix: Optional[SubstitutionMatrix],
+) -> int:
+    """Check the parameters of needleman_wunsch, return the gap_extend."""
+    if engine is not None and engine not in ENGINES:
+        raise ValueError(
+            f"unknown engine {engine!r}, expected one of {ENGINES}"
+        )
+    if gap_extend is None:
+        gap_extend = gap_penalty
+    elif gap_extend < gap_penalty:
+        raise ValueError("gap_extend must not be lower than gap_penalty")
+    elif engine == "loop" and gap_extend != gap_penalty:
+        raise ValueError("the loop engine only supports linear gaps")
+    if engine == "loop" and matrix is not None:
+        raise ValueError("the loop engine does not support matrices")
+    return gap_extend
+
+
+def needleman_wunsch(
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    verbose: bool = False,
+    engine: Optional[str] = None,
+    memory_budget: Optional[int] = MEMORY_BUDGET,
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
+    cache: Optional[AlignmentCache] = None,
+) -> Union[str, Tuple[int, str, str]]:
+    """Input 2 sequences and get the needleman_wunsch match.
+
+    N = length sequence 1
+    M = length sequence 2
+    The overall complextiy is O(N*M)
+
+    The two parts with non O(1) complexity are the matrix fill and the
+    traceback.
+
+    The fill is O(N*M) and the traceback is O(N+M) as explained in
+    _traceback.
+
+    engine selects how the matrix is filled, None is "wavefront":
+    "wavefront" computes each anti-diagonal with vectorized numpy operations
+    (O(N+M) python level steps) and keeps one byte of traceback per cell,
+    "loop" fills a score matrix one cell at a time.
+    Both produce the same alignment.
+    "hirschberg" never builds the matrix and uses O(min(N, M)) memory for
+    about twice the work. It returns the same score but may pick a
+    different alignment when several are optimal.
+
+    When the matrix would take more than memory_budget bytes and engine
+    is None, the hirschberg engine is used. An engine asked for by name
+    that does not fit raises a ValueError instead of switching, as
+    hirschberg may return another alignment. Pass memory_budget=None to
+    never switch nor raise.
+
+    gap_extend turns on affine gaps: a gap of length L costs gap_penalty +
+    (L - 1) * gap_extend. It must not be more severe than gap_penalty and
+    is not supported by the loop engine.
+
+    The sequences can be strings or EncodedSequence. matrix, a
+    SubstitutionMatrix (BLOSUM62, ...), replaces match_score and
+    mismatch_score, it is not supported by the loop engine either.
+
+    cache, an AlignmentCache, returns the stored result of a pair already
+    aligned with the same parameters instead of aligning it again.
+    """
+    gap_extend = _gap_extend(engine, gap_penalty, gap_extend, matrix)
+    if cache is not None and not verbose:
+        return cache.cached(
+            "needleman_wunsch",
+            seq1,
+            seq2,
+            (
+                match_score,
+                mismatch_score,
+                gap_penalty,
+                gap_extend,
+                engine,
+                memory_budget,
+                matrix,
+            ),
+            lambda: needleman_wunsch(
+                seq1,
+                seq2,
+                match_score,
+                mismatch_score,
+                gap_penalty,
+                engine=engine,
+                memory_budget=memory_budget,
+                gap_extend=gap_extend,
+                matrix=matrix,
+            ),
+        )
+    # get the lengths
+    seq1_length = len(seq1)
+    seq2_length = len(seq2)
+
+    engine = _engine(engine, seq1_length, seq2_length, memory_budget)
+
+    cells = seq1_length * seq2_length
+    if engine == "loop":
+        matrix_bytes = 8 * (seq1_length + 1) * (seq2_length + 1)
+        with phase("needleman_wunsch.fill", cells, matrix_bytes):
+            score_matrix = _loop_fill(
+                seq1, seq2, match_score, mismatch_score, gap_penalty
+            )
+        # store the alginment score from bottom right of matrix
+        alignment_score = int(score_matrix[seq1_length][seq2_length])
+        with phase("needleman_wunsch.traceback"):
+            aligned_seq1, match_string, aligned_seq2 = _traceback(
+                score_matrix,
+                seq1,
+                seq2,
+                match_score,
+                mismatch_score,
+                gap_penalty,
+            )
+    else:
+        # the sequences are encoded once for the whole run
+        codes1 = encode(seq1)
+        codes2 = encode(seq2)
+        alignment_score, moves = _global_moves(
+            codes1,
+            codes2,
+            match_score,
+            mismatch_score,
+            gap_penalty,
+            gap_extend,
+            matrix,
+            engine,
+        )
+        with phase("needleman_wunsch.strings"):
+            aligned_seq1, match_string, aligned_seq2 = alignment_strings(
+                moves, codes1, codes2
+            )
     # by default this is False
     # if verbose output the value in a nice string format
     # else output the values as a tuple
@@ -131,3 +596,383 @@ def needleman_wunsch(
         return string_out
     else:
         return alignment_score, aligned_seq1, aligned_seq2
+
+
+def needleman_wunsch_alignment(
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    *,
+    engine: Optional[str] = None,
+    memory_budget: Optional[int] = MEMORY_BUDGET,
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
+    cache: Optional[AlignmentCache] = None,
+) -> Alignment:
+    """Return the needleman_wunsch alignment as a compact Alignment.
+
+    The parameters are those of needleman_wunsch and so is the alignment,
+    but only its runs of moves are kept: the gapped strings are built by
+    the Alignment when they are asked for. The parameters after
+    gap_penalty are keyword only.
+    """
+    gap_extend = _gap_extend(engine, gap_penalty, gap_extend, matrix)
+    if cache is not None:
+        return cache.cached(
+            "needleman_wunsch_alignment",
+            seq1,
+            seq2,
+            (
+                match_score,
+                mismatch_score,
+                gap_penalty,
+                gap_extend,
+                engine,
+                memory_budget,
+                matrix,
+            ),
+            lambda: needleman_wunsch_alignment(
+                seq1,
+                seq2,
+                match_score,
+                mismatch_score,
+                gap_penalty,
+                engine=engine,
+                memory_budget=memory_budget,
+                gap_extend=gap_extend,
+                matrix=matrix,
+            ),
+        )
+    engine = _engine(engine, len(seq1), len(seq2), memory_budget)
+    if engine == "loop":
+        # the loop engine builds its aligned strings directly
+        result = needleman_wunsch(
+            seq1,
+            seq2,
+            match_score,
+            mismatch_score,
+            gap_penalty,
+            engine=engine,
+            memory_budget=memory_budget,
+        )
+        assert not isinstance(result, str)
+        score, aligned1, aligned2 = result
+        return Alignment.from_strings(score, aligned1, aligned2, seq1, seq2)
+    score, moves = _global_moves(
+        encode(seq1),
+        encode(seq2),
+        match_score,
+        mismatch_score,
+        gap_penalty,
+        gap_extend,
+        matrix,
+        engine,
+    )
+    return Alignment.from_moves(score, moves, seq1, seq2)
+
+
+def needleman_wunsch_score(
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
+    cache: Optional[AlignmentCache] = None,
+) -> int:
+    """Return only the needleman_wunsch alignment score.
+
+    Only two rows of the score matrix are kept, along the shorter
+    sequence, and there is no traceback so memory is O(min(N, M)) and
+    nothing but the score is built. gap_extend, matrix and cache are as in
+    needleman_wunsch.
+    """
+    if gap_extend is None:
+        gap_extend = gap_penalty
+    if cache is not None:
+        return cache.cached(
+            "needleman_wunsch_score",
+            seq1,
+            seq2,
+            (match_score, mismatch_score, gap_penalty, gap_extend, matrix),
+            lambda: needleman_wunsch_score(
+                seq1,
+                seq2,
+                match_score,
+                mismatch_score,
+                gap_penalty,
+                gap_extend,
+                matrix,
+            ),
+        )
+    if len(seq2) > len(seq1):
+        seq1, seq2 = seq2, seq1
+        matrix = None if matrix is None else matrix.transposed()
+    with phase("needleman_wunsch_score", len(seq1) * len(seq2)):
+        scores, _ = _gotoh_rows(
+            encode(seq1),
+            encode(seq2),
+            match_score,
+            mismatch_score,
+            gap_penalty,
+            gap_extend,
+            gap_penalty - gap_extend,
+            matrix,
+        )
+    return int(scores[-1])
+
+
+class BandedAlignment(NamedTuple):
+    """Result of needleman_wunsch_banded.
+
+    optimal is True when no alignment outside the band (or cut by the
+    x-drop) can score higher. When terminated is True the x-drop stopped
+    the fill before the end and the alignment only covers the prefixes up
+    to the best cell that was reached.
+    """
+
+    score: int
+    aligned_seq1: str
+    aligned_seq2: str
+    band: int
+    optimal: bool
+    terminated: bool
+
+
+def _band_limits(
+    seq1_length: int, seq2_length: int, band: int
+) -> Tuple[int, int]:
+    """Return the lowest and highest diagonal j - i inside the band."""
+    shift = seq2_length - seq1_length
+    return min(0, shift) - band, max(0, shift) + band
+
+
+def _outside_bound(
+    seq1_length: int,
+    seq2_length: int,
+    band: int,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+) -> Optional[int]:
+    """Return twice the best score a path leaving the band could reach.
+
+    The diagonal j - i only changes on gaps, so a path that reaches the
+    diagonal d and ends on seq2_length - seq1_length has at least
+    |d| + |d - (seq2_length - seq1_length)| gaps. With g gaps it has
+    (N + M - g) / 2 substitutions, which bounds its score. Return None
+    when the band already holds every path.
+    """
+    lowest, highest = _band_limits(seq1_length, seq2_length, band)
+    shift = seq2_length - seq1_length
+    gaps = [
+        abs(d) + abs(d - shift)
+        for d in (lowest - 1, highest + 1)
+        if -seq1_length <= d <= seq2_length
+    ]
+    if not gaps:
+        return None
+    total = seq1_length + seq2_length
+    best_substitution = max(match_score, mismatch_score)
+
+    def twice_score(gap_count: int) -> int:
+        substitutions = total - gap_count
+        return best_substitution * substitutions + 2 * gap_penalty * gap_count
+
+    # the bound is linear in the number of gaps, check both ends
+    return max(twice_score(min(gaps)), twice_score(total))
+
+
+def _banded_fill(
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    band: int,
+    x_drop: Optional[int],
+) -> Tuple[npt.NDArray[np.int64], bool, bool, Tuple[int, int]]:
+    """Fill the cells of the score matrix within the band.
+
+    The band is stored row by row, cell (i, j) at column j - i - lowest,
+    so the diagonal move of a cell is the same column of the previous row
+    and the vertical move is the next column.
+
+    With x_drop the cells more than x_drop below the best score seen so
+    far are dropped. Return the band, whether a cell was dropped, whether
+    the fill stopped before reaching the last cell and the best cell seen.
+    """
+    seq1_length = len(seq1)
+    seq2_length = len(seq2)
+    codes1 = encode(seq1)
+    codes2 = encode(seq2)
+    lowest, highest = _band_limits(seq1_length, seq2_length, band)
+    width = highest - lowest + 1
+    steps = np.arange(width, dtype=np.int64) * gap_penalty
+
+    bands = np.full((seq1_length + 1, width), NEG, dtype=np.int64)
+    first = np.arange(min(seq2_length, highest) + 1, dtype=np.int64)
+    bands[0, first - lowest] = first * gap_penalty
+    best_score = 0
+    best_cell = (0, 0)
+    dropped = False
+    row = np.empty(width, dtype=np.int64)
+
+    for i in range(1, seq1_length + 1):
+        previous = bands[i - 1]
+        # columns of the band inside the matrix on this row
+        start = max(0, i + lowest) - i - lowest
+        stop = min(seq2_length, i + highest) - i - lowest + 1
+        row[:] = NEG
+        inner = start + (1 if i + lowest <= 0 else 0)
+        if inner < stop:
+            cells = slice(inner, stop)
+            columns = slice(i + lowest + inner - 1, i + lowest + stop - 1)
+            substitution = np.where(
+                codes2[columns] == codes1[i - 1], match_score, mismatch_score
+            )
+            vertical = np.append(previous[1:], NEG)
+            np.maximum(
+                previous[cells] + substitution,
+                vertical[cells] + gap_penalty,
+                out=row[cells],
+            )
+        if i + lowest <= 0:
+            # first column of the matrix
+            row[start] = i * gap_penalty
+        # horizontal moves, see _gotoh_rows
+        row -= steps
+        np.maximum.accumulate(row, out=row)
+        row += steps
+        row[:start] = NEG
+        row[stop:] = NEG
+        if x_drop is not None:
+            top = int(row.max())
+            if top > best_score:
+                best_score = top
+                best_cell = (i, int(np.argmax(row)) + i + lowest)
+            low = (row < best_score - x_drop) & (row > NEG)
+            if low.any():
+                dropped = True
+                row[low] = NEG
+            if int(row.max()) == NEG:
+                return bands, dropped, True, best_cell
+        bands[i] = row
+    # the x-drop can also drop the last cell without dropping a whole row
+    reached = bands[seq1_length, seq2_length - seq1_length - lowest] > NEG
+    return bands, dropped, not reached, best_cell
+
+
+def _banded_traceback(
+    bands: npt.NDArray[np.int64],
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    lowest: int,
+    end: Tuple[int, int],
+) -> Tuple[str, str]:
+    """Trace the band back from end with the tie-breaking of _traceback."""
+    aligned_seq1: list[str] = []
+    aligned_seq2: list[str] = []
+    trc1, trc2 = end
+
+    def cell(i: int, j: int) -> int:
+        column = j - i - lowest
+        if 0 <= column < bands.shape[1]:
+            return int(bands[i, column])
+        return int(NEG)
+
+    while trc1 > 0 or trc2 > 0:
+        current_val = cell(trc1, trc2)
+        if trc1 > 0 and trc2 > 0:
+            matched = seq1[trc1 - 1] == seq2[trc2 - 1]
+            mis_match_score = match_score if matched else mismatch_score
+            diagonal = cell(trc1 - 1, trc2 - 1) + mis_match_score
+        if trc1 > 0 and trc2 > 0 and current_val == diagonal:
+            aligned_seq1.append(seq1[trc1 - 1])
+            aligned_seq2.append(seq2[trc2 - 1])
+            trc1 -= 1
+            trc2 -= 1
+        elif trc1 > 0 and current_val == cell(trc1 - 1, trc2) + gap_penalty:
+            aligned_seq1.append(seq1[trc1 - 1])
+            aligned_seq2.append("-")
+            trc1 -= 1
+        else:
+            aligned_seq1.append("-")
+            aligned_seq2.append(seq2[trc2 - 1])
+            trc2 -= 1
+    return "".join(reversed(aligned_seq1)), "".join(reversed(aligned_seq2))
+
+
+def needleman_wunsch_banded(
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    band: Optional[int] = None,
+    x_drop: Optional[int] = None,
+) -> BandedAlignment:
+    """Global alignment restricted to a band around the main diagonal.
+
+    Only the cells whose diagonal j - i is at most band away from the
+    diagonals between the two corners are filled, so time and memory are
+    O(N * band). The result is flagged as optimal when no path leaving the
+    band could beat it (see _outside_bound).
+
+    With band=None the band starts at BAND_WIDTH and doubles until the
+    result is optimal or the x-drop has dropped cells. x_drop drops the
+    cells that fall more than x_drop below the best score seen so far, and
+    stops as soon as a whole row is dropped (the sequences have diverged).
+    """
+    seq1_length = len(seq1)
+    seq2_length = len(seq2)
+    width = BAND_WIDTH if band is None else band
+    while True:
+        bands, dropped, terminated, best_cell = _banded_fill(
+            seq1,
+            seq2,
+            match_score,
+            mismatch_score,
+            gap_penalty,
+            width,
+            x_drop,
+        )
+        lowest, _ = _band_limits(seq1_length, seq2_length, width)
+        end = best_cell if terminated else (seq1_length, seq2_length)
+        score = int(bands[end[0], end[1] - end[0] - lowest])
+        bound = _outside_bound(
+            seq1_length,
+            seq2_length,
+            width,
+            match_score,
+            mismatch_score,
+            gap_penalty,
+        )
+        optimal = (
+            not dropped
+            and not terminated
+            and (bound is None or 2 * score >= bound)
+        )
+        # a wider band does not help once the x-drop has dropped cells
+        if optimal or band is not None or dropped or bound is None:
+            break
+        width *= 2
+    aligned_seq1, aligned_seq2 = _banded_traceback(
+        bands,
+        seq1,
+        seq2,
+        match_score,
+        mismatch_score,
+        gap_penalty,
+        lowest,
+        end,
+    )
+    return BandedAlignment(
+        score, aligned_seq1, aligned_seq2, width, optimal, terminated
+    )
@@ -0,0 +1,140 @@
+"""
+Column counts of a growing multiple alignment.
+
+A Profile keeps the aligned sequences as a 2d array of code points and the
+number of every letter in every column as an (alphabet x length) count
+array. Letters get a row the first time they are seen, so any alphabet
+(IUPAC nucleotide codes, amino acids, ...) works. Inserting gap columns and
+adding a sequence update the counts in place instead of recounting the
+whole alignment.
+
+A sequence can stand for several identical sequences: it is stored once
+and counted with its weight.
+"""
+
+import numpy as np
+import numpy.typing as npt
+from typing import Iterable, Sequence
+
+from Encoded_sequence import SequenceLike
+from Wavefront import encode
+
+GAP = "-"
+
+NUCLEOTIDES = "ACGT"
+IUPAC_NUCLEOTIDES = "ACGTURYSWKMBDHVN"
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWYBZJUOX*"
+
+
+class Profile:
+    """Letter counts of every column of a set of aligned sequences.
+
+    counts[profile.rows[letter], i] is the number of sequences with letter
+    at position i. The gap always has a row. size is the number of stored
+    sequences and weight the number of sequences they stand for.
+    """
+
+    def __init__(
+        self, sequences: Iterable[SequenceLike] = (), alphabet: str = ""
+    ) -> None:
+        """Count sequences, letters of alphabet get the first rows."""
+        self.letters: list[str] = []
+        self.rows: dict[str, int] = {}
+        self.length = 0
+        self.size = 0
+        self.weight = 0
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+        # aligned sequences, grown by doubling the number of rows
+        self._codes = np.zeros((0, 0), dtype=np.uint32)
+        self._add_letters(GAP + alphabet)
+        for seq in sequences:
+            self.add(seq)
+
+    def _add_letters(self, letters: Iterable[str]) -> None:
+        """Give a row of counts to the letters that do not have one yet."""
+        new = [
+            letter
+            for letter in dict.fromkeys(letters)
+            if letter not in self.rows
+        ]
+        if not new:
+            return
+        for letter in new:
+            self.rows[letter] = len(self.letters)
+            self.letters.append(letter)
+        added = np.zeros((len(new), self.length), dtype=np.int64)
+        self.counts = np.concatenate([self.counts, added])
+
+    def _make_room(self, length: int, size: int) -> None:
+        """Check the length of new sequences and make room for them."""
+        if self.size == 0:
+            self.length = length
+            self.counts = np.zeros((len(self.letters), length), np.int64)
+            self._codes = np.zeros((0, length), dtype=np.uint32)
+        elif length != self.length:
+            raise ValueError("aligned sequences must have the same length")
+        if self.size + size > len(self._codes):
+            rows = max(2 * self.size, self.size + size)
+            grown = np.empty((rows, length), dtype=np.uint32)
+            grown[slice(self.size)] = self._codes[slice(self.size)]
+            self._codes = grown
+
+    def add(self, sequence: SequenceLike, weight: int = 1) -> None:
+        """Add an aligned sequence, counted weight times, to the profile."""
+        codes = encode(sequence)
+        self._make_room(len(codes), 1)
+        letters, inverse = np.unique(codes, return_inverse=True)
+        self._add_letters(chr(letter) for letter in letters)
+        row_of = np.array([self.rows[chr(letter)] for letter in letters])
+        self.counts[row_of[inverse], np.arange(self.length)] += weight
+        self._codes[self.size] = codes
+        self.size += 1
+        self.weight += weight
+
+    def extend(self, other: "Profile") -> None:
+        """Add all the sequences of another profile of the same length."""
+        if other.size == 0:
+            return
+        self._make_room(other.length, other.size)
+        self._add_letters(other.letters)
+        self.counts += other.counts_of(self.letters)
+        size = self.size + other.size
+        self._codes[slice(self.size, size)] = other._codes[slice(other.size)]
+        self.size = size
+        self.weight += other.weight
+
+    def insert_gaps(
+        self, present: npt.NDArray[np.bool_], start: int = 0
+    ) -> None:
+        """Insert gap columns where present is False.
+
+        The columns start, start + 1, ... of the profile go, in order, to
+        the positions where present is True. Columns before start and after
+        the last one used are dropped.
+        """
+        length = len(present)
+        used = slice(start, start + int(np.count_nonzero(present)))
+        counts = np.zeros((len(self.letters), length), dtype=np.int64)
+        counts[:, present] = self.counts[:, used]
+        counts[self.rows[GAP], ~present] = self.weight
+        self.counts = counts
+
+        codes = np.full((len(self._codes), length), ord(GAP), np.uint32)
+        codes[:, present] = self._codes[:, used]
+        self._codes = codes
+        self.length = length
+
+    def counts_of(self, letters: Sequence[str]) -> npt.NDArray[np.int64]:
+        """Return the count rows of letters, zeros for unseen letters."""
+        counts = np.zeros((len(letters), self.length), dtype=np.int64)
+        for k, letter in enumerate(letters):
+            if letter in self.rows:
+                counts[k] = self.counts[self.rows[letter]]
+        return counts
+
+    def sequences(self) -> list[str]:
+        """Return the aligned sequences."""
+        return [
+            row.tobytes().decode("utf-32-le")
+            for row in self._codes[slice(self.size)]
+        ]
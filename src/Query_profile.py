@@ -0,0 +1,255 @@
+"""
+Query profile Smith-Waterman for scanning one query against many targets.
+
+The substitution scores of the query against every residue are computed
+once in a QueryProfile and reused for every target. Targets are aligned in
+batches: the dynamic programming runs over the (short) query, one row per
+query position, and every row is a vectorized numpy operation over all the
+target positions of the batch. Scores are kept in the narrowest integer
+lanes that cannot overflow (int8 first, then int16, int32 and int64).
+"""
+
+import numpy as np
+import numpy.typing as npt
+from typing import Any, Optional, Sequence, Tuple
+
+from Encoded_sequence import SequenceLike
+from Instrumentation import phase
+from Substitution_matrix import TABLE_SIZE, SubstitutionMatrix
+from Wavefront import encode
+
+# lane types from the narrowest to the widest
+LANE_TYPES: Tuple[Any, ...] = (np.int8, np.int16, np.int32, np.int64)
+
+# upper bound of target cells aligned together in align_many
+BATCH_CELLS = 1 << 20
+
+
+class QueryProfile:
+    """Smith-Waterman scores of one query against any target.
+
+    The profile has one row per query position and one column per query
+    residue, plus a column for residues missing from the query and a
+    column for the padding after the end of a short target in a batch.
+    """
+
+    def __init__(
+        self,
+        query: SequenceLike,
+        match_score: int,
+        mismatch_score: int,
+        gap_penalty: int,
+        gap_extend: Optional[int] = None,
+        matrix: Optional[SubstitutionMatrix] = None,
+    ) -> None:
+        """Build the profile of query for the given scores.
+
+        gap_extend turns on affine gaps and matrix replaces match_score and
+        mismatch_score, as in smith_waterman.
+        """
+        if gap_extend is None:
+            gap_extend = gap_penalty
+        elif gap_extend < gap_penalty:
+            raise ValueError("gap_extend must not be lower than gap_penalty")
+        self.query = query
+        self.match_score = match_score
+        self.mismatch_score = mismatch_score
+        self.gap_penalty = gap_penalty
+        self.gap_extend = gap_extend
+
+        codes = encode(query)
+        if matrix is None:
+            self.alphabet = np.unique(codes)
+            # column of every query position in the profile
+            columns = np.searchsorted(self.alphabet, codes)
+            size = len(self.alphabet)
+            profile = np.full((len(query), size + 2), mismatch_score, np.int64)
+            profile[np.arange(len(query)), columns] = match_score
+            self.lowest = min(match_score, mismatch_score)
+            self.highest = max(match_score, mismatch_score)
+        else:
+            # every letter the matrix knows, in both cases
+            letters = matrix.letters.upper() + matrix.letters.lower()
+            known = np.array([ord(letter) for letter in letters], np.uint32)
+            self.alphabet = np.unique(np.concatenate([codes, known]))
+            size = len(self.alphabet)
+            profile = np.empty((len(query), size + 2), np.int64)
+            profile[:, :size] = matrix.lookup(
+                codes[:, None], self.alphabet[None, :]
+            )
+            # the scores of the letters the matrix does not know
+            profile[:, size] = matrix.lookup(codes, TABLE_SIZE - 1)
+            profile[:, size + 1] = 0
+            self.lowest = matrix.lowest
+            self.highest = matrix.highest
+        self.profile = profile
+        self._lanes: dict[Any, npt.NDArray[Any]] = {}
+
+    def lane_types(self) -> list[Any]:
+        """Return the lane types that can hold the profile scores."""
+        low = min(self.lowest, self.gap_penalty)
+        high = max(self.highest, 0)
+        types = []
+        for lane in LANE_TYPES:
+            info = np.iinfo(lane)
+            # a positive gap penalty makes the horizontal chain unbounded
+            if self.gap_extend >= 0 and lane is not np.int64:
+                continue
+            if low >= info.min // 2 and high <= info.max // 2:
+                types.append(lane)
+        return types
+
+    def lanes(self, lane: Any) -> npt.NDArray[Any]:
+        """Return the profile stored in the given lane type (cached)."""
+        if lane not in self._lanes:
+            profile = self.profile.astype(lane)
+            # padding never scores
+            profile[:, -1] = np.iinfo(lane).min
+            self._lanes[lane] = profile
+        return self._lanes[lane]
+
+    def encode(self, target: SequenceLike) -> npt.NDArray[np.intp]:
+        """Return the profile column of every residue of target."""
+        codes = encode(target)
+        size = len(self.alphabet)
+        columns = np.searchsorted(self.alphabet, codes)
+        clipped = np.minimum(columns, max(size - 1, 0))
+        if size:
+            known = self.alphabet[clipped] == codes
+        else:
+            known = np.zeros(len(codes), dtype=bool)
+        return np.where(known, columns, size)
+
+    def align(self, target: SequenceLike) -> Tuple[int, int, int]:
+        """Return (score, query_end, target_end) of the best local hit.
+
+        This is the same as smith_waterman_score(query, target, ...).
+        """
+        return self.align_many([target])[0]
+
+    def align_many(
+        self, targets: Sequence[SequenceLike]
+    ) -> list[Tuple[int, int, int]]:
+        """Align every target, return results in the order of targets.
+
+        Targets of similar length are grouped so little time is spent on
+        padding.
+        """
+        results: list[Tuple[int, int, int]] = [(0, 0, 0)] * len(targets)
+        order = sorted(range(len(targets)), key=lambda k: len(targets[k]))
+        start = 0
+        while start < len(order):
+            # grow the batch while the padded block stays small
+            stop = start + 1
+            width = len(targets[order[start]]) + 1
+            while stop < len(order):
+                width = len(targets[order[stop]]) + 1
+                if width * (stop - start + 1) > BATCH_CELLS:
+                    break
+                stop += 1
+            batch = [targets[k] for k in order[start:stop]]
+            # the batch is padded to its last, longest, target
+            cells = len(self.query) * len(batch[-1]) * len(batch)
+            with phase("query_profile", cells):
+                aligned = self._align_batch(batch)
+            for k, result in zip(order[start:stop], aligned):
+                results[k] = result
+            start = stop
+        return results
+
+    def _align_batch(
+        self, targets: list[SequenceLike]
+    ) -> list[Tuple[int, int, int]]:
+        """Align a batch of targets, widening the lanes on overflow."""
+        width = max(len(target) for target in targets)
+        if width == 0:
+            # only empty targets, there is no local alignment at all
+            return [(0, 0, 0)] * len(targets)
+        # pad with the last profile column
+        columns = np.full(
+            (len(targets), width), len(self.alphabet) + 1, dtype=np.intp
+        )
+        for row, target in enumerate(targets):
+            columns[row, slice(len(target))] = self.encode(target)
+        lengths = np.array([len(target) for target in targets])
+        for lane in self.lane_types():
+            result = self._fill(columns, lengths, lane)
+            if result is not None:
+                return result
+        raise OverflowError("scores do not fit in 64 bit integers")
+
+    def _fill(
+        self,
+        columns: npt.NDArray[np.intp],
+        lengths: npt.NDArray[Any],
+        lane: Any,
+    ) -> Optional[list[Tuple[int, int, int]]]:
+        """Run the dynamic programming in one lane type.
+
+        Return None if a score got too close to the top of the lane.
+        """
+        profile = self.lanes(lane)
+        gap_open = self.gap_penalty
+        gap_extend = self.gap_extend
+        # no score may exceed limit, so adding a match cannot wrap around
+        limit = np.iinfo(lane).max - max(self.highest, 0)
+        batch, width = columns.shape
+        valid = np.arange(1, width + 1) <= lengths[:, None]
+        rows = np.zeros((batch, width + 1), dtype=lane)
+        current = np.zeros((batch, width + 1), dtype=lane)
+        # best score ending with a vertical gap, extending the first row
+        # gives gap_open which is also what opening a gap gives there
+        vertical = np.full((batch, width), gap_open - gap_extend, dtype=lane)
+        opened = np.empty((batch, width), dtype=lane)
+        horizontal = np.zeros((batch, width + 1), dtype=lane)
+        scan = np.zeros((batch, width + 1), dtype=lane)
+        best = np.zeros(batch, dtype=np.int64)
+        best_i = np.zeros(batch, dtype=np.int64)
+        best_j = np.zeros(batch, dtype=np.int64)
+
+        for i in range(1, len(self.query) + 1):
+            substitution = profile[i - 1][columns]
+            # diagonal and vertical moves come from the previous row
+            np.add(rows[:, :-1], substitution, out=current[:, 1:])
+            np.add(rows[:, 1:], lane(gap_open), out=opened)
+            np.add(vertical, lane(gap_extend), out=vertical)
+            np.maximum(vertical, opened, out=vertical)
+            np.maximum(current[:, 1:], vertical, out=scan[:, 1:])
+            np.maximum(scan[:, 1:], 0, out=current[:, 1:])
+            row_top = int(current.max())
+            if row_top > limit:
+                return None
+            # horizontal moves: log step prefix scan of
+            # max(G[k] + gap_extend * s), then H[j] is the best of G[j] and
+            # of a gap opened after any of the previous cells
+            horizontal[...] = current
+            shift = 1
+            while shift <= width and (
+                gap_extend >= 0 or -gap_extend * shift < row_top
+            ):
+                source = np.s_[:, :-shift]
+                target = np.s_[:, shift:]
+                np.add(
+                    horizontal[source],
+                    lane(gap_extend * shift),
+                    out=scan[source],
+                )
+                np.maximum(
+                    horizontal[target], scan[source], out=horizontal[target]
+                )
+                shift *= 2
+            np.add(horizontal[:, :-1], lane(gap_open), out=scan[:, 1:])
+            np.maximum(current[:, 1:], scan[:, 1:], out=current[:, 1:])
+            # keep the last cell (row by row) that reaches the best score
+            masked = np.where(valid, current[:, 1:], -1)
+            row_max = masked.max(axis=1)
+            ends = width - np.argmax(masked[:, ::-1] == row_max[:, None], 1)
+            better = row_max >= best
+            best = np.where(better, row_max, best)
+            best_i = np.where(better, i, best_i)
+            best_j = np.where(better, ends, best_j)
+            rows, current = current, rows
+        return [
+            (int(score), int(end_i), int(end_j))
+            for score, end_i, end_j in zip(best, best_i, best_j)
+        ]
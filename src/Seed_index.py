@@ -0,0 +1,452 @@
+"""
+Seed-and-extend local alignment of reads against a large reference.
+
+A SeedIndex holds the minimizers of the reference: the k-mer with the
+smallest hash of every window of consecutive k-mers. They are stored as a
+sorted array of hashes and the matching reference positions, so a lookup is
+a binary search. save writes the index and the reference letters to a
+single file of .npy arrays and load maps that file, so a saved index opens
+instantly whatever the size of the reference and its pages are shared by
+every process that maps it:
+
+    index = SeedIndex.build(references, k=15, window=10)
+    index.save("reference.idx")
+    hit = SeedIndex.load("reference.idx").align(read, 2, -3, -5, -2)
+
+align looks up every k-mer of the read, drops the seeds that are too
+frequent to be informative, chains the remaining seeds by diagonal
+(reference position - read position) and runs a banded Smith-Waterman
+around the best chains: only the diagonals of a chain, with band more on
+each side, are filled. A chain never spans more than max_span diagonals,
+so in repeats the cost stays O(read * (max_span + band)). When no seed
+hits, every reference is scanned with the score only smith_waterman and
+the traceback is run on a window around the best end.
+Only the given strand of the read is aligned.
+"""
+
+import os
+import numpy as np
+import numpy.typing as npt
+from typing import NamedTuple, Optional, Sequence, Tuple, Union
+
+from Encoded_sequence import EncodedSequence, SequenceLike
+from Instrumentation import phase
+from Smith_waterman import (
+    _symbol_and_identity,
+    smith_waterman_banded,
+    smith_waterman_score,
+)
+from Substitution_matrix import SubstitutionMatrix
+from Wavefront import Codes, encode
+
+# first array of a saved index, with its k and window
+MAGIC = 0x5345454449445801
+
+K = 15
+WINDOW = 10
+BAND = 32
+MAX_SPAN = 64
+CANDIDATES = 3
+MAX_OCCURRENCES = 64
+
+_MULTIPLIER = np.uint64(0x100000001B3)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+Path = Union[str, "os.PathLike[str]"]
+
+
+class MappedRead(NamedTuple):
+    """The local alignment of a read on one reference.
+
+    The alignment covers read[query_start:query_end] and
+    reference[reference_start:reference_end]. seeded is False when no seed
+    hit and the alignment comes from the full scan.
+    """
+
+    reference_index: int
+    score: int
+    query_start: int
+    query_end: int
+    reference_start: int
+    reference_end: int
+    identity: int
+    aligned_query: str
+    symbol: str
+    aligned_reference: str
+    seeded: bool
+
+
+def _kmer_hashes(codes: Codes, k: int) -> npt.NDArray[np.uint64]:
+    """Return the hash of every k-mer of codes, in order."""
+    count = len(codes) - k + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64)
+    letters = codes.astype(np.uint64)
+    hashes = np.zeros(count, dtype=np.uint64)
+    # polynomial hash, then the splitmix64 finalizer so the minimizers are
+    # spread over the reference instead of favouring low letters
+    for offset in range(k):
+        hashes *= _MULTIPLIER
+        hashes += letters[slice(offset, offset + count)]
+    hashes ^= hashes >> np.uint64(30)
+    hashes *= _MIX1
+    hashes ^= hashes >> np.uint64(27)
+    hashes *= _MIX2
+    hashes ^= hashes >> np.uint64(31)
+    return hashes
+
+
+def _minimizers(
+    hashes: npt.NDArray[np.uint64], window: int
+) -> npt.NDArray[np.int64]:
+    """Return the positions of the minimizers of every window of hashes.
+
+    Ties keep the leftmost k-mer.
+    """
+    count = len(hashes) - window + 1
+    if count <= 0:
+        if len(hashes) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.array([np.argmin(hashes)], dtype=np.int64)
+    best = hashes[:count].copy()
+    where = np.arange(count, dtype=np.int64)
+    for offset in range(1, window):
+        candidate = hashes[slice(offset, offset + count)]
+        smaller = candidate < best
+        best[smaller] = candidate[smaller]
+        where[smaller] = np.flatnonzero(smaller) + offset
+    return np.unique(where)
+
+
+def _read_arrays(path: Path, count: int) -> list[npt.NDArray[np.generic]]:
+    """Map the first count .npy arrays stored one after the other."""
+    arrays: list[npt.NDArray[np.generic]] = []
+    with open(path, "rb") as handle:
+        for _ in range(count):
+            version = np.lib.format.read_magic(handle)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(handle)
+            else:
+                header = np.lib.format.read_array_header_2_0(handle)
+            shape, fortran_order, dtype = header
+            if fortran_order or len(shape) != 1:
+                raise ValueError(f"{path} is not a seed index")
+            offset = handle.tell()
+            if shape[0] == 0:
+                arrays.append(np.empty(0, dtype=dtype))
+            else:
+                arrays.append(
+                    np.memmap(path, dtype, "r", offset=offset, shape=shape)
+                )
+            handle.seek(offset + shape[0] * dtype.itemsize)
+    return arrays
+
+
+class SeedIndex:
+    """Minimizer index of a list of references.
+
+    The references are kept as one array of letters, reference i is
+    letters[offsets[i]:offsets[i + 1]]. hashes is sorted and
+    positions[n] is where the k-mer of hashes[n] starts in letters.
+    """
+
+    def __init__(
+        self,
+        k: int,
+        window: int,
+        offsets: npt.NDArray[np.int64],
+        hashes: npt.NDArray[np.uint64],
+        positions: npt.NDArray[np.unsignedinteger],
+        letters: npt.NDArray[np.uint8],
+    ) -> None:
+        """Wrap the arrays of an index, use build or load to make one."""
+        self.k = k
+        self.window = window
+        self.offsets = offsets
+        self.hashes = hashes
+        self.positions = positions
+        self.letters = letters
+
+    @classmethod
+    def build(
+        cls,
+        references: Sequence[SequenceLike],
+        k: int = K,
+        window: int = WINDOW,
+    ) -> "SeedIndex":
+        """Index the minimizers of references.
+
+        Every window consecutive k-mers of a reference share at least one
+        indexed k-mer, so a read matching the reference exactly over
+        window + k - 1 letters always gets a seed. window=1 indexes every
+        k-mer.
+        """
+        if k < 1 or window < 1:
+            raise ValueError("k and window must be at least 1")
+        codes = [EncodedSequence(reference).codes for reference in references]
+        offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum([len(code) for code in codes], out=offsets[1:])
+        all_hashes = []
+        all_positions = []
+        for offset, code in zip(offsets.tolist(), codes):
+            hashes = _kmer_hashes(code, k)
+            where = _minimizers(hashes, window)
+            all_hashes.append(hashes[where])
+            all_positions.append(where + offset)
+        hashes = np.concatenate([np.empty(0, np.uint64), *all_hashes])
+        positions = np.concatenate([np.empty(0, np.int64), *all_positions])
+        order = np.argsort(hashes, kind="stable")
+        position_type = np.uint32 if offsets[-1] < 1 << 32 else np.uint64
+        return cls(
+            k,
+            window,
+            offsets,
+            hashes[order],
+            positions[order].astype(position_type),
+            np.concatenate([np.empty(0, np.uint8), *codes]),
+        )
+
+    def save(self, path: Path) -> None:
+        """Write the index and the references to a file."""
+        header = np.array([MAGIC, self.k, self.window], dtype=np.int64)
+        with open(path, "wb") as handle:
+            # the 8 byte arrays first, so every array stays aligned
+            for array in (
+                header,
+                self.offsets,
+                self.hashes,
+                self.positions,
+                self.letters,
+            ):
+                np.lib.format.write_array(
+                    handle, np.ascontiguousarray(array), allow_pickle=False
+                )
+
+    @classmethod
+    def load(cls, path: Path) -> "SeedIndex":
+        """Map an index written by save, nothing is read up front."""
+        header, offsets, hashes, positions, letters = _read_arrays(path, 5)
+        if len(header) != 3 or int(header[0]) != MAGIC:
+            raise ValueError(f"{path} is not a seed index")
+        return cls(
+            int(header[1]),
+            int(header[2]),
+            np.asarray(offsets, dtype=np.int64),
+            np.asarray(hashes, dtype=np.uint64),
+            np.asarray(positions),
+            np.asarray(letters, dtype=np.uint8),
+        )
+
+    def __len__(self) -> int:
+        """Return the number of references."""
+        return len(self.offsets) - 1
+
+    def reference(self, index: int) -> EncodedSequence:
+        """Return a reference, sharing the letters of the index."""
+        start, stop = self.offsets[slice(index, index + 2)].tolist()
+        return EncodedSequence.from_codes(self.letters[start:stop])
+
+    def seeds(
+        self, query: SequenceLike, max_occurrences: int = MAX_OCCURRENCES
+    ) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """Return the read and reference positions of the seeds of query.
+
+        Every k-mer of the read is looked up. A k-mer found more than
+        max_occurrences times in the references (a repeat) is dropped.
+        """
+        hashes = _kmer_hashes(encode(query), self.k)
+        first = np.searchsorted(self.hashes, hashes, "left")
+        counts = np.searchsorted(self.hashes, hashes, "right") - first
+        found = (counts > 0) & (counts <= max_occurrences)
+        counts = counts[found]
+        query_positions = np.repeat(np.flatnonzero(found), counts)
+        # index of every seed in hashes: the first match of its k-mer and
+        # its rank among the matches of the k-mer
+        ends = np.cumsum(counts)
+        rank = np.arange(len(query_positions)) - np.repeat(
+            ends - counts, counts
+        )
+        entries = np.repeat(first[found], counts) + rank
+        return (
+            query_positions.astype(np.int64),
+            self.positions[entries].astype(np.int64),
+        )
+
+    def candidates(
+        self,
+        query: SequenceLike,
+        band: int = BAND,
+        count: int = CANDIDATES,
+        max_occurrences: int = MAX_OCCURRENCES,
+        max_span: int = MAX_SPAN,
+    ) -> list[Tuple[int, int, int]]:
+        """Return the bands of diagonals of the best chains of seeds.
+
+        Seeds of the same reference whose diagonals are at most band apart
+        are chained together, and a chain is cut before it spans more than
+        max_span diagonals. Chains with more seeds come first. The bands
+        are (reference_index, lowest, highest), the diagonals reference
+        position - read position of the chain with band more on each side.
+        """
+        query_positions, positions = self.seeds(query, max_occurrences)
+        if len(positions) == 0:
+            return []
+        references = np.searchsorted(self.offsets, positions, "right") - 1
+        diagonals = positions - self.offsets[references] - query_positions
+        order = np.lexsort((diagonals, references))
+        # [reference, lowest diagonal, highest diagonal, seeds]
+        chains: list[list[int]] = []
+        for reference, diagonal in zip(
+            references[order].tolist(), diagonals[order].tolist()
+        ):
+            if (
+                chains
+                and chains[-1][0] == reference
+                and diagonal - chains[-1][2] <= band
+                and diagonal - chains[-1][1] <= max_span
+            ):
+                chains[-1][2] = diagonal
+                chains[-1][3] += 1
+            else:
+                chains.append([reference, diagonal, diagonal, 1])
+        # the biggest chains first, then the first in the references
+        best = sorted(chains, key=lambda chain: -chain[3])[:count]
+        return [
+            (reference, low - band, high + band)
+            for reference, low, high, _ in best
+        ]
+
+    def align(
+        self,
+        query: SequenceLike,
+        match_score: int,
+        mismatch_score: int,
+        gap_penalty: int,
+        gap_extend: Optional[int] = None,
+        matrix: Optional[SubstitutionMatrix] = None,
+        band: int = BAND,
+        candidates: int = CANDIDATES,
+        max_occurrences: int = MAX_OCCURRENCES,
+        max_span: int = MAX_SPAN,
+    ) -> Optional[MappedRead]:
+        """Return the best local alignment of query on the references.
+
+        The bands of the best candidates chains are aligned with a banded
+        Smith-Waterman and the best scoring alignment is returned, the
+        first band on ties. None means the read has no local similarity
+        with any reference. The scores are as in smith_waterman.
+        """
+        if gap_extend is None:
+            gap_extend = gap_penalty
+        elif gap_extend < gap_penalty:
+            raise ValueError("gap_extend must not be lower than gap_penalty")
+        scoring = (match_score, mismatch_score, gap_penalty, gap_extend)
+        with phase("seed_index.seeds", len(query)):
+            bands = self.candidates(
+                query, band, candidates, max_occurrences, max_span
+            )
+        seeded = bool(bands)
+        if not seeded:
+            bands = self._best_window(query, *scoring, matrix)
+        best: Optional[MappedRead] = None
+        for reference, lowest, highest in bands:
+            hit = self._align_band(
+                query, reference, lowest, highest, *scoring, matrix, seeded
+            )
+            if hit.score > 0 and (best is None or hit.score > best.score):
+                best = hit
+        return best
+
+    def _best_window(
+        self,
+        query: SequenceLike,
+        match_score: int,
+        mismatch_score: int,
+        gap_penalty: int,
+        gap_extend: int,
+        matrix: Optional[SubstitutionMatrix],
+    ) -> list[Tuple[int, int, int]]:
+        """Scan every reference for the best local score of query.
+
+        Return the band of the reference that ends with the best alignment
+        and is wide enough to hold all of it.
+        """
+        best = (0, 0, 0)
+        for reference in range(len(self)):
+            score, _, end = smith_waterman_score(
+                query,
+                self.reference(reference),
+                match_score,
+                mismatch_score,
+                gap_penalty,
+                gap_extend,
+                matrix,
+            )
+            if score > best[0]:
+                best = (score, reference, end)
+        score, reference, end = best
+        if score == 0:
+            return []
+        # every reference letter out of the read is a gap that costs at
+        # least -gap_extend, and the read letters score at most highest
+        highest = matrix.highest if matrix is not None else match_score
+        span = end
+        if gap_extend < 0:
+            span = len(query) + len(query) * max(highest, 0) // -gap_extend
+        # every diagonal from the start of the window to the best end
+        return [(reference, end - span - len(query), end)]
+
+    def _align_band(
+        self,
+        query: SequenceLike,
+        reference: int,
+        lowest: int,
+        highest: int,
+        match_score: int,
+        mismatch_score: int,
+        gap_penalty: int,
+        gap_extend: int,
+        matrix: Optional[SubstitutionMatrix],
+        seeded: bool,
+    ) -> MappedRead:
+        """Align query on the diagonals lowest to highest of a reference.
+
+        Only the window of the reference the band crosses is read.
+        """
+        first = int(self.offsets[reference])
+        length = int(self.offsets[reference + 1]) - first
+        start = max(0, lowest)
+        stop = min(length, highest + len(query))
+        window = EncodedSequence.from_codes(
+            self.letters[slice(first + start, first + stop)]
+        )
+        with phase("seed_index.extend"):
+            alignment = smith_waterman_banded(
+                query,
+                window,
+                match_score,
+                mismatch_score,
+                gap_penalty,
+                lowest - start,
+                highest - start,
+                gap_extend=gap_extend,
+                matrix=matrix,
+            )
+            aligned_query, _, aligned_reference = alignment.strings()
+        symbol, identity = _symbol_and_identity(
+            aligned_query, aligned_reference
+        )
+        return MappedRead(
+            reference,
+            alignment.score,
+            alignment.start1,
+            alignment.end1,
+            start + alignment.start2,
+            start + alignment.end2,
+            identity,
+            aligned_query,
+            symbol,
+            aligned_reference,
+            seeded,
+        )
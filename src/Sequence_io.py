@@ -0,0 +1,206 @@
+"""
+Streaming FASTA and FASTQ input and output.
+
+The readers memory map the file and yield one Record at a time, so memory
+does not grow with the size of the file. A sequence written on a single
+line (and every FASTQ sequence and quality) is an EncodedSequence view of
+the mapped file, nothing is copied. Only the sequences wrapped over several
+lines are copied, to drop their line breaks.
+
+The records plug directly into the aligners:
+
+    hits = search(query, (record.sequence for record in read_fasta(path)),
+                  10, -5, -5)
+
+The mapping stays alive as long as one of its views does. The writers
+stream records to a file the same way, aligned FASTA being the usual file
+format of a multiple alignment.
+"""
+
+import mmap
+import os
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional, Union
+
+import numpy as np
+
+from Encoded_sequence import EncodedSequence, SequenceLike
+
+Destination = Union[str, "os.PathLike[str]", BinaryIO]
+
+LINE_WIDTH = 60
+
+
+class Record(NamedTuple):
+    """A named sequence, with its qualities for a FASTQ record."""
+
+    name: str
+    sequence: SequenceLike
+    quality: Optional[SequenceLike] = None
+
+
+def _map(path: Union[str, "os.PathLike[str]"]) -> Optional[mmap.mmap]:
+    """Map a file read only, None for an empty file."""
+    with open(path, "rb") as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            return None
+        # the mapping stays valid once the file is closed
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _line_end(data: mmap.mmap, start: int, stop: int) -> int:
+    """Return the end of the line at start, without its line break."""
+    end = data.find(b"\n", start, stop)
+    if end == -1:
+        end = stop
+    if end > start and data[end - 1] == ord("\r"):
+        end -= 1
+    return end
+
+
+def _next_line(data: mmap.mmap, start: int, stop: int) -> int:
+    """Return the start of the line after the one at start."""
+    end = data.find(b"\n", start, stop)
+    return stop if end == -1 else end + 1
+
+
+def _view(data: mmap.mmap, start: int, stop: int) -> EncodedSequence:
+    """Return the bytes start to stop of data without copying them."""
+    return EncodedSequence.from_codes(
+        np.frombuffer(data, dtype=np.uint8, count=stop - start, offset=start)
+    )
+
+
+def read_fasta(path: Union[str, "os.PathLike[str]"]) -> Iterator[Record]:
+    """Yield the records of a FASTA file.
+
+    The name is the header line without its ">". Blank lines and line
+    breaks inside a sequence are dropped.
+    """
+    data = _map(path)
+    if data is None:
+        return
+    size = len(data)
+    start = 0
+    # skip anything before the first header
+    while start < size and data[start] != ord(">"):
+        start = _next_line(data, start, size)
+    while start < size:
+        header_end = _line_end(data, start, size)
+        name = data[slice(start + 1, header_end)].decode().strip()
+        body = _next_line(data, start, size)
+        stop = data.find(b"\n>", body - 1)
+        stop = size if stop == -1 else stop + 1
+        end = stop
+        while end > body and data[end - 1] in b"\r\n":
+            end -= 1
+        if data.find(b"\n", body, end) == -1:
+            sequence = _view(data, body, end)
+        else:
+            codes = _view(data, body, end).codes
+            sequence = EncodedSequence.from_codes(
+                codes[(codes != ord("\n")) & (codes != ord("\r"))]
+            )
+        yield Record(name, sequence)
+        start = stop
+
+
+def read_fastq(path: Union[str, "os.PathLike[str]"]) -> Iterator[Record]:
+    """Yield the records of a FASTQ file.
+
+    Every record is four lines: "@" and the name, the sequence, "+" and
+    the quality letters, one per letter of the sequence.
+    """
+    data = _map(path)
+    if data is None:
+        return
+    size = len(data)
+    start = 0
+    while start < size:
+        if data[start] in b"\r\n":
+            start = _next_line(data, start, size)
+            continue
+        if data[start] != ord("@"):
+            raise ValueError(f"expected a FASTQ record at byte {start}")
+        header = slice(start + 1, _line_end(data, start, size))
+        name = data[header].decode().strip()
+        sequence_start = _next_line(data, start, size)
+        sequence_end = _line_end(data, sequence_start, size)
+        plus = _next_line(data, sequence_start, size)
+        if plus >= size or data[plus] != ord("+"):
+            raise ValueError(f"expected a '+' line at byte {plus}")
+        quality_start = _next_line(data, plus, size)
+        quality_end = _line_end(data, quality_start, size)
+        if quality_end - quality_start != sequence_end - sequence_start:
+            raise ValueError(
+                f"sequence and quality of {name!r} differ in length"
+            )
+        yield Record(
+            name,
+            _view(data, sequence_start, sequence_end),
+            _view(data, quality_start, quality_end),
+        )
+        start = _next_line(data, quality_start, size)
+
+
+def read_sequences(path: Union[str, "os.PathLike[str]"]) -> Iterator[Record]:
+    """Yield the records of a FASTA or a FASTQ file.
+
+    The format is told by the first letter of the file.
+    """
+    with open(path, "rb") as handle:
+        first = handle.read(1)
+    if first == b"@":
+        return read_fastq(path)
+    return read_fasta(path)
+
+
+def _as_bytes(sequence: SequenceLike) -> bytes:
+    """Return the letters of a sequence as bytes."""
+    if isinstance(sequence, str):
+        return sequence.encode()
+    return bytes(sequence)
+
+
+def _write(destination: Destination, chunks: Iterator[bytes]) -> None:
+    """Write chunks to a path or to an open binary file."""
+    if isinstance(destination, (str, os.PathLike)):
+        with open(destination, "wb") as handle:
+            handle.writelines(chunks)
+    else:
+        destination.writelines(chunks)
+
+
+def write_fasta(
+    destination: Destination,
+    records: Iterable[Record],
+    line_width: int = LINE_WIDTH,
+) -> None:
+    """Write records as FASTA, one record at a time.
+
+    Sequences are wrapped every line_width letters, never if line_width is
+    0. destination is a path or a file opened in binary mode.
+    """
+
+    def chunks() -> Iterator[bytes]:
+        for record in records:
+            yield b">" + record.name.encode() + b"\n"
+            letters = _as_bytes(record.sequence)
+            width = line_width if line_width > 0 else max(len(letters), 1)
+            for start in range(0, len(letters), width):
+                yield letters[slice(start, start + width)] + b"\n"
+
+    _write(destination, chunks())
+
+
+def write_fastq(destination: Destination, records: Iterable[Record]) -> None:
+    """Write records, which must have qualities, as FASTQ."""
+
+    def chunks() -> Iterator[bytes]:
+        for record in records:
+            if record.quality is None:
+                raise ValueError(f"record {record.name!r} has no quality")
+            yield b"@" + record.name.encode() + b"\n"
+            yield _as_bytes(record.sequence) + b"\n+\n"
+            yield _as_bytes(record.quality) + b"\n"
+
+    _write(destination, chunks())
@@ -4,18 +4,94 @@ This is a python implementation of the Smith-Waterman algorithm.
 The Smith-Waterman algorithm is a dynamic programming algorithm for
 finding regions of similarity between two strings. It is used in
 bioinformatics to find regions of local similarity between sequences.
+
+smith_waterman_hits reports the best local alignments that share no cell
+of the matrix, Waterman-Eggert style, from a single fill: after each hit
+only the cells below and to the right of it that change are computed
+again.
 """
 
 import numpy as np
-from typing import Union, Tuple
+import numpy.typing as npt
+from typing import Optional, Tuple
+from Alignment import Alignment
+from Alignment_cache import AlignmentCache
+from Encoded_sequence import SequenceLike
+from Instrumentation import phase
+from Substitution_matrix import SubstitutionMatrix
+from Wavefront import (
+    DIAGONAL,
+    HORIZONTAL,
+    HORIZONTAL_EXTENDS,
+    NEG,
+    STOP,
+    VERTICAL,
+    VERTICAL_EXTENDS,
+    Codes,
+    alignment_strings,
+    encode,
+    fill,
+    sequence_substitution,
+    substitution_scores,
+    traceback,
+)
+
+
+def _symbol_and_identity(align1: str, align2: str) -> Tuple[str, int]:
+    """Return the symbol string and the percent identity of an alignment."""
+    symbol = "".join(
+        x if x == y else " " for x, y in zip(align1, align2)
+    )  # O(n)
+    identity = sum(x == y for x, y in zip(align1, align2))  # O(n)
+    if not align1:
+        # no local similarity at all, the alignment is empty
+        return symbol, 0
+    return symbol, int(float(identity) / len(align1) * 100)  # O(1)
+
+
+def _local_moves(
+    codes_1: Codes,
+    codes_2: Codes,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    gap_extend: int,
+    matrix: Optional[SubstitutionMatrix],
+) -> Tuple[int, int, int, npt.NDArray[np.uint8]]:
+    """Return the score, the start and the moves of the local alignment."""
+    length_1 = len(codes_1)
+    length_2 = len(codes_2)
+    # ties prefer the diagonal, then the horizontal move (j - 1), then the
+    # vertical move (i - 1), and the alignment ends on the last cell (row by
+    # row) with the best score
+    cells = length_1 * length_2
+    matrix_bytes = (length_1 + 1) * (length_2 + 1)
+    with phase("smith_waterman.fill", cells, matrix_bytes):
+        max_score, max_i, max_j, trace = fill(
+            sequence_substitution(
+                codes_1, codes_2, match_score, mismatch_score, matrix
+            ),
+            length_1,
+            length_2,
+            gap_penalty,
+            gap_extend,
+            local=True,
+            horizontal_first=True,
+        )  # O(m*n)
+    with phase("smith_waterman.traceback"):
+        start_i, start_j, moves = traceback(trace, max_i, max_j)  # O(m+n)
+    return max_score, start_i, start_j, moves
 
 
 def smith_waterman(
-    seq1: str,
-    seq2: str,
+    seq1: SequenceLike,
+    seq2: SequenceLike,
     match_score: int,
     mismatch_score: int,
     gap_penalty: int,
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
+    cache: Optional[AlignmentCache] = None,
 ) -> Tuple[int, int, str, str, str]:
     """Smith Waterman algorithm to find the local alignment of two sequences.
 
@@ -23,98 +99,511 @@ def smith_waterman(
         best local alignment of two sequences.
     The length of sequence a is m.
     The length of sequence b is n.
-    It has a time complexity of O(m*n) for Traceback using a nexted 'for' loop.
-    and space complexity of O(m*n) for construct a m*n scoring matrix and\
-          a traceback matrix.
-    So the overall time complexity is O(N^2).
+    The matrix is filled by the vectorized Wavefront engine in O(m*n) time,
+    with one byte of traceback per cell instead of a float64 pointer matrix.
+    The traceback and the aligned strings are O(m+n).
+
+    gap_extend turns on affine gaps: a gap of length L costs gap_penalty +
+    (L - 1) * gap_extend. The sequences can be strings or EncodedSequence
+    and matrix, a SubstitutionMatrix, replaces match_score and
+    mismatch_score. cache, an AlignmentCache, returns the stored result of
+    a pair already aligned with the same parameters.
+    """
+    if cache is not None:
+        return cache.cached(
+            "smith_waterman",
+            seq1,
+            seq2,
+            (match_score, mismatch_score, gap_penalty, gap_extend, matrix),
+            lambda: smith_waterman(
+                seq1,
+                seq2,
+                match_score,
+                mismatch_score,
+                gap_penalty,
+                gap_extend,
+                matrix,
+            ),
+        )
+    # the sequences are encoded once for the whole run
+    codes_1 = encode(seq1)  # O(m)
+    codes_2 = encode(seq2)  # O(n)
+
+    if gap_extend is None:
+        gap_extend = gap_penalty  # O(1)
+    elif gap_extend < gap_penalty:
+        raise ValueError("gap_extend must not be lower than gap_penalty")
+    max_score, start_i, start_j, moves = _local_moves(
+        codes_1,
+        codes_2,
+        match_score,
+        mismatch_score,
+        gap_penalty,
+        gap_extend,
+        matrix,
+    )  # O(m*n)
+    with phase("smith_waterman.strings"):
+        align1, _, align2 = alignment_strings(
+            moves, codes_1, codes_2, start_i, start_j
+        )  # O(m+n)
+    symbol, identity = _symbol_and_identity(align1, align2)  # O(m+n)
+    return identity, max_score, align1, symbol, align2  # O(1)
+
+
+def smith_waterman_alignment(
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    *,
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
+    cache: Optional[AlignmentCache] = None,
+) -> Alignment:
+    """Return the smith_waterman alignment as a compact Alignment.
+
+    The parameters are those of smith_waterman and so is the alignment,
+    but only where it starts and ends and its runs of moves are kept.
+    Alignment.identity and Alignment.symbol give the identity and the
+    symbol string of smith_waterman.
     """
-    length_1 = len(seq1)  # O(1)
-    length_2 = len(seq2)  # O(1)
-    max_score = 0  # O(1)
-
-    # Inside function to calculate score
-    def cal_score(x: Union[int, str], y: Union[int, str]) -> int:
-        if x == y:  # O(1)
-            return match_score  # O(1)
-        elif x == "-" or y == "-":  # O(1)
-            return gap_penalty  # O(1)
-        else:  # O(1)
-            return mismatch_score  # O(1)
-
-    # Initialize the scoring matrix
-    scoring_matrix = np.zeros((length_1 + 1, length_2 + 1))  # O(1)
-
-    # Initialize the traceback matrix
-    Track_back_pointer = np.zeros((length_1 + 1, length_2 + 1))  # O(1)
-
-    for i in range(1, length_1 + 1):  # O(n)
-        for j in range(1, length_2 + 1):  # O(n)
-            score_diagonal = scoring_matrix[i - 1][j - 1] + cal_score(
-                seq1[i - 1], seq2[j - 1]
-            )  # O(1)
-            score_up = scoring_matrix[i][j - 1] + gap_penalty  # O(1)
-            score_left = scoring_matrix[i - 1][j] + gap_penalty  # O(1)
-            scoring_matrix[i][j] = max(
-                0, score_left, score_up, score_diagonal
-            )  # O(1)
-            if scoring_matrix[i][j] == 0:  # O(1)
-                Track_back_pointer[i][j] = 0  # O(1)
-            if scoring_matrix[i][j] == score_left:  # O(1)
-                Track_back_pointer[i][j] = 1  # O(1)
-            if scoring_matrix[i][j] == score_up:  # O(1)
-                Track_back_pointer[i][j] = 2  # O(1)
-            if scoring_matrix[i][j] == score_diagonal:  # O(1)
-                Track_back_pointer[i][j] = 3  # O(1)
-            if scoring_matrix[i][j] >= max_score:  # O(1)
-                max_i = i  # O(1)
-                max_j = j  # O(1)
-                max_score = scoring_matrix[i][j]  # O(1)
-
-    # Initialization:
-    align1, align2 = "", ""  # O(1)
-
-    i, j = max_i, max_j  # O(1)
-
-    while Track_back_pointer[i][j] != 0:  # O(n)
-        if Track_back_pointer[i][j] == 3:  # O(1)
-            align1 += seq1[i - 1]  # O(1)
-            align2 += seq2[j - 1]  # O(1)
-            i -= 1  # O(1)
-            j -= 1  # O(1)
-        elif Track_back_pointer[i][j] == 2:  # O(1)
-            align1 += "-"  # O(1)
-            align2 += seq2[j - 1]  # O(1)
-            j -= 1  # O(1)
-        elif Track_back_pointer[i][j] == 1:  # O(1)
-            align1 += seq1[i - 1]  # O(1)
-            align2 += "-"  # O(1)
-            i -= 1  # O(1)
-
-    # Reverse the sequences
-    align1, align2 = align1[::-1], align2[::-1]  # O(n)
-    i, j = 0, 0  # O(1)
-
-    symbol = ""  # O(1)
-    initial_s = 0  # O(1)
-    score = 0  # O(1)
-    identity = 0.0  # O(1)
-    for i in range(0, len(align1)):  # O(n)
-        if align1[i] == align2[i]:  # O(1)
-            symbol = symbol + align1[i]  # O(1)
-            identity = identity + 1  # O(1)
-            score += cal_score(align1[i], align2[i])  # O(1)
-
-        elif (
-            align1[i] != align2[i] and align1[i] != "-" and align2[i] != "-"
-        ):  # O(1)
-            score += cal_score(align1[i], align2[i])  # O(1)
-            symbol += " "  # O(1)
-            initial_s = 0  # O(1)
-
-        elif align1[i] == "-" or align2[i] == "-":  # O(1)
-            symbol += " "  # O(1)
-            score += gap_penalty  # O(1)
-
-    identity = float(identity) / len(align1) * 100  # O(1)
-
-    return int(identity), score, align1, symbol, align2  # O(1)
+    if gap_extend is None:
+        gap_extend = gap_penalty
+    elif gap_extend < gap_penalty:
+        raise ValueError("gap_extend must not be lower than gap_penalty")
+    if cache is not None:
+        return cache.cached(
+            "smith_waterman_alignment",
+            seq1,
+            seq2,
+            (match_score, mismatch_score, gap_penalty, gap_extend, matrix),
+            lambda: smith_waterman_alignment(
+                seq1,
+                seq2,
+                match_score,
+                mismatch_score,
+                gap_penalty,
+                gap_extend=gap_extend,
+                matrix=matrix,
+            ),
+        )
+    score, start_i, start_j, moves = _local_moves(
+        encode(seq1),
+        encode(seq2),
+        match_score,
+        mismatch_score,
+        gap_penalty,
+        gap_extend,
+        matrix,
+    )
+    return Alignment.from_moves(score, moves, seq1, seq2, start_i, start_j)
+
+
+def _banded_fill(
+    codes_1: Codes,
+    codes_2: Codes,
+    lowest: int,
+    highest: int,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    gap_extend: int,
+    matrix: Optional[SubstitutionMatrix],
+) -> Tuple[int, int, int, npt.NDArray[np.uint8]]:
+    """Fill the local alignment matrix within the diagonals of a band.
+
+    Only the cells (i, j) with lowest <= j - i <= highest are computed, so
+    time and memory are O(len(codes_1) * (highest - lowest)). The band is
+    stored row by row, the cell (i, j) at column j - i - lowest: the
+    diagonal move is the same column of the previous row, the vertical
+    move the next one and the horizontal move the previous column of the
+    row. Return the score, the end and the traceback as fill(local=True,
+    horizontal_first=True) does, with the same ties, the traceback for
+    traceback(trace, end_i, end_j, lowest).
+    """
+    rows = len(codes_1)
+    cols = len(codes_2)
+    width = highest - lowest + 1
+    trace = np.full((rows + 1, width), STOP, dtype=np.uint8)
+    columns = np.arange(width, dtype=np.int64)
+    steps = columns * gap_extend
+    # row 0: every cell of the matrix starts at 0
+    j = lowest + columns
+    h_row = np.where((j >= 0) & (j <= cols), 0, NEG).astype(np.int64)
+    f_row = np.full(width, NEG, dtype=np.int64)
+    # the letters of the cells out of the matrix are not used
+    letters_2 = codes_2 if cols else np.zeros(1, dtype=codes_2.dtype)
+    best = (-1, 0, 0)
+    for i in range(1, rows + 1):
+        j = i + lowest + columns
+        inside = (j >= 1) & (j <= cols)
+        first_column = j == 0
+        letters = letters_2[np.clip(j - 1, 0, len(letters_2) - 1)]
+        diagonal = h_row + substitution_scores(
+            codes_1[i - 1], letters, match_score, mismatch_score, matrix
+        )
+        # the cell above is the next column of the previous row
+        opened = np.append(h_row[1:], NEG) + gap_penalty
+        extended = np.append(f_row[1:], NEG) + gap_extend
+        vertical = np.maximum(opened, extended)
+        vertical_extends = extended > opened
+        start = np.maximum(np.maximum(diagonal, vertical), 0)
+        start[first_column] = 0
+        start[~(inside | first_column)] = NEG
+
+        # the horizontal gaps, as in smith_waterman_score
+        running = np.maximum.accumulate(start - steps)
+        horizontal = np.full(width, NEG, dtype=np.int64)
+        horizontal[1:] = running[:-1] + steps[:-1] + gap_penalty
+        horizontal[~inside] = NEG
+        score = np.where(inside, np.maximum(start, horizontal), start)
+
+        left_h = np.concatenate([[NEG], score[:-1]])
+        left_e = np.concatenate([[NEG], horizontal[:-1]])
+        horizontal_extends = left_e + gap_extend > left_h + gap_penalty
+        # ties prefer the diagonal, then the horizontal move
+        source = np.where(score == vertical, VERTICAL, STOP)
+        source = np.where(score == horizontal, HORIZONTAL, source)
+        source = np.where(score == diagonal, DIAGONAL, source)
+        codes = (
+            source
+            | (vertical_extends * VERTICAL_EXTENDS)
+            | (horizontal_extends * HORIZONTAL_EXTENDS)
+        ).astype(np.uint8)
+        codes[~inside] = STOP
+        trace[i] = codes
+        vertical[~inside] = NEG
+
+        if inside.any():
+            top = int(score[inside].max())
+            # last cell of the row with the top score
+            column = (
+                width - 1 - int(np.argmax((score == top)[::-1] & inside[::-1]))
+            )
+            if (top, i, i + lowest + column) > best:
+                best = (top, i, i + lowest + column)
+        h_row, f_row = score, vertical
+    if best[0] < 0:
+        # no cell inside the matrix, end on the first row or column
+        edge = min(max(0, lowest), highest)
+        return 0, max(0, -edge), max(0, edge), trace
+    return best[0], best[1], best[2], trace
+
+
+def smith_waterman_banded(
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    lowest: int,
+    highest: int,
+    *,
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
+) -> Alignment:
+    """Return the best local alignment within a band of diagonals.
+
+    Only the cells (i, j) with lowest <= j - i <= highest are filled, and
+    the alignment does not leave them. With a band holding every cell,
+    -len(seq1) to len(seq2), it is the smith_waterman_alignment. The other
+    parameters are as in smith_waterman.
+    """
+    if gap_extend is None:
+        gap_extend = gap_penalty
+    elif gap_extend < gap_penalty:
+        raise ValueError("gap_extend must not be lower than gap_penalty")
+    if highest < lowest:
+        raise ValueError("highest must not be lower than lowest")
+    codes_1 = encode(seq1)
+    codes_2 = encode(seq2)
+    # the diagonals of the matrix run from -len(seq1) to len(seq2)
+    lowest = max(lowest, -len(codes_1))
+    highest = min(highest, len(codes_2))
+    if highest < lowest:
+        return Alignment.from_moves(0, np.zeros(0, np.uint8), seq1, seq2)
+    cells = len(codes_1) * (highest - lowest + 1)
+    with phase("smith_waterman.fill", cells, cells):
+        score, end_i, end_j, trace = _banded_fill(
+            codes_1,
+            codes_2,
+            lowest,
+            highest,
+            match_score,
+            mismatch_score,
+            gap_penalty,
+            gap_extend,
+            matrix,
+        )
+    with phase("smith_waterman.traceback"):
+        start_i, start_j, moves = traceback(trace, end_i, end_j, lowest)
+    return Alignment.from_moves(score, moves, seq1, seq2, start_i, start_j)
+
+
+class _LocalMatrices:
+    """The H, E and F matrices and the traceback of a local alignment.
+
+    They are filled row by row, with the same scores and the same
+    traceback as the Wavefront engine, and cells can be removed: a removed
+    cell scores 0 and no gap goes through it.
+    """
+
+    def __init__(
+        self,
+        codes1: Codes,
+        codes2: Codes,
+        match_score: int,
+        mismatch_score: int,
+        gap_penalty: int,
+        gap_extend: int,
+        matrix: Optional[SubstitutionMatrix],
+    ) -> None:
+        """Fill the matrices of codes1 against codes2."""
+        self.codes1 = codes1
+        self.codes2 = codes2
+        self.scoring = (match_score, mismatch_score, matrix)
+        self.gap_penalty = gap_penalty
+        self.gap_extend = gap_extend
+        shape = (len(codes1) + 1, len(codes2) + 1)
+        self.h = np.zeros(shape, dtype=np.int64)
+        self.e = np.full(shape, NEG, dtype=np.int64)
+        self.f = np.full(shape, NEG, dtype=np.int64)
+        self.trace = np.full(shape, STOP, dtype=np.uint8)
+        self.removed = np.zeros(shape, dtype=bool)
+        # best score of every row
+        self.top = np.zeros(len(codes1) + 1, dtype=np.int64)
+        for i in range(1, len(codes1) + 1):
+            self._fill_row(i, 0)
+
+    def _fill_row(self, i: int, first: int) -> int:
+        """Compute the cells (i, j) for j > first.
+
+        Return the first column that changed, or -1 if none did.
+        """
+        match_score, mismatch_score, matrix = self.scoring
+        columns = slice(first + 1, None)
+        above = self.h[i - 1]
+        diagonal = above[slice(first, -1)] + substitution_scores(
+            self.codes1[i - 1],
+            self.codes2[slice(first, None)],
+            match_score,
+            mismatch_score,
+            matrix,
+        )
+        opened = above[columns] + self.gap_penalty
+        extended = self.f[i - 1, columns] + self.gap_extend
+        vertical = np.maximum(opened, extended)
+        vertical_extends = extended > opened
+        removed = self.removed[i, columns]
+        vertical[removed] = NEG
+        best = np.maximum(np.maximum(diagonal, vertical), 0)
+        best[removed] = 0
+
+        # the horizontal gaps: E[j] is the best, over k < j, of
+        # G[k] + gap_penalty + (j - 1 - k) * gap_extend where G is the best
+        # of 0, diagonal and vertical, and (i, first) carries on the gap
+        # that reaches it
+        h_first = int(self.h[i, first])
+        e_first = int(self.e[i, first])
+        opening = self.gap_penalty - self.gap_extend
+        start = max(h_first, e_first - opening)
+        steps = np.arange(len(best) + 1, dtype=np.int64) * self.gap_extend
+        values = np.concatenate([[start], best]) - steps
+        if removed.any():
+            # a gap does not go through a removed cell: shift every run
+            # between two removed cells above all the runs before it
+            runs = np.concatenate([[0], np.cumsum(removed)])
+            shift = int(values.max()) - int(values.min()) + 1
+            running = np.maximum.accumulate(values + runs * shift)
+            running -= runs * shift
+        else:
+            running = np.maximum.accumulate(values)
+        horizontal = running[:-1] + steps[:-1] + self.gap_penalty
+        horizontal[removed] = NEG
+        score = np.maximum(best, horizontal)
+
+        left_h = np.concatenate([[h_first], score[:-1]])
+        left_e = np.concatenate([[e_first], horizontal[:-1]])
+        horizontal_extends = (
+            left_e + self.gap_extend > left_h + self.gap_penalty
+        )
+        # ties prefer the diagonal, then the horizontal move, as in
+        # smith_waterman
+        source = np.where(score == vertical, VERTICAL, STOP)
+        source = np.where(score == horizontal, HORIZONTAL, source)
+        source = np.where(score == diagonal, DIAGONAL, source)
+        codes = (
+            source
+            | (vertical_extends * VERTICAL_EXTENDS)
+            | (horizontal_extends * HORIZONTAL_EXTENDS)
+        ).astype(np.uint8)
+        codes[removed] = STOP
+
+        changed = np.flatnonzero(
+            (score != self.h[i, columns]) | (vertical != self.f[i, columns])
+        )
+        self.h[i, columns] = score
+        self.e[i, columns] = horizontal
+        self.f[i, columns] = vertical
+        self.trace[i, columns] = codes
+        self.top[i] = self.h[i].max()
+        return first + 1 + int(changed[0]) if len(changed) else -1
+
+    def best(self) -> Tuple[int, int, int]:
+        """Return the best score and its last cell, row by row."""
+        score = int(self.top.max())
+        i = len(self.top) - 1 - int(np.argmax(self.top[::-1] == score))
+        row = self.h[i]
+        j = len(row) - 1 - int(np.argmax(row[::-1] == score))
+        return score, i, j
+
+    def remove(
+        self, start_i: int, start_j: int, moves: npt.NDArray[np.uint8]
+    ) -> None:
+        """Remove the cells of an alignment and update the cells after it.
+
+        A cell only changes if it is removed, or if the cell above it, on
+        its left or on its upper left diagonal changed, so a row is
+        computed from the first column that can change and the update
+        stops on the first row where none can.
+        """
+        rows = start_i + np.cumsum(moves != HORIZONTAL)
+        cols = start_j + np.cumsum(moves != VERTICAL)
+        self.removed[rows, cols] = True
+        # first removed column of every row
+        first_removed = {}
+        for row, col in zip(rows.tolist()[::-1], cols.tolist()[::-1]):
+            first_removed[row] = col
+        changed = -1
+        for i in range(start_i + 1, len(self.codes1) + 1):
+            starts = [
+                col for col in (changed, first_removed.get(i, -1)) if col >= 0
+            ]
+            if not starts:
+                break
+            first = min(starts)
+            changed = self._fill_row(i, first - 1)
+
+
+def smith_waterman_hits(
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    *,
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
+    count: int = 10,
+    min_score: int = 1,
+) -> list[Alignment]:
+    """Return the best count local alignments that share no cell.
+
+    The first hit is the smith_waterman alignment. Every next one is the
+    best local alignment that goes through none of the cells (i, j) of the
+    hits before it, Waterman-Eggert style, so two hits never align the same
+    pair of letters, but a repeat can be aligned with each of its copies.
+    Hits scoring less than min_score are not reported.
+
+    The matrix is filled once, then each hit only computes again the
+    cells that can change: the rows from its first row, each from its
+    first column that can change, up to the first row where none does.
+    The scores and the traceback are kept for every cell, about 26 bytes a
+    cell. The other parameters are as in smith_waterman.
+    """
+    if gap_extend is None:
+        gap_extend = gap_penalty
+    elif gap_extend < gap_penalty:
+        raise ValueError("gap_extend must not be lower than gap_penalty")
+    codes1 = encode(seq1)
+    codes2 = encode(seq2)
+    cells = len(codes1) * len(codes2)
+    with phase("smith_waterman.fill", cells, 26 * cells):
+        matrices = _LocalMatrices(
+            codes1,
+            codes2,
+            match_score,
+            mismatch_score,
+            gap_penalty,
+            gap_extend,
+            matrix,
+        )
+    hits: list[Alignment] = []
+    while len(hits) < count:
+        score, end_i, end_j = matrices.best()
+        if score < max(min_score, 1):
+            break
+        with phase("smith_waterman.traceback"):
+            start_i, start_j, moves = traceback(matrices.trace, end_i, end_j)
+        hits.append(
+            Alignment.from_moves(score, moves, seq1, seq2, start_i, start_j)
+        )
+        if len(hits) < count:
+            with phase("smith_waterman.refill"):
+                matrices.remove(start_i, start_j, moves)
+    return hits
+
+
+def smith_waterman_score(
+    seq1: SequenceLike,
+    seq2: SequenceLike,
+    match_score: int,
+    mismatch_score: int,
+    gap_penalty: int,
+    gap_extend: Optional[int] = None,
+    matrix: Optional[SubstitutionMatrix] = None,
+) -> Tuple[int, int, int]:
+    """Return the best local score and where the best local alignment ends.
+
+    The output is (score, end_1, end_2): the alignment found by
+    smith_waterman ends with seq1[end_1 - 1] and seq2[end_2 - 1].
+
+    Only two rows of the scoring matrix are kept and there is no traceback,
+    so memory is O(m) and no strings are built. Each row is computed with
+    vectorized numpy operations: the diagonal and vertical moves come from
+    the previous row and the horizontal gaps are a running maximum:
+    E[j] = max over k < j of (G[k] + gap_penalty + (j - k - 1) * gap_extend)
+    where G is the best of 0, diagonal and vertical. gap_extend and matrix
+    are as in smith_waterman.
+    """
+    if gap_extend is None:
+        gap_extend = gap_penalty
+    codes1 = encode(seq1)
+    codes2 = encode(seq2)
+    length_2 = len(codes2)
+    opening = gap_penalty - gap_extend
+
+    steps = np.arange(length_2 + 1, dtype=np.int64) * gap_extend
+    row = np.zeros(length_2 + 1, dtype=np.int64)
+    current = np.zeros(length_2 + 1, dtype=np.int64)
+    vertical = np.full(length_2 + 1, NEG, dtype=np.int64)
+    max_score, max_i, max_j = 0, 0, 0
+
+    with phase("smith_waterman_score", len(codes1) * length_2):
+        for i in range(1, len(codes1) + 1):
+            substitution = substitution_scores(
+                codes1[i - 1], codes2, match_score, mismatch_score, matrix
+            )
+            np.maximum(vertical + gap_extend, row + gap_penalty, out=vertical)
+            np.maximum(row[:-1] + substitution, vertical[1:], out=current[1:])
+            np.maximum(current, 0, out=current)
+            # the horizontal gaps
+            running = np.maximum.accumulate(current - steps)
+            np.maximum(
+                current[1:],
+                running[:-1] + steps[1:] + opening,
+                out=current[1:],
+            )
+            if length_2 > 0:
+                # like smith_waterman keep the last cell (row by row) that
+                # reaches the best score
+                row_max = int(current[1:].max())
+                if row_max >= max_score:
+                    max_score = row_max
+                    max_i = i
+                    max_j = length_2 - int(
+                        np.argmax(current[:0:-1] == row_max)
+                    )
+            row, current = current, row
+    return max_score, max_i, max_j
@@ -0,0 +1,189 @@
+"""
+Substitution matrices (BLOSUM, PAM, custom DNA scores) for the aligners.
+
+A SubstitutionMatrix keeps a 256 x 256 table of scores indexed by the byte
+codes of two letters, so the scores of whole arrays of letters are looked
+up with a single indexing operation. Letters are case insensitive and
+letters missing from the matrix score its default.
+
+Matrices in the NCBI text format (the BLOSUM and PAM files distributed with
+BLAST) are read with SubstitutionMatrix.parse or SubstitutionMatrix.load.
+"""
+
+import numpy as np
+import numpy.typing as npt
+from typing import Any, Optional, Sequence, Union
+
+# codes past the table (letters outside latin-1) use its last row
+TABLE_SIZE = 256
+
+
+class SubstitutionMatrix:
+    """Scores of every pair of letters.
+
+    scores[k, l] is the score of letters[k] against letters[l].
+    """
+
+    __slots__ = ("letters", "scores", "default", "table")
+
+    def __init__(
+        self,
+        letters: str,
+        scores: Union[Sequence[Sequence[int]], npt.NDArray[np.int64]],
+        default: Optional[int] = None,
+    ) -> None:
+        """Build the lookup table, default is the lowest score if None."""
+        self.letters = letters
+        self.scores = np.array(scores, dtype=np.int64)
+        if self.scores.shape != (len(letters), len(letters)):
+            raise ValueError(
+                f"expected a {len(letters)} x {len(letters)} score matrix"
+            )
+        if len(set(letters)) != len(letters):
+            raise ValueError("letters of a substitution matrix must be unique")
+        if default is None:
+            default = int(self.scores.min()) if len(letters) else 0
+        self.default = default
+        self.table = np.full((TABLE_SIZE, TABLE_SIZE), default, np.int64)
+        codes = np.array([ord(letter) for letter in letters], dtype=np.intp)
+        if (codes >= TABLE_SIZE - 1).any():
+            raise ValueError("letters must be latin-1 characters")
+        cases = [
+            np.array([ord(case(letter)) for letter in letters], np.intp)
+            for case in (str.upper, str.lower)
+        ]
+        for rows in cases:
+            for columns in cases:
+                self.table[np.ix_(rows, columns)] = self.scores
+        # the exact letters win over their other case
+        self.table[np.ix_(codes, codes)] = self.scores
+
+    @classmethod
+    def parse(
+        cls, text: str, default: Optional[int] = None
+    ) -> "SubstitutionMatrix":
+        """Read a matrix in the NCBI format.
+
+        Lines starting with # are comments, the first other line lists the
+        letters of the columns and every following line is a letter
+        followed by its scores.
+        """
+        lines = [
+            line.split()
+            for line in text.splitlines()
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+        if not lines:
+            raise ValueError("empty substitution matrix")
+        columns = "".join(lines[0])
+        rows = "".join(line[0] for line in lines[1:])
+        if any(len(letter) != 1 for letter in lines[0]) or rows != columns:
+            raise ValueError("rows and columns must list the same letters")
+        try:
+            scores = [[int(score) for score in line[1:]] for line in lines[1:]]
+        except ValueError:
+            raise ValueError("substitution scores must be integers") from None
+        return cls(columns, scores, default)
+
+    @classmethod
+    def load(
+        cls, path: str, default: Optional[int] = None
+    ) -> "SubstitutionMatrix":
+        """Read a matrix file in the NCBI format."""
+        with open(path) as handle:
+            return cls.parse(handle.read(), default)
+
+    @classmethod
+    def dna(
+        cls,
+        match_score: int,
+        mismatch_score: int,
+        transition_score: Optional[int] = None,
+    ) -> "SubstitutionMatrix":
+        """Return an ACGT matrix, U is scored as T.
+
+        transition_score, if given, scores the transitions (A <-> G and
+        C <-> T) which are more frequent than the other mismatches. Other
+        letters (N, ...) score mismatch_score.
+        """
+        letters = "ACGTU"
+        purines = "AG"
+        scores = [
+            [
+                (
+                    match_score
+                    if a == b or {a, b} == {"T", "U"}
+                    else (
+                        transition_score
+                        if transition_score is not None
+                        and (a in purines) == (b in purines)
+                        else mismatch_score
+                    )
+                )
+                for b in letters
+            ]
+            for a in letters
+        ]
+        return cls(letters, scores, mismatch_score)
+
+    def transposed(self) -> "SubstitutionMatrix":
+        """Return the matrix scoring letter2 against letter1."""
+        return SubstitutionMatrix(self.letters, self.scores.T, self.default)
+
+    def score(self, letter1: str, letter2: str) -> int:
+        """Return the score of two letters."""
+        return int(self.lookup(np.array([ord(letter1)]), ord(letter2))[0])
+
+    def lookup(
+        self, codes1: npt.NDArray[Any], codes2: Any
+    ) -> npt.NDArray[np.int64]:
+        """Return the scores of the letters codes1 against codes2.
+
+        codes1 and codes2 are arrays (or a scalar) of letter codes, they
+        are broadcast against each other.
+        """
+        codes1 = np.minimum(codes1, TABLE_SIZE - 1)
+        codes2 = np.minimum(codes2, TABLE_SIZE - 1)
+        scores: npt.NDArray[np.int64] = self.table[codes1, codes2]
+        return scores
+
+    @property
+    def lowest(self) -> int:
+        """Return the lowest score of the table."""
+        return int(self.table.min())
+
+    @property
+    def highest(self) -> int:
+        """Return the highest score of the table."""
+        return int(self.table.max())
+
+
+_BLOSUM62 = """
+   A  R  N  D  C  Q  E  G  H  I  L  K  M  F  P  S  T  W  Y  V  B  Z  X  *
+A  4 -1 -2 -2  0 -1 -1  0 -2 -1 -1 -1 -1 -2 -1  1  0 -3 -2  0 -2 -1  0 -4
+R -1  5  0 -2 -3  1  0 -2  0 -3 -2  2 -1 -3 -2 -1 -1 -3 -2 -3 -1  0 -1 -4
+N -2  0  6  1 -3  0  0  0  1 -3 -3  0 -2 -3 -2  1  0 -4 -2 -3  3  0 -1 -4
+D -2 -2  1  6 -3  0  2 -1 -1 -3 -4 -1 -3 -3 -1  0 -1 -4 -3 -3  4  1 -1 -4
+C  0 -3 -3 -3  9 -3 -4 -3 -3 -1 -1 -3 -1 -2 -3 -1 -1 -2 -2 -1 -3 -3 -2 -4
+Q -1  1  0  0 -3  5  2 -2  0 -3 -2  1  0 -3 -1  0 -1 -2 -1 -2  0  3 -1 -4
+E -1  0  0  2 -4  2  5 -2  0 -3 -3  1 -2 -3 -1  0 -1 -3 -2 -2  1  4 -1 -4
+G  0 -2  0 -1 -3 -2 -2  6 -2 -4 -4 -2 -3 -3 -2  0 -2 -2 -3 -3 -1 -2 -1 -4
+H -2  0  1 -1 -3  0  0 -2  8 -3 -3 -1 -2 -1 -2 -1 -2 -2  2 -3  0  0 -1 -4
+I -1 -3 -3 -3 -1 -3 -3 -4 -3  4  2 -3  1  0 -3 -2 -1 -3 -1  3 -3 -3 -1 -4
+L -1 -2 -3 -4 -1 -2 -3 -4 -3  2  4 -2  2  0 -3 -2 -1 -2 -1  1 -4 -3 -1 -4
+K -1  2  0 -1 -3  1  1 -2 -1 -3 -2  5 -1 -3 -1  0 -1 -3 -2 -2  0  1 -1 -4
+M -1 -1 -2 -3 -1  0 -2 -3 -2  1  2 -1  5  0 -2 -1 -1 -1 -1  1 -3 -1 -1 -4
+F -2 -3 -3 -3 -2 -3 -3 -3 -1  0  0 -3  0  6 -4 -2 -2  1  3 -1 -3 -3 -1 -4
+P -1 -2 -2 -1 -3 -1 -1 -2 -2 -3 -3 -1 -2 -4  7 -1 -1 -4 -3 -2 -2 -1 -2 -4
+S  1 -1  1  0 -1  0  0  0 -1 -2 -2  0 -1 -2 -1  4  1 -3 -2 -2  0  0  0 -4
+T  0 -1  0 -1 -1 -1 -1 -2 -2 -1 -1 -1 -1 -2 -1  1  5 -2 -2  0 -1 -1  0 -4
+W -3 -3 -4 -4 -2 -2 -3 -2 -2 -3 -2 -3 -1  1 -4 -3 -2 11  2 -3 -4 -3 -2 -4
+Y -2 -2 -2 -3 -2 -1 -2 -3  2 -1 -1 -2 -1  3 -3 -2 -2  2  7 -1 -3 -2 -1 -4
+V  0 -3 -3 -3 -1 -2 -2 -3 -3  3  1 -2  1 -1 -2 -2  0 -3 -1  4 -3 -2 -1 -4
+B -2 -1  3  4 -3  0  1 -1  0 -3 -4  0 -3 -3 -2  0 -1 -4 -3 -3  4  1 -1 -4
+Z -1  0  0  1 -3  3  4 -2  0 -3 -3  1 -1 -3 -1  0 -1 -3 -2 -2  1  4 -1 -4
+X  0 -1 -1 -1 -2 -1 -1 -1 -1 -1 -1 -1 -1 -1 -2  0  0 -2 -1 -1 -1 -1 -1 -4
+* -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4 -4  1
+"""
+
+BLOSUM62 = SubstitutionMatrix.parse(_BLOSUM62)
@@ -0,0 +1,514 @@
+"""
+Anti-diagonal dynamic programming engine with affine gaps.
+
+All the cells on the anti-diagonal i + j = k only depend on the two
+previous anti-diagonals, so a whole anti-diagonal is computed with a handful
+of vectorized numpy operations. Gaps are scored with Gotoh's three states:
+H (best score of a cell), E (best score ending with a horizontal gap, a gap
+in seq1) and F (best score ending with a vertical gap, a gap in seq2). A gap
+of length L costs gap_open + (L - 1) * gap_extend, so gap_extend equal to
+gap_open is the usual linear gap penalty.
+
+Only three anti-diagonals of scores are kept. The traceback is one uint8
+per cell:
+bits 0-1: where H comes from (DIAGONAL, VERTICAL, HORIZONTAL or STOP)
+bit 2: F extends the vertical gap of the cell above (else it opens one)
+bit 3: E extends the horizontal gap of the cell on the left
+
+fill_batch runs the same recurrence over a batch of padded pairs, so short
+pairs share the cost of every numpy operation.
+"""
+
+import numpy as np
+import numpy.typing as npt
+from typing import Any, Callable, Optional, Tuple, Union
+
+from Encoded_sequence import EncodedSequence
+from Substitution_matrix import SubstitutionMatrix
+
+DIAGONAL = 0
+VERTICAL = 1
+HORIZONTAL = 2
+STOP = 3
+SOURCE = 3
+VERTICAL_EXTENDS = 4
+HORIZONTAL_EXTENDS = 8
+
+# score of impossible states, far enough from the int64 limit to never wrap
+NEG = np.iinfo(np.int64).min // 4
+
+# substitution(k, start, stop) returns the substitution scores of the cells
+# (i, k - i) for start <= i <= stop
+Substitution = Callable[[int, int, int], npt.NDArray[np.int64]]
+
+# letter codes, uint32 code points of a string or the uint8 codes of an
+# EncodedSequence
+Codes = npt.NDArray[Any]
+Encodable = Union[str, EncodedSequence, Codes]
+
+
+def encode(seq: Encodable) -> Codes:
+    """Return the codes of a sequence for bulk comparison.
+
+    Strings are turned into code points, encoded sequences and arrays of
+    codes are returned as they are.
+    """
+    if isinstance(seq, str):
+        return np.frombuffer(seq.encode("utf-32-le"), dtype=np.uint32)
+    if isinstance(seq, EncodedSequence):
+        return seq.codes
+    return seq
+
+
+def substitution_scores(
+    codes1: Any,
+    codes2: Codes,
+    match_score: int,
+    mismatch_score: int,
+    matrix: Optional[SubstitutionMatrix] = None,
+) -> npt.NDArray[np.int64]:
+    """Return the scores of codes1 against codes2 (broadcast).
+
+    The scores come from matrix if given, else from match_score and
+    mismatch_score.
+    """
+    if matrix is not None:
+        return matrix.lookup(codes1, codes2)
+    scores: npt.NDArray[np.int64] = np.where(
+        codes1 == codes2, match_score, mismatch_score
+    )
+    return scores
+
+
+def sequence_substitution(
+    seq1: Encodable,
+    seq2: Encodable,
+    match_score: int,
+    mismatch_score: int,
+    matrix: Optional[SubstitutionMatrix] = None,
+) -> Substitution:
+    """Return the substitution scores of two sequences along anti-diagonals.
+
+    seq2 is reversed so the characters of an anti-diagonal are a slice.
+    """
+    codes1 = encode(seq1)
+    codes2_rev = encode(seq2)[::-1]
+    cols = len(codes2_rev)
+
+    def substitution(k: int, start: int, stop: int) -> npt.NDArray[np.int64]:
+        rows = slice(start - 1, stop)
+        columns = slice(cols - k + start, cols - k + stop + 1)
+        return substitution_scores(
+            codes1[rows],
+            codes2_rev[columns],
+            match_score,
+            mismatch_score,
+            matrix,
+        )
+
+    return substitution
+
+
+def matrix_substitution(scores: npt.NDArray[np.int64]) -> Substitution:
+    """Return the anti-diagonals of a precomputed substitution matrix.
+
+    scores[i - 1, j - 1] is the score of the cell (i, j).
+    """
+    cols = scores.shape[1]
+    flat = scores.reshape(-1)
+    step = max(cols - 1, 1)
+
+    def substitution(k: int, start: int, stop: int) -> npt.NDArray[np.int64]:
+        # scores[i - 1, k - i - 1] is at (i - 1) * (cols - 1) + k - 2
+        first = (start - 1) * (cols - 1) + k - 2
+        return flat[slice(first, first + (stop - start) * step + 1, step)]
+
+    return substitution
+
+
+def fill(
+    substitution: Substitution,
+    rows: int,
+    cols: int,
+    gap_open: int,
+    gap_extend: int,
+    local: bool = False,
+    horizontal_first: bool = False,
+) -> Tuple[int, int, int, npt.NDArray[np.uint8]]:
+    """Fill a (rows + 1) x (cols + 1) alignment matrix.
+
+    Ties are broken in favour of the diagonal, then of the vertical move
+    (of the horizontal move with horizontal_first), and a gap is opened
+    rather than extended when both score the same, which for linear gaps
+    is the same traceback as with a single score matrix.
+
+    For a global alignment return (score, rows, cols, traceback). For a
+    local alignment (cells never drop below 0) the end is the last cell, in
+    row by row order, that reaches the best score.
+    """
+    trace = np.empty((rows + 1, cols + 1), dtype=np.uint8)
+    flat = trace.reshape(-1)
+    # an empty seq2 has a single column, the writes then have step 1
+    step = max(cols, 1)
+
+    # anti-diagonals indexed by the row i
+    h_prev2 = np.full(rows + 1, NEG, dtype=np.int64)
+    h_prev1 = np.full(rows + 1, NEG, dtype=np.int64)
+    e_prev1 = np.full(rows + 1, NEG, dtype=np.int64)
+    f_prev1 = np.full(rows + 1, NEG, dtype=np.int64)
+    h_prev1[0] = 0
+    h_current = np.empty(rows + 1, dtype=np.int64)
+    e_current = np.empty(rows + 1, dtype=np.int64)
+    f_current = np.empty(rows + 1, dtype=np.int64)
+    codes = np.empty(rows + 1, dtype=np.uint8)
+    trace[0, 0] = STOP
+
+    first_move = HORIZONTAL if horizontal_first else VERTICAL
+    second_move = VERTICAL if horizontal_first else HORIZONTAL
+    best = (-1, 0, 0)
+
+    for k in range(1, rows + cols + 1):
+        # first and last row of the anti-diagonal
+        lo = max(0, k - cols)
+        hi = min(rows, k)
+        # interior cells (i >= 1 and j >= 1)
+        start = max(1, lo)
+        stop = min(hi, k - 1)
+        if start <= stop:
+            above = slice(start - 1, stop)
+            here = slice(start, stop + 1)
+            diagonal = h_prev2[above] + substitution(k, start, stop)
+
+            opened = h_prev1[above] + gap_open
+            extended = f_prev1[above] + gap_extend
+            vertical = np.maximum(opened, extended)
+            vertical_extends = extended > opened
+
+            opened = h_prev1[here] + gap_open
+            extended = e_prev1[here] + gap_extend
+            horizontal = np.maximum(opened, extended)
+            horizontal_extends = extended > opened
+
+            score = np.maximum(diagonal, np.maximum(vertical, horizontal))
+            if local:
+                np.maximum(score, 0, out=score)
+            first, second = (
+                (horizontal, vertical)
+                if horizontal_first
+                else (vertical, horizontal)
+            )
+            if local:
+                source = np.where(score == second, second_move, STOP)
+            else:
+                source = np.full(len(score), second_move)
+            source = np.where(score == first, first_move, source)
+            source = np.where(score == diagonal, DIAGONAL, source)
+            codes[here] = (
+                source
+                | (vertical_extends * VERTICAL_EXTENDS)
+                | (horizontal_extends * HORIZONTAL_EXTENDS)
+            )
+            h_current[here] = score
+            e_current[here] = horizontal
+            f_current[here] = vertical
+
+            if local:
+                top = int(score.max())
+                # last cell of the anti-diagonal with the top score
+                row = stop - int(np.argmax(score[::-1] == top))
+                if (top, row, k - row) > best:
+                    best = (top, row, k - row)
+
+        edge = gap_open + (k - 1) * gap_extend
+        extends = k > 1
+        # first row
+        if lo == 0:
+            if local:
+                h_current[0] = 0
+                e_current[0] = NEG
+                codes[0] = STOP
+            else:
+                h_current[0] = e_current[0] = edge
+                codes[0] = HORIZONTAL | (extends * HORIZONTAL_EXTENDS)
+            f_current[0] = NEG
+        # first column
+        if hi == k:
+            if local:
+                h_current[k] = 0
+                f_current[k] = NEG
+                codes[k] = STOP
+            else:
+                h_current[k] = f_current[k] = edge
+                codes[k] = VERTICAL | (extends * VERTICAL_EXTENDS)
+            e_current[k] = NEG
+
+        # cell (i, k - i) lives at flat index i * cols + k
+        cells = slice(lo * cols + k, hi * cols + k + 1, step)
+        flat[cells] = codes[slice(lo, hi + 1)]
+
+        h_prev2, h_prev1, h_current = h_prev1, h_current, h_prev2
+        e_prev1, e_current = e_current, e_prev1
+        f_prev1, f_current = f_current, f_prev1
+
+    if local:
+        if best[0] < 0:
+            return 0, 0, 0, trace
+        return best[0], best[1], best[2], trace
+    return int(h_prev1[rows]), rows, cols, trace
+
+
+def fill_batch(
+    codes1: Codes,
+    lengths1: npt.NDArray[np.int64],
+    codes2: Codes,
+    lengths2: npt.NDArray[np.int64],
+    match_score: int,
+    mismatch_score: int,
+    gap_open: int,
+    gap_extend: int,
+    matrix: Optional[SubstitutionMatrix] = None,
+    local: bool = False,
+) -> Tuple[
+    npt.NDArray[np.int64],
+    npt.NDArray[np.int64],
+    npt.NDArray[np.int64],
+    npt.NDArray[np.uint8],
+]:
+    """Fill the alignment matrices of a batch of pairs at once.
+
+    Pair b is codes1[b, :lengths1[b]] and codes2[b, :lengths2[b]], the
+    rows of codes1 and codes2 are padded to the longest sequence. Every
+    anti-diagonal is computed for all the pairs with the same numpy
+    operations, on (pairs x cells) blocks. A cell only depends on the cells
+    above it and on its left, so the padding never changes the cells of a
+    pair, and the ends are only looked for in the cells of the pair.
+
+    Return the scores, the ends (rows and columns) and the tracebacks,
+    trace[b] is the traceback of pair b as fill returns it. Global pairs
+    are filled as needleman_wunsch does (vertical moves first on ties) and
+    local pairs as smith_waterman does (horizontal moves first).
+    """
+    count, rows = codes1.shape
+    cols = codes2.shape[1]
+    trace = np.empty((count, rows + 1, cols + 1), dtype=np.uint8)
+    flat = trace.reshape(count, -1)
+    step = max(cols, 1)
+    codes2_rev = codes2[:, ::-1]
+    in_seq1 = np.arange(rows) < lengths1[:, None]
+    in_seq2_rev = (np.arange(cols) < lengths2[:, None])[:, ::-1]
+    row_index = np.arange(rows + 1)
+
+    h_prev2 = np.full((count, rows + 1), NEG, dtype=np.int64)
+    h_prev1 = np.full((count, rows + 1), NEG, dtype=np.int64)
+    e_prev1 = np.full((count, rows + 1), NEG, dtype=np.int64)
+    f_prev1 = np.full((count, rows + 1), NEG, dtype=np.int64)
+    h_prev1[:, 0] = 0
+    h_current = np.empty((count, rows + 1), dtype=np.int64)
+    e_current = np.empty((count, rows + 1), dtype=np.int64)
+    f_current = np.empty((count, rows + 1), dtype=np.int64)
+    codes = np.empty((count, rows + 1), dtype=np.uint8)
+    trace[:, 0, 0] = STOP
+
+    first_move = HORIZONTAL if local else VERTICAL
+    second_move = VERTICAL if local else HORIZONTAL
+    pairs = np.arange(count)
+    ends = lengths1 + lengths2
+    scores = np.zeros(count, dtype=np.int64)
+    best_score = np.full(count, -1, dtype=np.int64)
+    best_row = np.zeros(count, dtype=np.int64)
+    best_col = np.zeros(count, dtype=np.int64)
+
+    for k in range(1, rows + cols + 1):
+        lo = max(0, k - cols)
+        hi = min(rows, k)
+        start = max(1, lo)
+        stop = min(hi, k - 1)
+        if start <= stop:
+            above = slice(start - 1, stop)
+            here = slice(start, stop + 1)
+            columns = slice(cols - k + start, cols - k + stop + 1)
+            # the padding never pairs
+            substitution = np.where(
+                in_seq1[:, above] & in_seq2_rev[:, columns],
+                substitution_scores(
+                    codes1[:, above],
+                    codes2_rev[:, columns],
+                    match_score,
+                    mismatch_score,
+                    matrix,
+                ),
+                NEG,
+            )
+            diagonal = h_prev2[:, above] + substitution
+
+            opened = h_prev1[:, above] + gap_open
+            extended = f_prev1[:, above] + gap_extend
+            vertical = np.maximum(opened, extended)
+            vertical_extends = extended > opened
+
+            opened = h_prev1[:, here] + gap_open
+            extended = e_prev1[:, here] + gap_extend
+            horizontal = np.maximum(opened, extended)
+            horizontal_extends = extended > opened
+
+            score = np.maximum(diagonal, np.maximum(vertical, horizontal))
+            if local:
+                np.maximum(score, 0, out=score)
+                first, second = horizontal, vertical
+                source = np.where(score == second, second_move, STOP)
+            else:
+                first = vertical
+                source = np.full(score.shape, second_move)
+            source = np.where(score == first, first_move, source)
+            source = np.where(score == diagonal, DIAGONAL, source)
+            codes[:, here] = (
+                source
+                | (vertical_extends * VERTICAL_EXTENDS)
+                | (horizontal_extends * HORIZONTAL_EXTENDS)
+            )
+            h_current[:, here] = score
+            e_current[:, here] = horizontal
+            f_current[:, here] = vertical
+
+            if local:
+                # the last cell of the pair on the anti-diagonal with its
+                # top score, as in fill
+                inside = (row_index[here] <= lengths1[:, None]) & (
+                    k - row_index[here] <= lengths2[:, None]
+                )
+                masked = np.where(inside, score, -1)
+                top = masked.max(axis=1)
+                row = stop - np.argmax(masked[:, ::-1] == top[:, None], axis=1)
+                better = (top >= 0) & (
+                    (top > best_score)
+                    | ((top == best_score) & (row >= best_row))
+                )
+                best_score[better] = top[better]
+                best_row[better] = row[better]
+                best_col[better] = k - row[better]
+
+        edge = gap_open + (k - 1) * gap_extend
+        extends = k > 1
+        if lo == 0:
+            if local:
+                h_current[:, 0] = 0
+                e_current[:, 0] = NEG
+                codes[:, 0] = STOP
+            else:
+                h_current[:, 0] = e_current[:, 0] = edge
+                codes[:, 0] = HORIZONTAL | (extends * HORIZONTAL_EXTENDS)
+            f_current[:, 0] = NEG
+        if hi == k:
+            if local:
+                h_current[:, k] = 0
+                f_current[:, k] = NEG
+                codes[:, k] = STOP
+            else:
+                h_current[:, k] = f_current[:, k] = edge
+                codes[:, k] = VERTICAL | (extends * VERTICAL_EXTENDS)
+            e_current[:, k] = NEG
+
+        flat[:, slice(lo * cols + k, hi * cols + k + 1, step)] = codes[
+            :, slice(lo, hi + 1)
+        ]
+        if not local:
+            # the pairs that end on this anti-diagonal
+            done = ends == k
+            scores[done] = h_current[pairs[done], lengths1[done]]
+
+        h_prev2, h_prev1, h_current = h_prev1, h_current, h_prev2
+        e_prev1, e_current = e_current, e_prev1
+        f_prev1, f_current = f_current, f_prev1
+
+    if local:
+        found = best_score >= 0
+        best_row[~found] = 0
+        best_col[~found] = 0
+        return np.maximum(best_score, 0), best_row, best_col, trace
+    return scores, lengths1, lengths2, trace
+
+
+def traceback(
+    trace: npt.NDArray[np.uint8],
+    end_i: int,
+    end_j: int,
+    lowest: Optional[int] = None,
+) -> Tuple[int, int, npt.NDArray[np.uint8]]:
+    """Follow the traceback from (end_i, end_j).
+
+    Return where the alignment starts and its moves from the start to the
+    end (DIAGONAL, VERTICAL or HORIZONTAL). With lowest the trace is a
+    band stored row by row, the cell (i, j) at trace[i, j - i - lowest].
+    """
+    cols = trace.shape[1]
+    flat = trace.reshape(-1)
+    # the cell (i, j) is at i * stride + j + offset
+    stride, offset = (cols, 0) if lowest is None else (cols - 1, -lowest)
+    moves = bytearray()
+    i, j = end_i, end_j
+    # state is H, or the gap state we are in
+    state = DIAGONAL
+    while True:
+        code = int(flat[i * stride + j + offset])
+        if state == DIAGONAL:
+            source = code & SOURCE
+            if source == STOP:
+                break
+            if source == DIAGONAL:
+                moves.append(DIAGONAL)
+                i -= 1
+                j -= 1
+                continue
+            state = source
+        if state == VERTICAL:
+            moves.append(VERTICAL)
+            i -= 1
+            if not code & VERTICAL_EXTENDS:
+                state = DIAGONAL
+        else:
+            moves.append(HORIZONTAL)
+            j -= 1
+            if not code & HORIZONTAL_EXTENDS:
+                state = DIAGONAL
+    moves.reverse()
+    return i, j, np.frombuffer(bytes(moves), dtype=np.uint8)
+
+
+def alignment_strings(
+    moves: npt.NDArray[np.uint8],
+    seq1: Encodable,
+    seq2: Encodable,
+    start_i: int = 0,
+    start_j: int = 0,
+) -> Tuple[str, str, str]:
+    """Build the aligned sequences and match string from the moves.
+
+    The match string has "|" for a match, "." for a mismatch and " "
+    for a gap.
+    """
+    in_seq1 = moves != HORIZONTAL
+    in_seq2 = moves != VERTICAL
+    codes1 = encode(seq1)
+    codes2 = encode(seq2)
+    gap = ord("-")
+    aligned1 = np.full(len(moves), gap, dtype=np.uint32)
+    aligned2 = np.full(len(moves), gap, dtype=np.uint32)
+    used1 = slice(start_i, start_i + int(in_seq1.sum()))
+    used2 = slice(start_j, start_j + int(in_seq2.sum()))
+    aligned1[in_seq1] = codes1[used1]
+    aligned2[in_seq2] = codes2[used2]
+    paired = moves == DIAGONAL
+    matches = np.full(len(moves), ord(" "), dtype=np.uint32)
+    matches[paired] = np.where(
+        aligned1[paired] == aligned2[paired], ord("|"), ord(".")
+    )
+    return (
+        _decode(aligned1),
+        _decode(matches),
+        _decode(aligned2),
+    )
+
+
+def _decode(codes: npt.NDArray[np.uint32]) -> str:
+    """Turn an array of code points back into a string."""
+    return codes.astype("<u4").tobytes().decode("utf-32-le")
@@ -0,0 +1,79 @@
+import pickle
+
+from Alignment import Alignment
+from Needleman_wunsch import needleman_wunsch, needleman_wunsch_alignment
+from Smith_waterman import smith_waterman, smith_waterman_alignment
+
+
+def test_alignment() -> None:
+    """Test the compact alignment results."""
+    alignment = needleman_wunsch_alignment("ACGTAT", "AGTGCT", 1, -1, -1)
+    assert needleman_wunsch("ACGTAT", "AGTGCT", 1, -1, -1) == (
+        alignment.score,
+        alignment.aligned_seq1(),
+        alignment.aligned_seq2(),
+    )
+    assert alignment.strings() == ("ACGT-AT", "| || .|", "A-GTGCT")
+    assert alignment.cigar() == "1M1D2M1I2M"
+    assert alignment.columns == 7
+    assert (alignment.start1, alignment.end1) == (0, 6)
+    assert (alignment.start2, alignment.end2) == (0, 6)
+    # two runs of moves take 2 bytes of operations and 8 of lengths
+    assert (
+        len(needleman_wunsch_alignment("AAAA", "AAA", 1, -1, -1).lengths) == 8
+    )
+
+    # the same alignment from its strings or its CIGAR string
+    assert (
+        Alignment.from_strings(
+            alignment.score, "ACGT-AT", "A-GTGCT", "ACGTAT", "AGTGCT"
+        )
+        == alignment
+    )
+    assert (
+        Alignment.from_cigar(
+            alignment.score, alignment.cigar(), "ACGTAT", "AGTGCT"
+        )
+        == alignment
+    )
+    assert pickle.loads(pickle.dumps(alignment)) == alignment
+
+    # a local alignment keeps where it starts and ends
+    local = smith_waterman_alignment("TTACGTATGG", "AGTGCT", 10, -5, -5)
+    identity, score, align1, symbol, align2 = smith_waterman(
+        "TTACGTATGG", "AGTGCT", 10, -5, -5
+    )
+    assert (local.score, local.identity(), local.symbol()) == (
+        score,
+        identity,
+        symbol,
+    )
+    assert (local.aligned_seq1(), local.aligned_seq2()) == (align1, align2)
+    # ATG of seq1 with AGTG of seq2
+    assert (local.start1, local.end1, local.start2, local.end2) == (
+        6,
+        9,
+        0,
+        4,
+    )
+    empty = smith_waterman_alignment("AAA", "CCC", 10, -5, -5)
+    assert (empty.score, empty.cigar(), empty.identity()) == (0, "", 0)
+
+    # the options after gap_penalty are keyword only, so a gap_extend
+    # given in its place is not taken for an engine
+    affine = needleman_wunsch_alignment(
+        "ACGTAT", "AGTGCT", 1, -1, -2, gap_extend=-1
+    )
+    assert (affine.score, affine.aligned_seq1(), affine.aligned_seq2()) == (
+        needleman_wunsch("ACGTAT", "AGTGCT", 1, -1, -2, gap_extend=-1)
+    )
+    for align in (needleman_wunsch_alignment, smith_waterman_alignment):
+        try:
+            align("ACGTAT", "AGTGCT", 1, -1, -2, -1)  # type: ignore
+        except TypeError:
+            pass
+        else:
+            assert False
+
+
+test_alignment()
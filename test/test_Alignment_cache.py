@@ -0,0 +1,91 @@
+import os
+import tempfile
+
+from Alignment_cache import AlignmentCache
+from Encoded_sequence import EncodedSequence
+from Multiple_alignment import multiple_alignment
+from Needleman_wunsch import needleman_wunsch
+from Smith_waterman import smith_waterman
+from Substitution_matrix import BLOSUM62
+
+
+def test_alignment_cache() -> None:
+    """Test the memory tier of the cache."""
+    key = AlignmentCache.key("needleman_wunsch", "ACGT", "AGT", (1, -1, -1))
+    # strings and encoded sequences with the same letters share a key
+    assert key == AlignmentCache.key(
+        "needleman_wunsch", EncodedSequence("ACGT"), "AGT", (1, -1, -1)
+    )
+    assert key != AlignmentCache.key("needleman_wunsch", "ACG", "TAGT")
+    assert key != AlignmentCache.key(
+        "needleman_wunsch", "ACGT", "AGT", (1, -1, -2)
+    )
+    assert AlignmentCache.key(
+        "smith_waterman", "W", "W", (BLOSUM62,)
+    ) != AlignmentCache.key("smith_waterman", "W", "W", (None,))
+
+    cache = AlignmentCache(memory_entries=2)
+    expected = needleman_wunsch("ACGTAT", "AGTGCT", 1, -1, -1)
+    for _ in range(3):
+        assert (
+            needleman_wunsch("ACGTAT", "AGTGCT", 1, -1, -1, cache=cache)
+            == expected
+        )
+    assert cache.stats.misses == 1 and cache.stats.memory_hits == 2
+    # the least recently used entry is dropped
+    smith_waterman("ACGTAT", "AGTGCT", 10, -5, -5, cache=cache)
+    smith_waterman("ACGTAT", "AGTGCT", 10, -5, -3, cache=cache)
+    assert len(cache) == 2 and cache.stats.evictions == 1
+    assert cache.stats.hit_rate == 0.4
+
+
+def test_alignment_cache_disk() -> None:
+    """Test the sqlite tier shared across runs."""
+    seqs = ["ACTGTCA", "ACTTCA", "ACTGTA", "AGTGCT", "ACGTAT"]
+    expected = multiple_alignment(seqs)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "alignments.sqlite")
+        with AlignmentCache(path) as cache:
+            assert multiple_alignment(seqs, cache=cache) == expected
+            assert cache.stats.hits == 0
+            stored = len(cache)
+
+        # a new run finds every alignment on disk, with more workers too
+        with AlignmentCache(path) as cache:
+            assert multiple_alignment(seqs, workers=2, cache=cache) == expected
+            assert cache.stats.misses == 0
+            assert cache.stats.disk_hits > 0
+            assert len(cache) == stored
+
+        with AlignmentCache(path, disk_entries=3) as cache:
+            smith_waterman("ACGTAT", "AGTGCT", 10, -5, -5, cache=cache)
+            assert len(cache) == 3
+            assert cache.stats.evictions == stored - 2
+            cache.clear()
+            assert len(cache) == 0
+
+
+def test_alignment_cache_writers() -> None:
+    """Test the bound and the LRU order with two writers on one file."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "alignments.sqlite")
+        with AlignmentCache(path, 1, disk_entries=3) as first:
+            with AlignmentCache(path, 1, disk_entries=3) as second:
+                first.put(b"a", 1)
+                second.put(b"b", 2)
+                first.put(b"c", 3)
+                # both writers count the entries of the other one
+                assert len(first) == len(second) == 3
+                # a is used after b, by the writer that did not store it
+                assert second.get(b"a") == 1
+                first.put(b"d", 4)
+                assert len(first) == len(second) == 3
+                # the oldest use, b, is the one dropped
+                assert first.get(b"b") is None and second.get(b"b") is None
+                assert second.get(b"c") == 3
+                assert first.stats.evictions == 1
+
+
+test_alignment_cache()
+test_alignment_cache_disk()
+test_alignment_cache_writers()
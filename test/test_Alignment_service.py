@@ -0,0 +1,83 @@
+import asyncio
+import os
+import tempfile
+from typing import Any
+
+from Alignment_service import (
+    AlignmentClient,
+    AlignmentServer,
+    AsyncAlignmentClient,
+)
+from Needleman_wunsch import needleman_wunsch
+from Smith_waterman import smith_waterman
+
+
+async def _exercise(path: str) -> None:
+    """Run a server on path and align through both clients."""
+    # a small queue so that the connections are held back
+    server = AlignmentServer(max_batch=8, queue_size=4, max_in_flight=4)
+    await server.start(path=path)
+    try:
+        client = await AsyncAlignmentClient.connect(path=path)
+        pairs = [("ACGTAT", "AGTGCT"), ("GGACGTATGG", "ACGTAT")] * 10
+        results = await asyncio.gather(
+            *(client.align(*pair, local=True, match=10) for pair in pairs)
+        )
+        for (seq1, seq2), result in zip(pairs, results):
+            identity, score, aligned1, _, aligned2 = smith_waterman(
+                seq1, seq2, 10, -1, -2
+            )
+            assert result["score"] == score
+            assert result["identity"] == identity
+            assert (result["aligned1"], result["aligned2"]) == (
+                aligned1,
+                aligned2,
+            )
+        # requests were aligned together
+        assert server.requests == 20 and server.batches < 20
+        try:
+            await client.align("ACGT", "ACGT", gap="x")
+            assert False
+        except ValueError as error:
+            assert str(error) == "gap must be an integer"
+        # an unhashable matrix is an error line, the requests sent with it
+        # on the same connection are still answered
+        bad = asyncio.ensure_future(client.align("ACGT", "ACGT", matrix=[1]))
+        assert (await client.align("ACGT", "ACGT"))["score"] == 4
+        try:
+            await bad
+            assert False
+        except ValueError as error:
+            assert str(error) == "matrix must be a string"
+        # "false" is not false, it is refused rather than read as true
+        for name, value in (("local", "false"), ("strings", 0)):
+            try:
+                options: dict[str, Any] = {name: value}
+                await client.align("ACGT", "ACGT", **options)
+                assert False
+            except ValueError as error:
+                assert str(error) == f"{name} must be a boolean"
+        await client.close()
+
+        def blocking() -> None:
+            with AlignmentClient(path=path) as client:
+                results = client.align_many(pairs, strings=False)
+                assert [result["score"] for result in results] == [
+                    needleman_wunsch(*pair, 1, -1, -2)[0] for pair in pairs
+                ]
+                assert "aligned1" not in results[0]
+                result = client.align("ACGTAT", "AGTGCT", gap=-1)
+                assert (result["cigar"], result["score"]) == ("1M1D2M1I2M", 1)
+
+        await asyncio.to_thread(blocking)
+    finally:
+        await server.close()
+
+
+def test_alignment_service() -> None:
+    """Test the alignment server and its clients."""
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(_exercise(os.path.join(directory, "alignment.sock")))
+
+
+test_alignment_service()
@@ -0,0 +1,70 @@
+import random
+
+from Anchored_alignment import _anchors, anchored_alignment
+from Multiple_alignment import multiple_alignment
+from Wavefront import encode
+
+
+def _family(seed: int, count: int, length: int) -> list[str]:
+    """Return count copies of a random sequence with a few changes."""
+    rng = random.Random(seed)
+    ancestor = [rng.choice("ACGT") for _ in range(length)]
+    seqs = []
+    for _ in range(count):
+        seq = list(ancestor)
+        for _ in range(length // 50):
+            position = rng.randrange(len(seq))
+            change = rng.randrange(3)
+            if change == 0:
+                seq[position] = rng.choice("ACGT")
+            elif change == 1:
+                seq.insert(position, rng.choice("ACGT"))
+            else:
+                del seq[position]
+        seqs.append("".join(seq))
+    return seqs
+
+
+def test_anchors() -> None:
+    """Test the anchors shared by all the sequences."""
+    seqs = ["TTGATTACAGG", "CGATTACAT", "AGATTACAGA"]
+    starts, lengths = _anchors([encode(seq) for seq in seqs], 4)
+    # GATT, ATTA, TTAC and TACA are one match
+    assert starts.tolist() == [[2, 1, 1]]
+    assert lengths.tolist() == [7]
+    # the k-mers of a repeat are not unique
+    seqs[2] = "GATTACAGATTACA"
+    starts, lengths = _anchors([encode(seq) for seq in seqs], 4)
+    assert starts.tolist() == []
+    assert lengths.tolist() == []
+
+
+def test_anchored_alignment() -> None:
+    """Test the alignment of long sequences cut at their anchors."""
+    seqs = _family(1, 4, 3000)
+    aligned = anchored_alignment(seqs, k=12, segment_length=100)
+    # every sequence is kept whole, in the input order
+    assert [row.replace("-", "") for row in aligned] == seqs
+    assert len(set(map(len, aligned))) == 1
+    columns = list(zip(*aligned))
+    assert sum(len(set(column)) == 1 for column in columns) > 2800
+    # the segments do not depend on the workers
+    assert anchored_alignment(seqs, "nj", workers=2, k=12) == (
+        anchored_alignment(seqs, "nj", k=12)
+    )
+
+    # short sequences are not cut
+    seqs = _family(2, 5, 300)
+    assert anchored_alignment(seqs) == multiple_alignment(seqs, "upgma")
+    assert anchored_alignment(["", "ACGT" * 300]) == ["-" * 1200, "ACGT" * 300]
+    assert anchored_alignment(["ACGT"]) == ["ACGT"]
+    try:
+        anchored_alignment(seqs, "pairwise")
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+test_anchors()
+test_anchored_alignment()
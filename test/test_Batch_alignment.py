@@ -0,0 +1,38 @@
+import random
+
+from Batch_alignment import align_batch
+from Needleman_wunsch import needleman_wunsch_alignment
+from Smith_waterman import smith_waterman_alignment
+from Substitution_matrix import BLOSUM62
+
+
+def test_align_batch() -> None:
+    """Test the vectorized alignment of a batch of pairs."""
+    rng = random.Random(2)
+    pairs = [
+        (
+            "".join(rng.choice("ACGT") for _ in range(rng.randrange(12))),
+            "".join(rng.choice("ACGT") for _ in range(rng.randrange(12))),
+        )
+        for _ in range(20)
+    ]
+    pairs.append(("ACGTAT", "AGTGCT"))
+    # the same alignments as one pair at a time, ties included, whatever
+    # the size of the batches
+    for batch_cells in (1 << 20, 100):
+        assert align_batch(pairs, 1, -1, -2, batch_cells=batch_cells) == [
+            needleman_wunsch_alignment(*pair, 1, -1, -2) for pair in pairs
+        ]
+        assert align_batch(pairs, 10, -5, -5, gap_extend=-1, local=True) == [
+            smith_waterman_alignment(*pair, 10, -5, -5, gap_extend=-1)
+            for pair in pairs
+        ]
+    proteins = [("HEAGAWGHEE", "PAWHEAE"), ("MKV", "MKVLA")]
+    assert align_batch(proteins, 0, 0, -8, matrix=BLOSUM62) == [
+        needleman_wunsch_alignment(*pair, 0, 0, -8, matrix=BLOSUM62)
+        for pair in proteins
+    ]
+    assert align_batch([], 1, -1, -1) == []
+
+
+test_align_batch()
@@ -0,0 +1,96 @@
+import io
+import os
+import tempfile
+
+from Command_line import (
+    AlignedPair,
+    Scoring,
+    align_pairs,
+    format_pairs,
+    main,
+)
+from Sequence_io import read_fasta
+
+
+def test_cigar() -> None:
+    """Test the CIGAR strings and the output formats."""
+    pair = AlignedPair("a", "b", 25, 57, "ACGT-AT", "A GT  T", "A-GTGCT")
+    assert format_pairs([pair], "tsv") == b"a\tb\t25\t57\t1M1D2M1I2M\n"
+    empty = AlignedPair("a", "b", 0, 0, "", "", "")
+    assert format_pairs([empty], "tsv") == b"a\tb\t0\t0\t\n"
+    assert format_pairs([pair], "fasta") == (b">a\nACGT-AT\n>b\nA-GTGCT\n")
+    assert format_pairs([pair], "pairwise") == (
+        b"# a vs b score=25 identity=57%\nACGT-AT\nA GT  T\nA-GTGCT\n\n"
+    )
+
+
+def test_command_line() -> None:
+    """Test the global, local, search and msa commands."""
+    with tempfile.TemporaryDirectory() as directory:
+        queries = os.path.join(directory, "queries.fa")
+        targets = os.path.join(directory, "targets.fa")
+        output = os.path.join(directory, "out.txt")
+        with open(queries, "w") as handle:
+            handle.write(">a\nACGTAT\n>b\nGGACGTATGG\n")
+        with open(targets, "w") as handle:
+            handle.write(">x\nAGTGCT\n>y\nACGTAT\n>z\nCCC\n")
+
+        arguments = "--match 10 --mismatch -5 --gap -5 --format tsv"
+        main(["local", queries, targets, "-o", output] + arguments.split())
+        with open(output) as handle:
+            assert handle.read() == (
+                "name1\tname2\tscore\tidentity\tcigar\n"
+                "a\tx\t25\t57\t1M1D2M1I2M\n"
+                "b\ty\t60\t100\t6M\n"
+            )
+
+        # worker processes and chunks write the same output, in order
+        pairs = [("a", "ACGTAT", "x", "AGTGCT")] * 5 + [
+            ("b", "GGACGTATGG", "y", "ACGTAT")
+        ]
+        outputs = []
+        for threads, chunk_size in ((1, 1024), (2, 2)):
+            buffer = io.BytesIO()
+            align_pairs(
+                pairs,
+                buffer,
+                Scoring(1, -1, -2, None, None),
+                False,
+                "tsv",
+                threads,
+                chunk_size,
+            )
+            outputs.append(buffer.getvalue())
+        assert outputs[0] == outputs[1]
+        assert outputs[0].count(b"\n") == 7
+
+        main(["search", queries, targets, "-k", "1", "--format", "fasta"])
+        main(["search", queries, targets, "-k", "1", "-o", output])
+        with open(output) as handle:
+            assert handle.read().splitlines()[0] == (
+                "# a vs y score=6 identity=100%"
+            )
+
+        main(["msa", targets, "--collapse-duplicates", "-o", output])
+        assert len(list(read_fasta(output))) == 3
+        main(["msa", targets, "--guide", "nj", "-o", output])
+        records = list(read_fasta(output))
+        assert [record.name for record in records] == ["x", "y", "z"]
+        assert len({len(record.sequence) for record in records}) == 1
+        main(["msa", targets, "--anchored", "-o", output])
+        assert list(read_fasta(output)) == records
+        main(["msa", targets, "--anchored", "--threads", "2", "-o", output])
+        assert list(read_fasta(output)) == records
+        # the guide trees are built in one process, --threads would be
+        # silently ignored
+        for guide in ("upgma", "nj"):
+            try:
+                main(["msa", targets, "--guide", guide, "--threads", "2"])
+            except SystemExit as error:
+                assert error.code == 2
+            else:
+                assert False
+
+
+test_cigar()
+test_command_line()
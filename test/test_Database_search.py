@@ -0,0 +1,39 @@
+from Database_search import search
+from Smith_waterman import smith_waterman
+
+
+def test_search() -> None:
+    """Test the top-k database search."""
+    targets = ["TTTTTT", "ACGTAT", "AGTGCT", "GGACGTATGG", "ACG", "CCCC"]
+
+    hits = search("ACGTAT", targets, 10, -5, -5, k=3, chunk_size=2)
+    assert [hit.target_index for hit in hits] == [1, 3, 4]
+    assert [hit.score for hit in hits] == [60, 60, 30]
+
+    # the reported alignment is the one smith_waterman finds
+    identity, score, align1, symbol, align2 = smith_waterman(
+        "ACGTAT", targets[3], 10, -5, -5
+    )
+    assert hits[1].score == score
+    assert hits[1].identity == identity
+    assert (hits[1].aligned_query, hits[1].symbol) == (align1, symbol)
+    assert hits[1].aligned_target == align2
+    assert (hits[1].query_end, hits[1].target_end) == (6, 8)
+
+    # worker processes give the same hits, targets can be a generator
+    assert (
+        search(
+            "ACGTAT",
+            (target for target in targets),
+            10,
+            -5,
+            -5,
+            k=3,
+            workers=2,
+            chunk_size=2,
+        )
+        == hits
+    )
+
+
+test_search()
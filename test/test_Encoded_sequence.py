@@ -0,0 +1,37 @@
+from Encoded_sequence import EncodedSequence
+from Needleman_wunsch import needleman_wunsch
+
+
+def test_encoded_sequence() -> None:
+    """Test the byte encoded sequence."""
+    sequence = EncodedSequence("ACGTAT")
+    assert len(sequence) == 6
+    assert str(sequence) == "ACGTAT" and bytes(sequence) == b"ACGTAT"
+    assert sequence[1] == "C"
+    assert sequence[1:3] == EncodedSequence(b"CG")
+    assert hash(sequence) == hash(EncodedSequence(b"ACGTAT"))
+
+    # buffers are wrapped without a copy
+    buffer = bytearray(b"ACGTACGT")
+    view = EncodedSequence(memoryview(buffer)[2:])
+    buffer[2] = ord("T")
+    assert str(view) == "TTACGT"
+
+    # only ASCII letters fit in a byte
+    try:
+        EncodedSequence("ACGÜ")
+    except ValueError:
+        pass
+    else:
+        assert False
+
+    # the aligners take encoded sequences as well as strings
+    assert needleman_wunsch(
+        EncodedSequence(b"ACGTAT"), EncodedSequence(b"AGTGCT"), 1, -1, -1
+    ) == needleman_wunsch("ACGTAT", "AGTGCT", 1, -1, -1)
+    assert needleman_wunsch(
+        EncodedSequence(b"ACGTAT"), "AGTGCT", 1, -1, -1, engine="loop"
+    ) == (1, "ACGT-AT", "A-GTGCT")
+
+
+test_encoded_sequence()
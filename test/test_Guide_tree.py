@@ -0,0 +1,101 @@
+from typing import Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from Guide_tree import guide_tree, kmer_distances, neighbor_joining, upgma
+
+
+def test_guide_tree() -> None:
+    """Test the k-mer distances and the guide trees."""
+    seqs = ["ACGTACGT", "ACGTACGA", "TTTTGGGG", "TTTTCGGG"]
+
+    # one minus the fraction of shared k-mers
+    distances = kmer_distances(seqs, 3)
+    assert distances.shape == (4, 4)
+    assert np.allclose(distances, distances.T)
+    assert distances[0, 1] == 0 and distances[0, 2] == 1
+    assert distances[2, 3] == 1 - 2 / 4
+    # too short to have a k-mer
+    assert kmer_distances(["AC", "AC"], 3)[0, 1] == 1
+
+    # close sequences are merged first, node 4 is the first merge
+    assert upgma(distances) == [(0, 1), (2, 3), (4, 5)]
+    assert neighbor_joining(distances) == [(0, 1), (4, 2), (5, 3)]
+    assert guide_tree(seqs, "upgma", 3) == upgma(distances)
+    assert guide_tree(["ACGT"]) == []
+
+    try:
+        guide_tree(seqs, "random")
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def _closest(distances: npt.NDArray[np.float64]) -> Tuple[int, int]:
+    """Return the first pair (a, b), a < b, with the smallest value."""
+    upper = np.triu(np.ones(distances.shape, dtype=bool), 1)
+    masked = np.where(upper, distances, np.inf)
+    a, b = np.unravel_index(int(np.argmin(masked)), masked.shape)
+    return int(a), int(b)
+
+
+def _full_scan_tree(
+    distances: npt.NDArray[np.float64], method: str
+) -> list[Tuple[int, int]]:
+    """Return the tree found with a scan of the whole matrix at every join."""
+    count = len(distances)
+    distances = distances.astype(np.float64)
+    nodes = list(range(count))
+    sizes = np.ones(count)
+    live = np.ones(count, dtype=bool)
+    merges = []
+    for step in range(count - 1):
+        slots = np.flatnonzero(live)
+        current = distances[np.ix_(slots, slots)]
+        size = len(slots)
+        if method == "upgma":
+            a, b = _closest(current)
+        elif size > 2:
+            totals = current.sum(axis=1)
+            a, b = _closest(
+                (size - 2) * current - totals[:, None] - totals[None, :]
+            )
+        else:
+            a, b = 0, 1
+        a, b = int(slots[a]), int(slots[b])
+        merges.append((nodes[a], nodes[b]))
+        if method == "upgma":
+            row = (sizes[a] * distances[a] + sizes[b] * distances[b]) / (
+                sizes[a] + sizes[b]
+            )
+        else:
+            row = (distances[a] + distances[b] - distances[a, b]) / 2
+        distances[a] = row
+        distances[:, a] = row
+        distances[a, a] = 0
+        sizes[a] += sizes[b]
+        live[b] = False
+        nodes[a] = count + step
+    return merges
+
+
+def test_guide_tree_joins() -> None:
+    """Test the row minima against a scan of the whole matrix."""
+    rng = np.random.default_rng(2)
+    for count in (2, 3, 5, 10, 40):
+        for _ in range(10):
+            # eighths add up exactly, so ties stay ties in the row sums
+            distances = rng.integers(0, 9, (count, count)) / 8
+            distances = np.triu(distances, 1)
+            distances = distances + distances.T
+            assert upgma(distances) == _full_scan_tree(distances, "upgma")
+            assert neighbor_joining(distances) == _full_scan_tree(
+                distances, "nj"
+            )
+    assert upgma(np.zeros((0, 0))) == neighbor_joining(np.zeros((1, 1))) == []
+
+
+test_guide_tree()
+test_guide_tree_joins()
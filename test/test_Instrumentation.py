@@ -0,0 +1,52 @@
+from Instrumentation import enabled, instrument, phase
+from Multiple_alignment import multiple_alignment
+from Needleman_wunsch import needleman_wunsch
+from Smith_waterman import smith_waterman
+
+
+def test_instrument() -> None:
+    """Test the phase statistics of the aligners."""
+    assert not enabled()
+    # outside of instrument phases record nothing
+    with phase("nothing", 10):
+        pass
+
+    events = []
+    with instrument(lambda *event: events.append(event)) as recorder:
+        assert enabled()
+        needleman_wunsch("ACGTAT", "AGTGCT", 1, -1, -1)
+        needleman_wunsch("ACGTAT", "AGT", 1, -1, -1)
+        smith_waterman("ACGTAT", "AGTGCT", 10, -5, -5)
+    assert not enabled()
+    stats = recorder.as_dict()
+    fill = stats["needleman_wunsch.fill"]
+    assert fill["calls"] == 2
+    assert fill["cells"] == 6 * 6 + 6 * 3
+    assert fill["peak_matrix_bytes"] == 7 * 7
+    assert fill["seconds"] > 0 and fill["cells_per_second"] > 0
+    assert stats["smith_waterman.fill"]["cells"] == 36
+    assert "smith_waterman.traceback" in stats
+    assert len(events) == sum(phase["calls"] for phase in stats.values())
+    assert events[0][0] == "needleman_wunsch.fill"
+
+    # the phases of multiple_alignment
+    with instrument() as recorder:
+        multiple_alignment(["ACTGTCA", "ACTTCA", "ACTGTA"])
+        multiple_alignment(["ACTGTCA", "ACTTCA", "ACTGTA"], "upgma")
+        # blocks nest
+        with instrument() as inner:
+            smith_waterman("ACGTAT", "AGTGCT", 10, -5, -5)
+    stats = recorder.as_dict()
+    assert stats["msa.pairwise_scores"]["cells"] == 7 * 6 + 7 * 6 + 6 * 6
+    assert stats["msa.profile_fill"]["calls"] == 3
+    assert stats["msa.add_gaps"]["calls"] == 3
+    assert stats["msa.guide_tree"]["calls"] == 1
+    assert "smith_waterman.fill" not in stats
+    assert list(inner.as_dict()) == [
+        "smith_waterman.fill",
+        "smith_waterman.traceback",
+        "smith_waterman.strings",
+    ]
+
+
+test_instrument()
@@ -1,4 +1,8 @@
-from Needleman_wunsch import needleman_wunsch
+from Needleman_wunsch import (
+    needleman_wunsch,
+    needleman_wunsch_banded,
+    needleman_wunsch_score,
+)
 
 
 def test_needleman_wunsch() -> None:
@@ -31,4 +35,138 @@ def test_needleman_wunsch() -> None:
     )
 
 
+def test_needleman_wunsch_engines() -> None:
+    """Test that the wavefront and loop engines agree."""
+    pairs = [
+        ("ACGTAT", "AGTGCT"),
+        ("ACGTAT", "ACG"),
+        ("A", "TTTT"),
+        ("GATTACA", "GCATGCT"),
+        ("AAAAAA", "CCCCC"),
+    ]
+    for seq1, seq2 in pairs:
+        assert needleman_wunsch(
+            seq1, seq2, 1, -1, -1, engine="wavefront"
+        ) == needleman_wunsch(seq1, seq2, 1, -1, -1, engine="loop")
+        assert needleman_wunsch(
+            seq1, seq2, 2, -3, -2, engine="wavefront"
+        ) == needleman_wunsch(seq1, seq2, 2, -3, -2, engine="loop")
+
+
+def test_needleman_wunsch_hirschberg() -> None:
+    """Test the linear memory engine."""
+    # same score as the full matrix, and the alignment spells the inputs
+    seq1 = "GATTACAGATTACAGGCATTAGCA" * 20
+    seq2 = "GCATGCTTACAGGATTACCATTA" * 20
+    full = needleman_wunsch(seq1, seq2, 1, -1, -1)
+    linear = needleman_wunsch(seq1, seq2, 1, -1, -1, engine="hirschberg")
+    assert linear[0] == full[0]
+    assert str(linear[1]).replace("-", "") == seq1
+    assert str(linear[2]).replace("-", "") == seq2
+
+    # a small memory budget switches to hirschberg automatically
+    assert needleman_wunsch("ACGTAT", "ACG", 1, -1, -1, memory_budget=8) == (
+        0,
+        "ACGTAT",
+        "ACG---",
+    )
+    # but not from an engine asked for by name
+    for engine in ("wavefront", "loop"):
+        try:
+            needleman_wunsch(
+                "ACGTAT", "ACG", 1, -1, -1, engine=engine, memory_budget=8
+            )
+        except ValueError:
+            pass
+        else:
+            assert False
+    assert needleman_wunsch(
+        "ACGTAT", "ACG", 1, -1, -1, engine="loop", memory_budget=None
+    ) == needleman_wunsch("ACGTAT", "ACG", 1, -1, -1, engine="loop")
+
+
+def test_needleman_wunsch_score() -> None:
+    """Test the score only needleman_wunsch."""
+    assert needleman_wunsch_score("ACGTAT", "ACGTAT", 1, -1, -1) == 6
+    assert needleman_wunsch_score("ACGTAT", "AGTGCT", 1, -1, -1) == 1
+    assert needleman_wunsch_score("ACG", "ACGTAT", 1, -1, -1) == 0
+    assert needleman_wunsch_score("", "ACG", 1, -1, -2) == -6
+
+
+def test_needleman_wunsch_banded() -> None:
+    """Test the banded and x-drop global alignment."""
+    # a wide enough band finds the same alignment as the full matrix
+    result = needleman_wunsch_banded("ACGTAT", "AGTGCT", 1, -1, -1)
+    assert result[:3] == (1, "ACGT-AT", "A-GTGCT")
+    assert result.optimal and not result.terminated
+
+    # near identical sequences, the band grows until it is provably optimal
+    seq1 = "GATTACAGATTACAGGCATTAGCA" * 10
+    seq2 = seq1[:100] + seq1[103:200] + "TTT" + seq1[200:]
+    result = needleman_wunsch_banded(seq1, seq2, 1, -1, -1)
+    assert result.optimal
+    assert result.score == needleman_wunsch(seq1, seq2, 1, -1, -1)[0]
+
+    # a band too narrow for the gaps is flagged
+    seq1 = "ACGTACGTAC"
+    seq2 = "CGTACGTACG"
+    result = needleman_wunsch_banded(seq1, seq2, 1, -1, -1, band=0)
+    assert result[:3] == (-10, seq1, seq2)
+    assert not result.optimal
+    result = needleman_wunsch_banded(seq1, seq2, 1, -1, -1, band=1)
+    assert result[:3] == (7, "ACGTACGTAC-", "-CGTACGTACG")
+    assert result.optimal
+
+    # the x-drop stops on unrelated sequences
+    result = needleman_wunsch_banded(
+        "AAAAAAAAAAAA", "CCCCCCCCCCCC", 1, -1, -1, x_drop=3
+    )
+    assert result.terminated and not result.optimal
+
+
+def test_needleman_wunsch_affine() -> None:
+    """Test the global alignment with affine gaps."""
+    # one long gap is cheaper than with linear gaps
+    assert needleman_wunsch("GATTACA", "GCA", 2, -1, -3) == (
+        -6,
+        "GATTACA",
+        "G----CA",
+    )
+    assert needleman_wunsch("GATTACA", "GCA", 2, -1, -3, gap_extend=-1) == (
+        0,
+        "GATTACA",
+        "G----CA",
+    )
+
+    # the linear memory engine and the score only path agree
+    seq1 = "ACGTTTACGTAGGCTA" * 4
+    seq2 = "ACGTACGTTAGCTAAA" * 3
+    full = needleman_wunsch(seq1, seq2, 1, -1, -4, gap_extend=-1)
+    linear = needleman_wunsch(
+        seq1, seq2, 1, -1, -4, engine="hirschberg", gap_extend=-1
+    )
+    assert full[0] == linear[0]
+    assert full[0] == needleman_wunsch_score(
+        seq1, seq2, 1, -1, -4, gap_extend=-1
+    )
+
+    # gap_extend equal to gap_penalty is the linear gap penalty
+    assert needleman_wunsch(
+        seq1, seq2, 1, -1, -2, gap_extend=-2
+    ) == needleman_wunsch(seq1, seq2, 1, -1, -2)
+
+    # extending a gap may not cost more than opening one
+    try:
+        needleman_wunsch("ACG", "AG", 1, -1, -1, gap_extend=-2)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
 test_needleman_wunsch()
+test_needleman_wunsch_engines()
+test_needleman_wunsch_hirschberg()
+test_needleman_wunsch_score()
+test_needleman_wunsch_banded()
+test_needleman_wunsch_affine()
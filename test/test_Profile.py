@@ -0,0 +1,58 @@
+import numpy as np
+
+from Multiple_alignment import multiple_alignment
+from Profile import AMINO_ACIDS, Profile
+
+
+def test_profile() -> None:
+    """Test the incrementally updated profile."""
+    profile = Profile(["ACGN", "AC-N"])
+    assert (profile.size, profile.length) == (2, 4)
+    assert profile.counts_of("AC-NW").tolist() == [
+        [2, 0, 0, 0],
+        [0, 2, 0, 0],
+        [0, 0, 1, 0],
+        [0, 0, 0, 2],
+        [0, 0, 0, 0],
+    ]
+
+    # gap columns are counted for every sequence
+    profile.insert_gaps(np.array([True, False, True, True, True]))
+    assert profile.sequences() == ["A-CGN", "A-C-N"]
+    assert profile.counts_of("-").tolist() == [[0, 2, 0, 1, 0]]
+
+    # new letters get a row when a sequence joins
+    profile.add("MKVLA")
+    assert profile.counts_of("AK").tolist() == [
+        [2, 0, 0, 0, 1],
+        [0, 1, 0, 0, 0],
+    ]
+    try:
+        profile.add("ACG")
+    except ValueError:
+        pass
+    else:
+        assert False
+
+    # a weighted sequence is stored once and counted weight times
+    weighted = Profile(["AC"])
+    weighted.add("AG", weight=3)
+    assert (weighted.size, weighted.weight) == (2, 4)
+    assert weighted.counts_of("ACG").tolist() == [[4, 0], [0, 1], [0, 3]]
+    weighted.insert_gaps(np.array([True, False, True]))
+    assert weighted.counts_of("-").tolist() == [[0, 4, 0]]
+    assert weighted.sequences() == ["A-C", "A-G"]
+
+    # letters of the alphabet come first
+    assert Profile(alphabet=AMINO_ACIDS).letters == ["-"] + list(AMINO_ACIDS)
+
+    # IUPAC codes and amino acids no longer raise a KeyError
+    assert multiple_alignment(["MKVLAWGH", "MKVAWGH", "MKLAWH"]) == [
+        "MKVLAWGH",
+        "MKV-AWGH",
+        "MK-LAW-H",
+    ]
+    assert len(set(map(len, multiple_alignment(["ACGNRY", "ACGRY"])))) == 1
+
+
+test_profile()
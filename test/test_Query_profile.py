@@ -0,0 +1,30 @@
+from Query_profile import QueryProfile
+from Smith_waterman import smith_waterman_score
+
+
+def test_query_profile() -> None:
+    """Test the query profile Smith-Waterman."""
+    targets = ["ACGTAT", "AGTGCT", "ACG", "TTACGTT", "", "NNNN", "GTATAC"]
+
+    # same score and end coordinates as the score only smith_waterman
+    profile = QueryProfile("ACGTAT", 10, -5, -5)
+    assert profile.align_many(targets) == [
+        smith_waterman_score("ACGTAT", target, 10, -5, -5)
+        for target in targets
+    ]
+    assert profile.align("ACGTAT") == (60, 6, 6)
+
+    # scores too big for 8 bit lanes fall back to wider lanes
+    profile = QueryProfile("ACGTAT" * 5, 100, -5, -5)
+    assert profile.align("ACGTAT" * 5) == (3000, 30, 30)
+
+    # affine gaps
+    profile = QueryProfile("AAGGGTTTTTCCC", 5, -4, -6, gap_extend=-1)
+    assert profile.align_many(targets) == [
+        smith_waterman_score("AAGGGTTTTTCCC", target, 5, -4, -6, -1)
+        for target in targets
+    ]
+    assert profile.align("GGGCCC") == (20, 13, 6)
+
+
+test_query_profile()
@@ -0,0 +1,77 @@
+import os
+import random
+import tempfile
+
+from Seed_index import BAND, MAX_SPAN, SeedIndex
+from Smith_waterman import smith_waterman, smith_waterman_score
+
+
+def test_seed_index() -> None:
+    """Test the seed-and-extend alignment of reads."""
+    rng = random.Random(1)
+    references = [
+        "".join(rng.choice("ACGT") for _ in range(length))
+        for length in (3000, 2000)
+    ]
+    index = SeedIndex.build(references, k=11, window=5)
+    assert len(index) == 2
+    assert str(index.reference(1)) == references[1]
+
+    # a read from the second reference, with a substitution and a deletion
+    region = references[1][1200:1260]
+    substitute = "A" if region[20] != "A" else "C"
+    read = region[:20] + substitute + region[21:40] + region[41:]
+    hit = index.align(read, 2, -3, -5, -2)
+    assert hit is not None and hit.seeded
+    assert hit.reference_index == 1
+    assert (hit.query_start, hit.query_end) == (0, len(read))
+    assert (hit.reference_start, hit.reference_end) == (1200, 1260)
+    # the same alignment as smith_waterman on the region of the read
+    identity, score, aligned_query, symbol, aligned_reference = smith_waterman(
+        read, references[1][1150:1310], 2, -3, -5, -2
+    )
+    assert hit.score == score and hit.identity == identity
+    assert (hit.aligned_query, hit.symbol) == (aligned_query, symbol)
+    assert hit.aligned_reference == aligned_reference
+
+    # a saved index is mapped back as it was
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "reference.idx")
+        index.save(path)
+        loaded = SeedIndex.load(path)
+        assert (loaded.k, loaded.window) == (11, 5)
+        assert loaded.hashes.tolist() == index.hashes.tolist()
+        assert loaded.positions.tolist() == index.positions.tolist()
+        assert str(loaded.reference(0)) == references[0]
+        assert loaded.align(read, 2, -3, -5, -2) == hit
+        del loaded
+
+    # without any seed the references are scanned in full
+    short = SeedIndex.build(["CCCCTTACAGCCCC", "GGGGGG"], k=8, window=2)
+    hit = short.align("TTACAG", 2, -3, -5, -2)
+    assert hit is not None and not hit.seeded
+    assert (hit.reference_index, hit.score) == (0, 12)
+    assert (hit.reference_start, hit.reference_end) == (4, 10)
+    assert short.align("NNNN", 2, -3, -5, -2) is None
+
+
+def test_seed_index_repeats() -> None:
+    """Test that chains stay narrow in a tandem repeat."""
+    rng = random.Random(4)
+    unit = "".join(rng.choice("ACGT") for _ in range(20))
+    # 40 copies, the seeds of a read are on diagonals 20 apart
+    reference = unit * 40
+    index = SeedIndex.build([reference], k=11, window=5)
+    read = reference[slice(395, 455)]
+    bands = index.candidates(read)
+    assert bands
+    for _, lowest, highest in bands:
+        assert highest - lowest <= MAX_SPAN + 2 * BAND
+    hit = index.align(read, 2, -3, -5, -2)
+    assert hit is not None and hit.seeded
+    assert hit.score == smith_waterman_score(read, reference, 2, -3, -5, -2)[0]
+    assert hit.aligned_query == hit.aligned_reference == read
+
+
+test_seed_index()
+test_seed_index_repeats()
@@ -0,0 +1,99 @@
+import io
+import os
+import tempfile
+
+from Database_search import search
+from Encoded_sequence import EncodedSequence
+from Sequence_io import (
+    Record,
+    read_fasta,
+    read_fastq,
+    read_sequences,
+    write_fasta,
+    write_fastq,
+)
+
+
+def test_read_fasta() -> None:
+    """Test streaming the records of a FASTA file."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "seqs.fa")
+        with open(path, "w") as handle:
+            handle.write(">s1 first\nACGTAT\n>s2\r\nACG\r\nTTT\r\n\r\n")
+            handle.write(">s3\n>s4\nGGACGTATGG")
+        records = list(read_fasta(path))
+        assert [record.name for record in records] == [
+            "s1 first",
+            "s2",
+            "s3",
+            "s4",
+        ]
+        assert [str(record.sequence) for record in records] == [
+            "ACGTAT",
+            "ACGTTT",
+            "",
+            "GGACGTATGG",
+        ]
+        # a sequence on a single line is a view of the file
+        sequence = records[0].sequence
+        assert isinstance(sequence, EncodedSequence)
+        assert not sequence.codes.flags.owndata
+        assert list(read_sequences(path)) == records
+
+        # the records feed the aligners directly
+        hits = search(
+            "ACGTAT",
+            (record.sequence for record in read_fasta(path)),
+            10,
+            -5,
+            -5,
+            k=2,
+        )
+        assert [(hit.target_index, hit.score) for hit in hits] == [
+            (0, 60),
+            (3, 60),
+        ]
+
+        # writing and reading back gives the same records
+        copy = os.path.join(directory, "copy.fa")
+        write_fasta(copy, records, line_width=4)
+        assert list(read_fasta(copy)) == records
+
+        empty = os.path.join(directory, "empty.fa")
+        open(empty, "w").close()
+        assert list(read_fasta(empty)) == []
+
+    output = io.BytesIO()
+    write_fasta(output, [Record("a", "ACGTA"), Record("b", "")], 2)
+    assert output.getvalue() == b">a\nAC\nGT\nA\n>b\n"
+
+
+def test_read_fastq() -> None:
+    """Test streaming the records of a FASTQ file."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "reads.fq")
+        with open(path, "w") as handle:
+            handle.write("@r1\nACGT\n+\nIIII\n@r2\nAC\n+r2\n!#\n")
+        records = list(read_sequences(path))
+        assert records == [
+            Record("r1", EncodedSequence("ACGT"), EncodedSequence("IIII")),
+            Record("r2", EncodedSequence("AC"), EncodedSequence("!#")),
+        ]
+
+        copy = os.path.join(directory, "copy.fq")
+        write_fastq(copy, records)
+        with open(copy) as handle:
+            assert handle.read() == "@r1\nACGT\n+\nIIII\n@r2\nAC\n+\n!#\n"
+
+        with open(path, "w") as handle:
+            handle.write("@r1\nACGT\n+\nIII\n")
+        try:
+            list(read_fastq(path))
+        except ValueError:
+            pass
+        else:
+            assert False
+
+
+test_read_fasta()
+test_read_fastq()
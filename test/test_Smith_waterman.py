@@ -1,4 +1,13 @@
-from Smith_waterman import smith_waterman
+import random
+
+from Smith_waterman import (
+    smith_waterman,
+    smith_waterman_alignment,
+    smith_waterman_banded,
+    smith_waterman_hits,
+    smith_waterman_score,
+)
+from Wavefront import HORIZONTAL, VERTICAL
 
 
 def test_smith_waterman() -> None:
@@ -40,5 +49,116 @@ def test_smith_waterman() -> None:
         "A-GTGCT",
     )
 
+    # Test case 5: No local similarity
+    assert smith_waterman("AAA", "CCC", 10, -5, -5) == (0, 0, "", "", "")
+
+
+def test_smith_waterman_score() -> None:
+    """Test the score only smith_waterman."""
+    # score and end of the best local alignment
+    assert smith_waterman_score("ACGTAT", "ACGTAT", 10, -5, -5) == (60, 6, 6)
+    assert smith_waterman_score("ACGTAT", "AGTGCT", 10, -5, -5) == (25, 6, 6)
+    assert smith_waterman_score("ACGTAT", "ACG", 10, -5, -5) == (30, 3, 3)
+    assert smith_waterman_score("TTACGTT", "GACGA", 10, -5, -5) == (
+        30,
+        5,
+        4,
+    )
+
+
+def test_smith_waterman_affine() -> None:
+    """Test the local alignment with affine gaps."""
+    # the long gap is worth opening with a cheap extension
+    assert smith_waterman("AAGGGTTTTTCCC", "GGGCCC", 5, -4, -6) == (
+        100,
+        15,
+        "CCC",
+        "CCC",
+        "CCC",
+    )
+    assert smith_waterman(
+        "AAGGGTTTTTCCC", "GGGCCC", 5, -4, -6, gap_extend=-1
+    ) == (54, 20, "GGGTTTTTCCC", "GGG     CCC", "GGG-----CCC")
+    assert smith_waterman_score(
+        "AAGGGTTTTTCCC", "GGGCCC", 5, -4, -6, gap_extend=-1
+    ) == (20, 13, 6)
+
+    # gap_extend equal to gap_penalty is the linear gap penalty
+    assert smith_waterman(
+        "ACGTAT", "AGTGCT", 10, -5, -3, gap_extend=-3
+    ) == smith_waterman("ACGTAT", "AGTGCT", 10, -5, -3)
+
+
+def test_smith_waterman_hits() -> None:
+    """Test the non-overlapping local hits of one fill."""
+    # the query matches both copies of the repeat
+    hits = smith_waterman_hits(
+        "GATTACA", "CCGATTACATTTGATTACACC", 2, -3, -5, min_score=10
+    )
+    assert [hit.score for hit in hits] == [14, 14]
+    assert [(hit.start2, hit.end2) for hit in hits] == [(12, 19), (2, 9)]
+    assert [hit.aligned_seq2() for hit in hits] == ["GATTACA", "GATTACA"]
+    assert (
+        smith_waterman_hits(
+            "GATTACA", "CCGATTACATTTGATTACACC", 2, -3, -5, count=1
+        )
+        == hits[:1]
+    )
+    assert (
+        smith_waterman_hits(
+            "GATTACA", "CCGATTACATTTGATTACACC", 2, -3, -5, min_score=15
+        )
+        == []
+    )
+    assert smith_waterman_hits("", "ACGT", 2, -3, -5) == []
+
+    rng = random.Random(3)
+    for _ in range(50):
+        seq1 = "".join(rng.choice("ACGT") for _ in range(rng.randrange(1, 20)))
+        seq2 = "".join(rng.choice("ACGT") for _ in range(rng.randrange(1, 20)))
+        hits = smith_waterman_hits(
+            seq1, seq2, 3, -2, -4, gap_extend=-1, count=5
+        )
+        # the first hit is the smith_waterman alignment
+        best = smith_waterman_alignment(seq1, seq2, 3, -2, -4, gap_extend=-1)
+        assert hits[slice(1)] == ([best] if best.score > 0 else [])
+        scores = [hit.score for hit in hits]
+        assert scores == sorted(scores, reverse=True)
+        # no two hits share a cell
+        cells = set()
+        for hit in hits:
+            moves = hit.moves()
+            i, j = hit.start1, hit.start2
+            for move in moves.tolist():
+                i += move != HORIZONTAL
+                j += move != VERTICAL
+                assert (i, j) not in cells
+                cells.add((i, j))
+
+
+def test_smith_waterman_banded() -> None:
+    """Test the local alignment within a band of diagonals."""
+    # a band holding every cell gives the smith_waterman alignment
+    rng = random.Random(5)
+    for _ in range(50):
+        seq1 = "".join(rng.choice("ACGT") for _ in range(rng.randrange(20)))
+        seq2 = "".join(rng.choice("ACGT") for _ in range(rng.randrange(20)))
+        assert smith_waterman_banded(
+            seq1, seq2, 3, -2, -4, -len(seq1), len(seq2), gap_extend=-1
+        ) == smith_waterman_alignment(seq1, seq2, 3, -2, -4, gap_extend=-1)
+
+    # the alignment stays on the diagonals of the band
+    assert smith_waterman_alignment("ACGTTT", "TTACGT", 2, -3, -5).start2 == 2
+    alignment = smith_waterman_banded("ACGTTT", "TTACGT", 2, -3, -5, -1, 1)
+    # ACGT is on the diagonal 2, only the last T is left
+    assert (alignment.score, alignment.start1, alignment.start2) == (2, 5, 5)
+    assert alignment.aligned_seq1() == alignment.aligned_seq2() == "T"
+    empty = smith_waterman_banded("ACGT", "ACGT", 2, -3, -5, 5, 9)
+    assert (empty.score, empty.columns) == (0, 0)
+
 
 test_smith_waterman()
+test_smith_waterman_score()
+test_smith_waterman_affine()
+test_smith_waterman_hits()
+test_smith_waterman_banded()
@@ -0,0 +1,66 @@
+from Database_search import search
+from Needleman_wunsch import needleman_wunsch, needleman_wunsch_score
+from Smith_waterman import smith_waterman, smith_waterman_score
+from Substitution_matrix import BLOSUM62, SubstitutionMatrix
+
+
+def test_substitution_matrix() -> None:
+    """Test the substitution matrices and their use by the aligners."""
+    # BLOSUM62, letters are case insensitive, unknown letters score the
+    # lowest score
+    assert BLOSUM62.score("W", "W") == 11
+    assert BLOSUM62.score("a", "R") == -1
+    assert BLOSUM62.score("J", "A") == -4
+
+    matrix = SubstitutionMatrix.parse("""
+        # a small matrix
+           A  C
+        A  2 -1
+        C -3  1
+        """)
+    assert matrix.letters == "AC"
+    assert matrix.score("A", "C") == -1 and matrix.score("C", "A") == -3
+    assert matrix.transposed().score("A", "C") == -3
+    assert matrix.default == -3
+    try:
+        SubstitutionMatrix.parse("A C\nA 1 0\n")
+    except ValueError:
+        pass
+    else:
+        assert False
+
+    dna = SubstitutionMatrix.dna(5, -4, transition_score=-1)
+    assert dna.score("A", "G") == -1 and dna.score("A", "C") == -4
+    assert dna.score("T", "U") == 5 and dna.score("N", "A") == -4
+
+    # a match/mismatch matrix gives the same alignments as the scores
+    identity = SubstitutionMatrix.dna(1, -1)
+    assert needleman_wunsch(
+        "ACGTAT", "AGTGCT", 0, 0, -1, matrix=identity
+    ) == needleman_wunsch("ACGTAT", "AGTGCT", 1, -1, -1)
+    assert smith_waterman(
+        "ACGTAT", "AGTGCT", 0, 0, -3, matrix=SubstitutionMatrix.dna(10, -5)
+    ) == smith_waterman("ACGTAT", "AGTGCT", 10, -5, -3)
+
+    # protein alignments with BLOSUM62
+    assert needleman_wunsch(
+        "HEAGAWGHEE", "PAWHEAE", 0, 0, -8, matrix=BLOSUM62
+    ) == (-8, "HEAGAWGHEE", "--P-AWHEAE")
+    assert needleman_wunsch(
+        "HEAGAWGHEE", "PAWHEAE", 0, 0, -8, engine="hirschberg", matrix=BLOSUM62
+    )[0] == needleman_wunsch_score(
+        "PAWHEAE", "HEAGAWGHEE", 0, 0, -8, matrix=BLOSUM62
+    )
+    assert smith_waterman(
+        "HEAGAWGHEE", "PAWHEAE", 0, 0, -8, matrix=BLOSUM62
+    ) == (80, 20, "AWGHE", "AW HE", "AW-HE")
+    assert smith_waterman_score(
+        "HEAGAWGHEE", "PAWHEAE", 0, 0, -8, matrix=BLOSUM62
+    ) == (20, 9, 5)
+    hits = search(
+        "HEAGAWGHEE", ["PAWHEAE", "GGG"], 0, 0, -8, k=2, matrix=BLOSUM62
+    )
+    assert [(hit.target_index, hit.score) for hit in hits] == [(0, 20), (1, 6)]
+
+
+test_substitution_matrix()
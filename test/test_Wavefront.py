@@ -0,0 +1,114 @@
+from typing import Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from Wavefront import (
+    DIAGONAL,
+    HORIZONTAL,
+    HORIZONTAL_EXTENDS,
+    SOURCE,
+    STOP,
+    VERTICAL,
+    VERTICAL_EXTENDS,
+    alignment_strings,
+    fill,
+    sequence_substitution,
+    traceback,
+)
+
+
+def _align(
+    seq1: str,
+    seq2: str,
+    mismatch: int,
+    gap_open: int,
+    gap_extend: int,
+    horizontal_first: bool = False,
+) -> Tuple[int, str, str, npt.NDArray[np.uint8]]:
+    """Return the global score, aligned strings and traceback of a pair."""
+    score, end_i, end_j, trace = fill(
+        sequence_substitution(seq1, seq2, 1, mismatch),
+        len(seq1),
+        len(seq2),
+        gap_open,
+        gap_extend,
+        horizontal_first=horizontal_first,
+    )
+    start_i, start_j, moves = traceback(trace, end_i, end_j)
+    aligned1, _, aligned2 = alignment_strings(
+        moves, seq1, seq2, start_i, start_j
+    )
+    return score, aligned1, aligned2, trace
+
+
+def test_traceback() -> None:
+    """Test the decoding of a hand written packed traceback."""
+    trace = np.full((3, 4), STOP, dtype=np.uint8)
+    # (2, 3) leaves H for the horizontal gap, which extends the one of
+    # (2, 2), whose source is not read from within the gap
+    trace[2, 3] = HORIZONTAL | HORIZONTAL_EXTENDS
+    trace[2, 2] = DIAGONAL
+    trace[2, 1] = DIAGONAL | VERTICAL_EXTENDS
+    # a vertical gap that opens, its extend bit is clear
+    trace[1, 0] = VERTICAL
+    start_i, start_j, moves = traceback(trace, 2, 3)
+    assert (start_i, start_j) == (0, 0)
+    assert moves.tolist() == [VERTICAL, DIAGONAL, HORIZONTAL, HORIZONTAL]
+    # the same cells stored as the band of diagonals -1 to 2
+    band = np.full((3, 4), STOP, dtype=np.uint8)
+    for i, j in ((2, 3), (2, 2), (2, 1), (1, 0)):
+        band[i, j - i + 1] = trace[i, j]
+    assert traceback(band, 2, 3, lowest=-1)[2].tolist() == moves.tolist()
+    # a local traceback stops on the first STOP
+    trace[2, 1] = STOP
+    start_i, start_j, moves = traceback(trace, 2, 3)
+    assert (start_i, start_j) == (2, 1)
+    assert moves.tolist() == [HORIZONTAL, HORIZONTAL]
+
+
+def test_traceback_affine() -> None:
+    """Test the extend bits of affine gaps that open and extend."""
+    # GT of seq1 is one vertical gap: opened at (3, 2), extended at (4, 2)
+    score, aligned1, aligned2, trace = _align("ACGTAC", "ACAC", -1, -5, -1)
+    assert (score, aligned1, aligned2) == (-2, "ACGTAC", "AC--AC")
+    assert trace[3, 2] == VERTICAL
+    assert trace[4, 2] == VERTICAL | VERTICAL_EXTENDS
+    # the same gap in seq1 is horizontal
+    score, aligned1, aligned2, trace = _align("ACAC", "ACGTAC", -1, -5, -1)
+    assert (score, aligned1, aligned2) == (-2, "AC--AC", "ACGTAC")
+    assert trace[2, 3] == HORIZONTAL
+    assert trace[2, 4] == HORIZONTAL | HORIZONTAL_EXTENDS
+    # the first row and column are gaps that extend from the second cell
+    assert trace[0, 1] == HORIZONTAL
+    assert trace[0, 2] == HORIZONTAL | HORIZONTAL_EXTENDS
+    assert trace[1, 0] == VERTICAL
+    assert trace[2, 0] == VERTICAL | VERTICAL_EXTENDS
+
+
+def test_traceback_ties() -> None:
+    """Test the tie break paths, with and without horizontal_first."""
+    # a vertical and a horizontal gap score the same as each other, and
+    # more than the mismatch
+    score, aligned1, aligned2, trace = _align("A", "C", -3, -1, -1)
+    assert (score, aligned1, aligned2) == (-2, "-A", "C-")
+    assert trace[1, 1] == VERTICAL
+    score, aligned1, aligned2, trace = _align("A", "C", -3, -1, -1, True)
+    assert (score, aligned1, aligned2) == (-2, "A-", "-C")
+    assert trace[1, 1] == HORIZONTAL
+    # the diagonal wins a tie with both gaps
+    score, aligned1, aligned2, trace = _align("A", "C", -2, -1, -1, True)
+    assert (score, aligned1, aligned2) == (-2, "A", "C")
+    assert trace[1, 1] == DIAGONAL
+    # a gap is opened rather than extended when both score the same: with
+    # linear gaps F(i - 1, j) + gap_extend is at best H(i - 1, j) + gap_open
+    _, _, _, trace = _align("GAATTCAGTTA", "GGATCGA", -1, -2, -2)
+    tied = (trace[slice(1, -1), slice(1, None)] & SOURCE) == VERTICAL
+    assert tied.any()
+    below = trace[slice(2, None), slice(1, None)]
+    assert not (below[tied] & VERTICAL_EXTENDS).any()
+
+
+test_traceback()
+test_traceback_affine()
+test_traceback_ties()
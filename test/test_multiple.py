@@ -1,4 +1,22 @@
+from typing import Tuple
+
+import numpy as np
+
+import Multiple_alignment
+from Alignment import Alignment
+from Encoded_sequence import SequenceLike
 from Multiple_alignment import *
+from Multiple_alignment import (
+    _add_gaps,
+    _count_scores,
+    _pair_indices,
+    _pair_of,
+    _pairwise_alignment,
+    _pairwise_scores,
+    _profile_needleman_wunsch,
+    _progressive_alignment,
+)
+from Profile import Profile
 
 
 def test_Multiple_alignment() -> None:
@@ -32,4 +50,203 @@ def test_Multiple_alignment() -> None:
     ]
 
 
+def test_Multiple_alignment_guide_tree() -> None:
+    """Test the progressive alignment along a k-mer guide tree."""
+    seqs = [
+        "GATTACAGATTACA",
+        "GATTACGATTACA",
+        "GATACAGATTACA",
+        "CATTACAGATTAC",
+    ]
+    for guide in ("upgma", "nj"):
+        aligned = multiple_alignment(seqs, guide)
+        # every sequence is kept whole, in the input order
+        assert [seq.replace("-", "") for seq in aligned] == seqs
+        assert len(set(map(len, aligned))) == 1
+
+    assert multiple_alignment(["ACGT"], "upgma") == ["ACGT"]
+    try:
+        multiple_alignment(seqs, "random")
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_Multiple_alignment_workers() -> None:
+    """Test that the parallel pairwise stage gives the same alignment."""
+    seqs = ["GCAT", "ATCG", "CATG", "ATCG", "ATCG"]
+    assert multiple_alignment(seqs, workers=2) == multiple_alignment(seqs)
+    assert multiple_alignment(seqs, workers=2) == [
+        "ATCG",
+        "ATCG",
+        "ATCG",
+        "AT-G",
+        "AT--",
+    ]
+
+
+def test_Multiple_alignment_duplicates() -> None:
+    """Test that duplicates are aligned once and copied back."""
+    seqs = ["ATCG", "GCAT", "ATCG", "CATG", "ATCG", "GCAT"]
+    for guide in ("pairwise", "upgma", "nj"):
+        aligned = multiple_alignment(seqs, guide, collapse_duplicates=True)
+        # the rows are in the input order, copies get the same row
+        assert len(aligned) == len(seqs)
+        assert aligned[0] == aligned[2] == aligned[4]
+        assert aligned[1] == aligned[5]
+        assert len(set(map(len, aligned))) == 1
+    assert multiple_alignment(
+        seqs, "upgma", collapse_duplicates=True
+    ) == multiple_alignment(seqs, "upgma")
+
+    # without duplicates the rows are the same as without collapsing
+    distinct = ["GCAT", "ATCG", "CATG"]
+    assert sorted(
+        multiple_alignment(distinct, collapse_duplicates=True)
+    ) == sorted(multiple_alignment(distinct))
+    assert (
+        multiple_alignment(["ATCG"] * 3, collapse_duplicates=True)
+        == ["ATCG"] * 3
+    )
+
+
+def test_pair_of() -> None:
+    """Test the sequences of a pair from its index in the pairwise scores."""
+    for count in (2, 3, 7, 100, 5000):
+        first, second = np.triu_indices(count, 1)
+        pairs = np.arange(len(first))
+        if count == 5000:
+            # the last rows are where the floats round the most
+            pairs = np.concatenate([pairs[:1000], pairs[-1000:]])
+        i, j = _pair_of(count, pairs)
+        assert np.array_equal(i, first[pairs])
+        assert np.array_equal(j, second[pairs])
+        for index in (0, count // 2, count - 1):
+            others = np.delete(np.arange(count), index)
+            i, j = _pair_of(count, _pair_indices(count, index, others))
+            assert np.array_equal(np.minimum(i, j), np.minimum(index, others))
+            assert np.array_equal(j, np.maximum(index, others))
+
+
+def test_count_scores() -> None:
+    """Test the profile match scores against every pair of residues."""
+    rng = np.random.default_rng(11)
+    for _ in range(20):
+        weighted = []
+        for size in (rng.integers(1, 5), rng.integers(1, 5)):
+            length = int(rng.integers(1, 9))
+            # N and R are only in some profiles, "-" makes gap columns
+            rows = [
+                "".join(rng.choice(list("ACGTNR-"), length))
+                for _ in range(size)
+            ]
+            weights = rng.integers(1, 4, len(rows)).tolist()
+            weighted.append(list(zip(rows, weights)))
+        profiles = []
+        for rows_and_weights in weighted:
+            profile = Profile()
+            for row, weight in rows_and_weights:
+                profile.add(row, weight)
+            profiles.append(profile)
+        # a column of gaps only
+        profiles[0].insert_gaps(
+            np.append(np.ones(profiles[0].length, dtype=bool), False)
+        )
+        weighted[0] = [(row + "-", weight) for row, weight in weighted[0]]
+        assert profiles[0].sequences() == [row for row, _ in weighted[0]]
+
+        # every pair of residues of the two columns, weighted, adds 1 when
+        # they are the same letter and removes 1 from each side otherwise
+        expected = np.zeros(
+            (profiles[0].length, profiles[1].length), dtype=np.int64
+        )
+        for i in range(profiles[0].length):
+            for j in range(profiles[1].length):
+                for row1, weight1 in weighted[0]:
+                    for row2, weight2 in weighted[1]:
+                        same = row1[i] == row2[j]
+                        expected[i, j] += (
+                            weight1 * weight2 * (1 if same else -2)
+                        )
+        assert np.array_equal(_count_scores(*profiles), expected)
+
+
+def _sorted_pairs_alignment(seqs: list[str]) -> Tuple[list[str], list[int]]:
+    """Return the pairwise guide alignment as first scheduled.
+
+    All the pairs are sorted once by score, ties in np.triu_indices order,
+    and every step takes the first pair with one sequence in the base.
+    """
+    scores = _pairwise_scores(seqs)
+    first, second = np.triu_indices(len(seqs), 1)
+    pairs = [
+        (int(first[pair]), int(second[pair]))
+        for pair in np.argsort(-scores, kind="stable")
+    ]
+    i, j = pairs.pop(0)
+    alignment = _pairwise_alignment(seqs[i], seqs[j])
+    base = Profile([alignment.aligned_seq1(), alignment.aligned_seq2()])
+    entered = [i, j]
+    while len(entered) < len(seqs):
+        i, j = next(
+            (i, j) for i, j in pairs if (i in entered) != (j in entered)
+        )
+        alignment = _pairwise_alignment(seqs[i], seqs[j])
+        if i in entered:
+            enter_index, enter_seq = j, alignment.aligned_seq2()
+        else:
+            enter_index, enter_seq = i, alignment.aligned_seq1()
+        enter_profile = Profile([enter_seq])
+        _, trace = _profile_needleman_wunsch(base, enter_profile)
+        _add_gaps(trace, base, enter_profile)
+        base.add(enter_profile.sequences()[0])
+        entered.append(enter_index)
+    return base.sequences(), entered
+
+
+def test_progressive_alignment_order() -> None:
+    """Test the heap of the pairwise guide against sorting all the pairs."""
+    rng = np.random.default_rng(7)
+    cases = [
+        # every pair scores the same
+        ["ACGT", "TGCA", "GATC", "CTAG"],
+        # copies tie with each other and with the best pair
+        ["GCAT", "ATCG", "CATG", "ATCG", "ATCG", "GCAT"],
+    ]
+    for _ in range(10):
+        # short sequences over two letters, most scores are ties
+        cases.append(
+            [
+                "".join(rng.choice(list("AC"), rng.integers(1, 5)))
+                for _ in range(rng.integers(3, 9))
+            ]
+        )
+    for seqs in cases:
+        calls = []
+
+        def counted(
+            seq1: SequenceLike, seq2: SequenceLike, cache: None = None
+        ) -> Alignment:
+            calls.append((seq1, seq2))
+            return _pairwise_alignment(seq1, seq2, cache)
+
+        Multiple_alignment._pairwise_alignment = counted  # type: ignore
+        try:
+            aligned, entered = _progressive_alignment(seqs)
+        finally:
+            Multiple_alignment._pairwise_alignment = _pairwise_alignment
+        assert (aligned, entered) == _sorted_pairs_alignment(seqs)
+        # every sequence enters once: the pairs of two sequences already
+        # in the base are dropped from the heap without being aligned
+        assert sorted(entered) == list(range(len(seqs)))
+        assert len(calls) == len(seqs) - 1
+
+
 test_Multiple_alignment()
+test_Multiple_alignment_guide_tree()
+test_Multiple_alignment_workers()
+test_Multiple_alignment_duplicates()
+test_pair_of()
+test_count_scores()
+test_progressive_alignment_order()